@@ -0,0 +1,262 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Time each stage of the qc and urs reports on synthetic data sets and record the results as json
+#
+# 例如: python benchmarks/run_benchmarks.py --rows 10000 100000 --cols 0 50 --output results.json
+#      python benchmarks/run_benchmarks.py --rows 10000 --compare results.json
+#      python benchmarks/run_benchmarks.py --reports --numeric-desc 5000000 200  (数值变量综合统计, 数据本身约8GB)
+#
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from benchmarks.synthetic_data import generate_dataset, generate_numeric_dataset, get_extra_col_names
+from common.tracer import peak_rss_mb
+
+# 结果文件的格式版本, 结构变化时加1
+RESULTS_VERSION = 1
+
+# 各报告依次计时的阶段
+REPORT_STAGES = {'qc': ['load', 'profile', 'render'],
+                 'urs': ['load', 'aggregate', 'write']}
+
+# 数值变量综合统计的对比: 原来的describe加10次quantile, 以及每列一次np.percentile(DataFrameInfo._get_numeric_cols_desc)
+NUMERIC_DESC_STAGES = ['describe', 'one_pass']
+
+
+class BenchmarkException(Exception):
+    pass
+
+
+class StageTimer:
+    """依次记录每个阶段的耗时以及该阶段结束时进程的内存峰值"""
+
+    def __init__(self):
+        self.stages = []
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stages.append({'stage': stage, 'seconds': round(time.perf_counter() - start, 4),
+                            'peak_rss_mb': peak_rss_mb()})
+        return result
+
+
+def run_qc(path, report_folder, workers, optimize):
+    """在子进程中运行, 每个用例的内存峰值互不影响"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'qc'))
+    from common.data_loader import read_ascii
+    from data_quality_reporter import DataFrameInfo, ReportInfo
+    from format_config import DS_ENCODINGS, FILL_NAN_WITH_BLANK, HEAD_LINE_NUM
+
+    timer = StageTimer()
+    orig_df = timer.time('load', read_ascii, pd.read_csv, path, DS_ENCODINGS)
+    df_info = timer.time('profile', DataFrameInfo.create_df_comm_op, orig_df=orig_df, path=path,
+                         cols_forced_to_str=[], fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                         head_line_num=HEAD_LINE_NUM, workers=workers, optimize=optimize, inplace=True)
+    timer.time('render', ReportInfo(df_info).to_html, report_folder=report_folder, write_profile=False)
+    return timer.stages
+
+
+def run_urs(path, report_folder, workers, optimize, extra_col_names):
+    """在子进程中运行, 追加的列作为一个单独的自变量分组"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'urs'))
+    from config import VARS_GROUPS
+    from urs_reporter import ReportGenerator
+
+    var_groups = dict(VARS_GROUPS)
+    if extra_col_names:
+        var_groups['合成变量'] = extra_col_names
+    timer = StageTimer()
+    report_generator = timer.time('load', ReportGenerator.create_generator_from_ascii, pd.read_csv, path=path,
+                                  var_groups=var_groups, report_folder=report_folder, cache_dir=None,
+                                  optimize=optimize)
+    report_generator.workers = workers
+    # 先算出全部urs表, 与写excel的耗时分开统计
+    urs_dfs = timer.time('aggregate',
+                         lambda: list(report_generator.calc_urs_dfs(report_generator.bin_variables())))
+    timer.time('write', report_generator.write_excel, urs_dfs)
+    return timer.stages
+
+
+def describe_numeric_cols(df, records_num):
+    """原来的实现: 整个DataFrame调用一次describe, 再为每个十分位数调用一次quantile, 每次都重新排序所有数值列"""
+    numeric_cols = df.describe().T
+    numeric_cols['# MISSING'] = records_num - numeric_cols['count']
+    for i in range(10):
+        numeric_cols[f'{(i + 1) * 10}%'] = df.quantile((i + 1) / 10, numeric_only=True)
+    return list(zip(numeric_cols.index, numeric_cols.fillna(0).to_dict(orient='records')))
+
+
+def run_numeric_desc(records_num, cols_num, missing_rate, seed):
+    """在子进程中运行, 两种实现的结果必须完全相同"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'qc'))
+    from data_quality_reporter import DataFrameInfo
+
+    df = generate_numeric_dataset(records_num, cols_num, missing_rate=missing_rate, seed=seed)
+    timer = StageTimer()
+    expected = timer.time('describe', describe_numeric_cols, df, records_num)
+    numeric_cols_desc = timer.time('one_pass', DataFrameInfo._get_numeric_cols_desc, records_num=records_num, df=df)
+    if [(col_name, list(desc.items())) for col_name, desc in numeric_cols_desc] != \
+            [(col_name, list(desc.items())) for col_name, desc in expected]:
+        raise BenchmarkException('numeric summary differs from DataFrame.describe')
+    return timer.stages
+
+
+def run_case(report, path, report_folder, workers, optimize, extra_col_names):
+    """每个用例在一个新的进程中运行, 避免之前的用例抬高内存峰值"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        if report == 'qc':
+            future = executor.submit(run_qc, path, report_folder, workers, optimize)
+        else:
+            future = executor.submit(run_urs, path, report_folder, workers, optimize, extra_col_names)
+        return future.result()
+
+
+def run_numeric_desc_case(records_num, cols_num, missing_rate, seed):
+    """与run_case相同, 每个用例在一个新的进程中运行"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_numeric_desc, records_num, cols_num, missing_rate, seed).result()
+
+
+def run_benchmarks(rows_list, cols_list, reports=('qc', 'urs'), repeat=1, missing_rate=0.05, seed=0, workers=1,
+                   optimize=False, numeric_desc_shapes=()):
+    """
+    :param rows_list:  数据集的记录数
+    :param cols_list:  基础列之外追加的列数, 与rows_list中的每个记录数组合成一个数据集
+    :param repeat:  每个用例运行的次数, 每次的结果都会记录
+    :param numeric_desc_shapes:  (记录数, 列数)的列表, 每个形状的数值列宽表上对比数值变量综合统计的两种实现
+    :return:  可以序列化为json的结果
+    """
+    cases = []
+    for records_num, cols_num in numeric_desc_shapes:
+        for run in range(repeat):
+            print(f'running numeric_desc on {records_num} rows x {cols_num} cols ({run + 1}/{repeat})')
+            stages = run_numeric_desc_case(records_num, cols_num, missing_rate, seed)
+            cases.append({'report': 'numeric_desc', 'rows': records_num, 'cols': cols_num, 'run': run,
+                          'total_seconds': round(sum(stage['seconds'] for stage in stages), 4), 'stages': stages})
+    # 不指定任何报告时不需要生成csv数据集
+    rows_list = rows_list if reports else []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for records_num in rows_list:
+            for extra_cols_num in cols_list:
+                df = generate_dataset(records_num, extra_cols_num=extra_cols_num, missing_rate=missing_rate,
+                                      seed=seed)
+                path = os.path.join(tmp_dir, f'synthetic_{records_num}_{extra_cols_num}.csv')
+                df.to_csv(path, index=False)
+                cols_num = df.shape[1]
+                extra_col_names = get_extra_col_names(df)
+                del df
+                for report in reports:
+                    for run in range(repeat):
+                        print(f'running {report} on {records_num} rows x {cols_num} cols ({run + 1}/{repeat})')
+                        stages = run_case(report, path, tmp_dir, workers, optimize, extra_col_names)
+                        cases.append({'report': report, 'rows': records_num, 'cols': cols_num, 'run': run,
+                                      'total_seconds': round(sum(stage['seconds'] for stage in stages), 4),
+                                      'stages': stages})
+    return {'version': RESULTS_VERSION, 'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'environment': get_environment(),
+            'params': {'missing_rate': missing_rate, 'seed': seed, 'workers': workers, 'optimize': optimize},
+            'cases': cases}
+
+
+def get_environment():
+    """记录版本信息, 不同版本的结果才能对照"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+def summarize(results):
+    """
+    :return:  以(report, rows, cols, stage)为键, 多次运行中最短耗时和最大内存峰值为值的dict
+    """
+    summary = {}
+    for case in results['cases']:
+        for stage in case['stages'] + [{'stage': 'total', 'seconds': case['total_seconds'],
+                                        'peak_rss_mb': None}]:
+            key = (case['report'], case['rows'], case['cols'], stage['stage'])
+            seconds, rss = summary.get(key, (None, None))
+            seconds = stage['seconds'] if seconds is None else min(seconds, stage['seconds'])
+            if stage['peak_rss_mb'] is not None:
+                rss = stage['peak_rss_mb'] if rss is None else max(rss, stage['peak_rss_mb'])
+            summary[key] = (seconds, rss)
+    return summary
+
+
+def format_report(results, baseline=None):
+    """每行一个阶段, 有对照结果时给出耗时的比值(小于1表示变快)"""
+    summary = summarize(results)
+    baseline_summary = summarize(baseline) if baseline is not None else {}
+    lines = [f'{"report":<12} {"rows":>10} {"cols":>6} {"stage":<10} {"seconds":>10} {"peak_rss_mb":>12}'
+             + (f' {"baseline":>10} {"ratio":>7}' if baseline is not None else '')]
+    for (report, rows, cols, stage), (seconds, rss) in summary.items():
+        line = f'{report:<12} {rows:>10} {cols:>6} {stage:<10} {seconds:>10.3f} ' + \
+               (f'{rss:>12.1f}' if rss is not None else f'{"-":>12}')
+        if baseline is not None:
+            base_seconds = baseline_summary.get((report, rows, cols, stage), (None, None))[0]
+            if base_seconds:
+                line += f' {base_seconds:>10.3f} {seconds / base_seconds:>7.2f}'
+            else:
+                line += f' {"-":>10} {"-":>7}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        results = json.load(f)
+    if results.get('version') != RESULTS_VERSION:
+        raise BenchmarkException(f'Unsupported results version {results.get("version")} of {path}, '
+                                 f'expected {RESULTS_VERSION}')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark each stage of the qc and urs reports')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='记录数')
+    parser.add_argument('--cols', type=int, nargs='+', default=[0], help='基础列之外追加的列数')
+    parser.add_argument('--reports', nargs='*', choices=sorted(REPORT_STAGES), default=sorted(REPORT_STAGES),
+                        help='不指定任何报告时只运行--numeric-desc的用例')
+    parser.add_argument('--repeat', type=int, default=1, help='每个用例运行的次数')
+    parser.add_argument('--missing-rate', type=float, default=0.05, help='每一列中空值的比例')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='qc和urs统计时使用的进程数')
+    parser.add_argument('--optimize', action='store_true', help='读入数据后压缩各列的类型')
+    parser.add_argument('--numeric-desc', type=int, nargs=2, action='append', default=[], metavar=('ROWS', 'COLS'),
+                        help='在ROWS行COLS列的数值列宽表上对比数值变量综合统计的两种实现, 可以指定多次')
+    parser.add_argument('--output', help='结果写入的json文件')
+    parser.add_argument('--compare', help='作为对照的结果文件, 如上一个版本的结果')
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.compare) if args.compare else None
+    results = run_benchmarks(rows_list=args.rows, cols_list=args.cols, reports=args.reports, repeat=args.repeat,
+                             missing_rate=args.missing_rate, seed=args.seed, workers=args.workers,
+                             optimize=args.optimize, numeric_desc_shapes=args.numeric_desc)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(format_report(results, baseline))
+    return results
+
+
+if __name__ == '__main__':
+    main()
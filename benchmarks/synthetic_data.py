@@ -0,0 +1,105 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Seeded synthetic data set with the shape of the motor insurance data sets the reports are run on
+#
+import numpy as np
+import pandas as pd
+
+# 车牌号的省份简称
+PLATE_PROVINCES = ['浙', '沪', '苏', '皖', '粤', '京']
+
+# 车架号(VIN)中可以使用的字符, 不含I、O、Q
+VIN_CHARS = list('0123456789ABCDEFGHJKLMNPRSTUVWXYZ')
+
+# 不会被置为空值的列: 计数用的车牌号和作为比例分母的保费
+NOT_NULL_COLS = ('车牌号', '标准保费')
+
+# 赔款的封顶金额, 对应urs配置中的loss_cap_500k
+LOSS_CAP = 500000
+
+# 基础列之外追加的列按这个顺序循环使用各类型
+EXTRA_COL_KINDS = ('numeric', 'enum', 'str')
+
+
+def generate_dataset(records_num, extra_cols_num=0, missing_rate=0.05, seed=0):
+    """
+    生成与车险数据集结构相同的数据: 保费/赔款等数值列, 车牌号/车架号等高基数字符串列, 保单年等取值较少的列以及日期列,
+    相同的参数总是生成相同的数据
+
+    :param records_num:  记录数
+    :param extra_cols_num:  基础列之外追加的列数, 依次为数值列、枚举列和高基数字符串列, 用于测试列数对耗时的影响
+    :param missing_rate:  除车牌号和标准保费外每一列中空值的比例
+    :return:  DataFrame
+    """
+    rng = np.random.RandomState(seed)
+    start_dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.randint(0, 4 * 365, records_num), unit='D')
+    premium = rng.lognormal(8, 0.5, records_num).round(2)
+    # 大部分保单没有出险, 出险保单的赔款是长尾分布
+    claims = np.where(rng.rand(records_num) < 0.15, rng.pareto(2, records_num) * 5000, 0).round(2)
+    df = pd.DataFrame({
+        '车牌号': _random_plates(rng, records_num),
+        '车架号': _random_strings(rng, VIN_CHARS, 17, records_num),
+        '保单年': start_dates.year,
+        '起保日期': start_dates,
+        'veh_age': rng.gamma(2, 3, records_num).round(1),
+        '车辆类别': rng.choice(['客车', '货车', '挂车', '特种车'], records_num, p=[0.7, 0.2, 0.07, 0.03]),
+        '被保人性别': rng.choice(['男', '女'], records_num),
+        'Vio0-6': rng.poisson(0.5, records_num),
+        'Vio7-12': rng.poisson(0.5, records_num),
+        '标准保费': premium,
+        '已报赔款': claims,
+        'loss_cap_500k': np.minimum(claims, LOSS_CAP),
+    })
+    for col_idx in range(extra_cols_num):
+        kind = EXTRA_COL_KINDS[col_idx % len(EXTRA_COL_KINDS)]
+        col_name = f'{kind}_{col_idx}'
+        if kind == 'numeric':
+            df[col_name] = rng.normal(100, 30, records_num).round(3)
+        elif kind == 'enum':
+            df[col_name] = rng.choice([f'类别{i}' for i in range(rng.randint(2, 30))], records_num)
+        else:
+            df[col_name] = _random_strings(rng, VIN_CHARS, 10, records_num)
+    for col_name in df.columns:
+        if col_name not in NOT_NULL_COLS and missing_rate > 0:
+            mask = rng.rand(records_num) < missing_rate
+            # 整数列和日期列置空后分别变为float和NaT, 与读取带空值的csv结果一致
+            df[col_name] = df[col_name].mask(mask)
+    return df
+
+
+def generate_numeric_dataset(records_num, cols_num, missing_rate=0.05, seed=0):
+    """
+    生成只有数值列的宽表, 用于对比数值变量综合统计的耗时, 直接在内存中生成, 不写入csv
+
+    :param cols_num:  列数, 每3列中2列为带空值的浮点数列, 1列为没有空值的整数列
+    :return:  DataFrame
+    """
+    rng = np.random.RandomState(seed)
+    cols = {}
+    for col_idx in range(cols_num):
+        if col_idx % 3 == 2:
+            cols[f'int_{col_idx}'] = rng.randint(0, 1000, records_num)
+        else:
+            values = rng.normal(100, 30, records_num).round(3)
+            values[rng.rand(records_num) < missing_rate] = np.nan
+            cols[f'float_{col_idx}'] = values
+    return pd.DataFrame(cols)
+
+
+def get_extra_col_names(df):
+    """:return:  generate_dataset追加的列名"""
+    return [col_name for col_name in df.columns if col_name.split('_')[0] in EXTRA_COL_KINDS]
+
+
+def _random_plates(rng, records_num):
+    """不重复的车牌号, 如浙A3K7Q2"""
+    provinces = rng.choice(PLATE_PROVINCES, records_num)
+    cities = rng.choice(list('ABCDEFGH'), records_num)
+    serials = rng.permutation(records_num)
+    return [f'{province}{city}{serial:06X}' for province, city, serial in zip(provinces, cities, serials)]
+
+
+def _random_strings(rng, chars, length, records_num):
+    codes = rng.randint(0, len(chars), (records_num, length))
+    return [''.join(row) for row in np.asarray(chars)[codes]]
@@ -0,0 +1,67 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for synthetic_data and run_benchmarks
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from benchmarks.run_benchmarks import (NUMERIC_DESC_STAGES, REPORT_STAGES, format_report, load_results, main,
+                                       summarize)
+from benchmarks.synthetic_data import NOT_NULL_COLS, generate_dataset, get_extra_col_names
+
+
+class TestSyntheticData(unittest.TestCase):
+    def test_generate_dataset(self):
+        df = generate_dataset(1000, extra_cols_num=4, missing_rate=0.1, seed=1)
+        self.assertEqual(df.shape, (1000, 16))
+        self.assertEqual(get_extra_col_names(df), ['numeric_0', 'enum_1', 'str_2', 'numeric_3'])
+        # 相同的参数生成相同的数据
+        pd.testing.assert_frame_equal(df, generate_dataset(1000, extra_cols_num=4, missing_rate=0.1, seed=1))
+        self.assertFalse(df.equals(generate_dataset(1000, extra_cols_num=4, missing_rate=0.1, seed=2)))
+
+        self.assertTrue(df['车牌号'].is_unique)
+        self.assertEqual(df['车架号'].str.len().max(), 17)
+        self.assertTrue(pd.api.types.is_datetime64_dtype(df['起保日期']))
+        self.assertTrue(set(df['保单年'].dropna()) <= {2014, 2015, 2016, 2017, 2018})
+        self.assertTrue((df['loss_cap_500k'].dropna() <= 500000).all())
+        for col_name in df.columns:
+            if col_name in NOT_NULL_COLS:
+                self.assertEqual(df[col_name].isnull().sum(), 0)
+            else:
+                self.assertAlmostEqual(df[col_name].isnull().mean(), 0.1, delta=0.04)
+        self.assertEqual(generate_dataset(100, missing_rate=0).isnull().sum().sum(), 0)
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, 'results.json')
+            main(['--rows', '300', '--cols', '0', '3', '--output', output])
+            results = load_results(output)
+            self.assertEqual(len(results['cases']), 4)
+            for case in results['cases']:
+                self.assertEqual([stage['stage'] for stage in case['stages']], REPORT_STAGES[case['report']])
+                self.assertTrue(all(stage['seconds'] >= 0 for stage in case['stages']))
+            self.assertEqual(sorted({case['cols'] for case in results['cases']}), [12, 15])
+
+            # 与自身对照时各阶段耗时的比值都是1
+            summary = summarize(results)
+            self.assertEqual(len(summary), 2 * 2 * 4)
+            report = format_report(results, baseline=json.loads(json.dumps(results)))
+            self.assertEqual(len(report.splitlines()), len(summary) + 1)
+            self.assertTrue(all(line.endswith('1.00') for line in report.splitlines()[1:]))
+
+    def test_numeric_desc(self):
+        # 两种实现的结果不同时报错
+        results = main(['--reports', '--numeric-desc', '2000', '7'])
+        self.assertEqual([(case['report'], case['rows'], case['cols']) for case in results['cases']],
+                         [('numeric_desc', 2000, 7)])
+        self.assertEqual([stage['stage'] for stage in results['cases'][0]['stages']], NUMERIC_DESC_STAGES)
+
+
+if __name__ == '__main__':
+    unittest.main()
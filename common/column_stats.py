@@ -0,0 +1,95 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Factorized columns shared by the qc and urs reports when both run on the same data set in one process
+#
+import numpy as np
+import pandas as pd
+
+# 判断列中的数据是否变化时, 在整列中均匀抽取的取值个数
+DATA_KEY_SAMPLE_SIZE = 64
+
+
+class ColumnStats:
+    """一列factorize的结果: 每行取值的编号(空值为-1)、按首次出现顺序排列的取值以及各取值的记录数"""
+
+    def __init__(self, codes, uniques):
+        self.codes = codes
+        self.uniques = uniques
+        # 第0位为缺失值的数量, 第i位为第i-1个取值的数量
+        self.counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+
+    @classmethod
+    def create_from_series(cls, series):
+        codes, uniques = pd.factorize(series)
+        return cls(codes=codes, uniques=uniques)
+
+    @property
+    def null_count(self):
+        return int(self.counts[0])
+
+    def value_counts(self):
+        """:return:  非空取值的记录数, 以取值为索引的Series, 按首次出现的顺序排列"""
+        return pd.Series(self.counts[1:], index=pd.Index(np.asarray(self.uniques)))
+
+    def sorted_factorize(self):
+        """
+        不再扫描整列, 只对取值排序后重新编号
+
+        :return:  与pd.factorize(series, sort=True)相同的(codes, uniques), category列的取值按值而不是类别的顺序排列
+        """
+        ranks, sorted_uniques = pd.factorize(np.asarray(self.uniques), sort=True)
+        codes = np.append(ranks, -1)[self.codes]
+        return codes, pd.Index(sorted_uniques)
+
+
+# 当前共享的列: {col_name: (数据的标识, ColumnStats)}, 为None时不共享
+_shared_stats = None
+_shared_col_names = frozenset()
+
+
+def start_sharing(col_names):
+    """
+    开始在同一个数据集的两份报告之间共享col_names中各列的ColumnStats;
+    每行的编号与数据集一样大, 只共享两份报告都会用到的列(如urs的自变量), 其中不能有会被报告替换的列(如qc强制转换为字符串的列)
+    """
+    global _shared_stats, _shared_col_names
+    _shared_stats = {}
+    _shared_col_names = frozenset(col_names)
+
+
+def stop_sharing():
+    """释放共享的ColumnStats"""
+    global _shared_stats, _shared_col_names
+    _shared_stats = None
+    _shared_col_names = frozenset()
+
+
+def _get_data_key(series):
+    """
+    列中数据的标识, 用于发现被替换的列(如压缩类型后, 或者替换为长度和类型都相同的其他取值);
+    不使用数据的地址, 浅拷贝中替换了同一个block中的其他列后, 剩余的列会被复制到新的block中;
+    除长度和类型外, 还包括均匀抽取的DATA_KEY_SAMPLE_SIZE个取值的哈希, 计算量与列的长度无关
+    """
+    positions = np.linspace(0, len(series) - 1, min(len(series), DATA_KEY_SAMPLE_SIZE)).astype(np.int64)
+    sample_hash = int(pd.util.hash_pandas_object(series.iloc[positions], index=False).sum())
+    return len(series), str(series.dtype), sample_hash
+
+
+def get_column_stats(series):
+    """:return:  列的ColumnStats, 正在共享该列时只计算一次"""
+    if _shared_stats is None or series.name not in _shared_col_names:
+        return ColumnStats.create_from_series(series)
+    stats = peek_column_stats(series)
+    if stats is None:
+        stats = ColumnStats.create_from_series(series)
+        _shared_stats[series.name] = (_get_data_key(series), stats)
+    return stats
+
+
+def peek_column_stats(series):
+    """:return:  已经计算过的列的ColumnStats, 没有共享或者还没有计算过时为None"""
+    if _shared_stats is None or series.name not in _shared_stats:
+        return None
+    data_key, stats = _shared_stats[series.name]
+    return stats if data_key == _get_data_key(series) else None
@@ -0,0 +1,57 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# 把csv/excel数据集一次性转换为parquet/feather格式, 之后的qc和urs报告直接读取列式文件
+#
+# 用法(在项目根目录下运行):
+#   python -m common.convert_to_columnar ./data_sources/全变量.csv --format parquet
+#
+import argparse
+import logging
+import os
+import time
+
+import pandas as pd
+
+from common.data_loader import COLUMNAR_FORMATS, read_ascii, write_columnar
+
+# 解析csv或者excel时备选的编码方式
+DEFAULT_ENCODINGS = ('utf-8', 'gbk')
+
+logger = logging.getLogger(__name__)
+
+
+def convert_to_columnar(src_path, fmt, output_dir=None, encodings=DEFAULT_ENCODINGS, skip_rows=None):
+    """
+    把csv/excel文件转换为列式文件
+
+    :param fmt:  'parquet' or 'feather'
+    :param output_dir:  输出目录, 默认与源文件在同一目录
+    :return:  转换后的文件路径
+    """
+    start = time.time()
+    read_func = pd.read_excel if os.path.splitext(src_path)[-1].lower() in ('.xls', '.xlsx', '.xlsm') \
+        else pd.read_csv
+    df = read_ascii(read_func, src_path, encodings, skiprows=skip_rows)
+    output_dir = output_dir or os.path.dirname(src_path)
+    dst_path = os.path.join(output_dir, f'{os.path.splitext(os.path.basename(src_path))[0]}.{fmt}')
+    write_columnar(df, dst_path, fmt)
+    logger.info('converted %s to %s (%s rows, %s columns) in %.1fs', src_path, dst_path, df.shape[0], df.shape[1],
+                time.time() - start)
+    return dst_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='convert csv/excel data sources to parquet/feather')
+    parser.add_argument('src_paths', nargs='+', help='csv or excel files to convert')
+    parser.add_argument('--format', dest='fmt', choices=COLUMNAR_FORMATS, default='parquet')
+    parser.add_argument('--output-dir', default=None, help='default to the directory of each source file')
+    parser.add_argument('--encodings', nargs='+', default=DEFAULT_ENCODINGS)
+    args = parser.parse_args()
+    for src_path in args.src_paths:
+        print(convert_to_columnar(src_path, fmt=args.fmt, output_dir=args.output_dir, encodings=args.encodings))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,245 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Data set loading shared by the qc and urs reports
+#
+import codecs
+import glob
+import logging
+import os
+import time
+
+import chardet
+
+logger = logging.getLogger(__name__)
+
+# 检测编码时从文件开头、中间、结尾各读取的字节数
+ENCODING_SAMPLE_SIZE = 256 * 1024
+
+# 不需要检测编码的二进制格式
+BINARY_EXTENSIONS = ('.xls', '.xlsx', '.xlsm', '.pkl', '.pickle', '.parquet', '.feather', '.arrow')
+
+# 列式存储格式
+COLUMNAR_FORMATS = ('parquet', 'feather')
+
+# 分区数据集的路径中可以使用的通配符
+GLOB_MAGIC_CHARS = '*?['
+
+# 分区目录中以这些字符开头的文件不是数据(如.DS_Store, _SUCCESS)
+IGNORED_PARTITION_PREFIXES = ('.', '_')
+
+
+class DataLoaderException(Exception):
+    pass
+
+
+def _read_samples(path, sample_size):
+    """读取文件开头、中间和结尾的字节样本, 中间和结尾的样本从换行符之后开始, 避免截断多字节字符"""
+    file_size = os.path.getsize(path)
+    samples = []
+    with open(path, 'rb') as f:
+        samples.append(f.read(sample_size))
+        if file_size > sample_size:
+            for offset in sorted({max(sample_size, file_size // 2 - sample_size // 2),
+                                  max(sample_size, file_size - sample_size)}):
+                f.seek(offset)
+                sample = f.read(sample_size)
+                newline_pos = sample.find(b'\n')
+                samples.append(sample[newline_pos + 1:] if newline_pos >= 0 else b'')
+    return samples
+
+
+def _is_valid_encoding(encoding, samples):
+    """样本能否用encoding解码, 样本结尾被截断的多字节字符不算错误"""
+    try:
+        for sample in samples:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return True
+
+
+def _read_first_non_ascii_block(path, encodings, block_size):
+    """
+    样本都是ASCII时无法区分编码, 从头逐块读取文件并用encodings中每个编码的增量解码器解码,
+    直到读到第一个含有非ASCII字节的块为止, 比解析整个文件快得多
+
+    :return:  (第一个非ASCII块, 能够解码到该块为止的编码), 整个文件都是ASCII时块为None
+    """
+    decoders = {}
+    for encoding in encodings:
+        try:
+            decoders[encoding] = codecs.getincrementaldecoder(encoding)()
+        except LookupError:
+            pass
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            for encoding, decoder in list(decoders.items()):
+                try:
+                    decoder.decode(block, final=False)
+                except UnicodeDecodeError:
+                    del decoders[encoding]
+            if not block.isascii():
+                return block, [encoding for encoding in encodings if encoding in decoders]
+    return None, list(decoders)
+
+
+def detect_encoding(path, encodings, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    根据文件的字节样本检测编码, 不需要为了试编码而解析整个文件
+
+    依次用encodings中的编码校验样本, 都不通过时使用chardet的检测结果(同样需要通过校验);
+    样本都是ASCII时(如只有开头、中间和结尾是英文和数字的gbk文件)继续读取文件, 直到出现非ASCII字节时再确定编码
+
+    :param encodings:  备选的编码方式, 按优先级排列
+    :return:  编码方式, 检测不出时返回None
+    """
+    start = time.time()
+    samples = _read_samples(path, sample_size)
+    if samples[0].startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    elif all(sample.isascii() for sample in samples):
+        block, valid_encodings = _read_first_non_ascii_block(path, encodings, sample_size)
+        encoding = valid_encodings[0] if valid_encodings else None
+        if encoding is None and block is not None:
+            guess = chardet.detect(block).get('encoding')
+            if guess and _read_first_non_ascii_block(path, [guess], sample_size)[1]:
+                encoding = guess
+    else:
+        encoding = next((enc for enc in encodings if _is_valid_encoding(enc, samples)), None)
+        if encoding is None:
+            guess = chardet.detect(samples[0]).get('encoding')
+            if guess and _is_valid_encoding(guess, samples):
+                encoding = guess
+    logger.info('detected encoding %s for %s in %.3fs', encoding, path, time.time() - start)
+    return encoding
+
+
+def is_partitioned(path):
+    """路径是目录或者包含通配符时, 数据集由多个分区文件组成"""
+    return os.path.isdir(path) or any(char in path for char in GLOB_MAGIC_CHARS)
+
+
+def list_partitions(path):
+    """
+    列出分区数据集中的文件
+
+    :param path:  目录(其中的所有文件, 不含子目录)或者通配符, 如./data_sources/2014-2017/*.csv
+    :return:  按路径排序的分区文件列表
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(path, file_name) for file_name in os.listdir(path)
+                 if not file_name.startswith(IGNORED_PARTITION_PREFIXES)]
+    else:
+        paths = glob.glob(path)
+    paths = sorted(partition_path for partition_path in paths if os.path.isfile(partition_path))
+    if not paths:
+        raise DataLoaderException(f'No partition found in {path}')
+    return paths
+
+
+def get_dataset_name(path):
+    """数据集的名字, 用于报告的文件名: 单个文件为去掉后缀的文件名, 分区数据集为分区所在的目录名"""
+    if is_partitioned(path):
+        while any(char in path for char in GLOB_MAGIC_CHARS):
+            path = os.path.dirname(path)
+    return os.path.split(os.path.normpath(path))[-1].split('.')[0]
+
+
+def check_columns(columns, required_cols, path):
+    """数据集中缺少需要的列时报错"""
+    columns = set(columns)
+    missing_cols = [col for col in required_cols if col not in columns]
+    if missing_cols:
+        raise DataLoaderException(f'{missing_cols} does not included in {path}')
+
+
+def read_ascii(read_func, path, encodings, required_cols=None, **kwargs):
+    """
+    用检测出的编码解析文件一次, excel等二进制格式不检测编码
+
+    :param read_func:  pd.read_csv or pd.read_excel
+    :param encodings:  备选的编码方式
+    :param required_cols:  只读取这些列, 在解析数据之前先根据表头检查列是否都存在, 为None时读取所有列
+    :param kwargs:  传给read_func的其他参数
+    :return:  DataFrame
+    """
+    if os.path.splitext(path)[-1].lower() in BINARY_EXTENSIONS:
+        encoding_kwargs = {}
+    else:
+        encoding = detect_encoding(path, encodings)
+        if encoding is None:
+            raise DataLoaderException(f'Coding type of {path} not included in {encodings}!')
+        encoding_kwargs = {'encoding': encoding}
+    if required_cols is not None:
+        header = read_func(path, nrows=0, **encoding_kwargs, **kwargs)
+        check_columns(header.columns, required_cols, path)
+        kwargs['usecols'] = list(required_cols)
+    if not encoding_kwargs:
+        return read_func(path, **kwargs)
+    try:
+        return read_func(path, **encoding_kwargs, **kwargs)
+    except UnicodeDecodeError as e:
+        # 检测时已经校验过样本以及第一个非ASCII块, 其余部分无法解码时说明文件中混有不同的编码
+        raise DataLoaderException(f'Failed to parse {path} with the detected encoding {encoding}: {e}')
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise DataLoaderException('pyarrow is required for parquet/feather data sources, '
+                                  'please install it with: pip install pyarrow')
+    return pyarrow
+
+
+def read_columnar_columns(path, fmt):
+    """只读取parquet/feather文件的schema, 返回所有列名"""
+    pyarrow = _import_pyarrow()
+    if fmt == 'parquet':
+        return pyarrow.parquet.read_schema(path, memory_map=True).names
+    elif fmt == 'feather':
+        with pyarrow.memory_map(path) as source:
+            return pyarrow.ipc.open_file(source).schema.names
+    raise DataLoaderException(f'Unsupported columnar format: {fmt}')
+
+
+def read_columnar(path, fmt, required_cols=None):
+    """
+    读取parquet/feather文件, 使用内存映射并且只读取需要的列
+
+    :param fmt:  'parquet' or 'feather'
+    :param required_cols:  只读取这些列, 在读取数据之前先根据schema检查列是否都存在, 为None时读取所有列
+    :return:  DataFrame
+    """
+    pyarrow = _import_pyarrow()
+    if required_cols is not None:
+        check_columns(read_columnar_columns(path, fmt), required_cols, path)
+        required_cols = list(required_cols)
+    start = time.time()
+    if fmt == 'parquet':
+        table = pyarrow.parquet.read_table(path, columns=required_cols, memory_map=True)
+    elif fmt == 'feather':
+        table = pyarrow.feather.read_table(path, columns=required_cols, memory_map=True)
+    else:
+        raise DataLoaderException(f'Unsupported columnar format: {fmt}')
+    df = table.to_pandas()
+    logger.info('read %s columns from %s in %.3fs', df.shape[1], path, time.time() - start)
+    return df
+
+
+def write_columnar(df, path, fmt):
+    """
+    把DataFrame保存为parquet/feather文件, feather不压缩以便读取时直接内存映射
+
+    :param fmt:  'parquet' or 'feather'
+    """
+    _import_pyarrow()
+    if fmt == 'parquet':
+        df.to_parquet(path, engine='pyarrow', index=False)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path, compression='uncompressed')
+    else:
+        raise DataLoaderException(f'Unsupported columnar format: {fmt}')
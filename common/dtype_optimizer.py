@@ -0,0 +1,59 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Load-time dtype optimization shared by the qc and urs reports, all conversions are lossless
+#
+import collections
+
+import numpy as np
+import pandas as pd
+
+# 字符串列的取值个数不超过记录数的这个比例时转换为category
+CATEGORY_MAX_RATIO = 0.5
+
+
+def optimize_series(series, category_max_ratio=CATEGORY_MAX_RATIO):
+    """
+    压缩一列的内存占用, 不改变其中的取值:
+    - 取值个数较少的字符串(object)列转换为category, 能够排序时类别按取值升序排列
+    - 整数列降为能容纳所有取值的最小整数类型
+    - float64列在转换为float32不损失精度时降为float32
+
+    :return:  转换后的Series, 不需要转换时返回原来的Series
+    """
+    values = series.values
+    if series.dtype == object:
+        try:
+            codes, uniques = pd.factorize(values, sort=True)
+        except TypeError:
+            # 不同类型的取值混在一起时无法排序, 按首次出现的顺序排列
+            codes, uniques = pd.factorize(values)
+        if len(uniques) > category_max_ratio * len(values):
+            return series
+        return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=series.index, name=series.name)
+    if not isinstance(series.dtype, np.dtype):
+        return series
+    if series.dtype.kind in 'iu':
+        return pd.to_numeric(series, downcast='integer' if series.dtype.kind == 'i' else 'unsigned')
+    if series.dtype == np.float64:
+        downcast = values.astype(np.float32)
+        if np.array_equal(downcast.astype(np.float64), values, equal_nan=True):
+            return pd.Series(downcast, index=series.index, name=series.name)
+    return series
+
+
+def optimize_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO):
+    """
+    逐列压缩DataFrame的内存占用, 转换后的列直接替换df中原来的列, 同一时间只多占用一列的内存
+
+    :return:  an ordered dict mapping column name to (转换前的字节数, 转换后的字节数)
+    """
+    memory_usage = collections.OrderedDict()
+    for col_name in df.columns.tolist():
+        series = df[col_name]
+        before = series.memory_usage(index=False, deep=True)
+        optimized = optimize_series(series, category_max_ratio)
+        if optimized is not series:
+            df[col_name] = optimized
+        memory_usage[col_name] = (before, optimized.memory_usage(index=False, deep=True))
+    return memory_usage
@@ -0,0 +1,132 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# On-disk cache of computed profiles, keyed by the fingerprint of the data set and the relevant config
+#
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from common.data_loader import is_partitioned, list_partitions
+
+logger = logging.getLogger(__name__)
+
+# 缓存内容的格式版本, 统计逻辑或者缓存对象的结构变化时加1, 使旧的缓存全部失效
+PROFILE_CACHE_VERSION = 2
+
+# 计算文件指纹时从文件开头、中间、结尾各读取的字节数
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+
+# 缓存文件的后缀
+CACHE_FILE_SUFFIX = '.pkl'
+
+
+def fingerprint_file(path, sample_size=FINGERPRINT_SAMPLE_SIZE):
+    """
+    文件指纹: 路径、大小、修改时间以及开头、中间、结尾字节样本的哈希, 不需要读取整个文件
+
+    :return:  dict, 可以序列化为json
+    """
+    stat = os.stat(path)
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, stat.st_size // 2 - sample_size // 2), max(0, stat.st_size - sample_size)}):
+            f.seek(offset)
+            sha1.update(f.read(sample_size))
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sample_sha1': sha1.hexdigest()}
+
+
+def fingerprint_dataset(path):
+    """
+    数据集的指纹: 单个文件的指纹, 或者分区数据集中每个分区文件的指纹, 增加、删除或者修改任何一个分区时指纹都会变化
+
+    :param path:  文件、目录或者通配符
+    """
+    if is_partitioned(path):
+        return {'partitions': [fingerprint_file(partition_path) for partition_path in list_partitions(path)]}
+    return fingerprint_file(path)
+
+
+class ProfileCache(object):
+    """
+    缓存目录中每个键对应一个pickle文件, 文件的修改时间即最近一次使用的时间,
+    总大小超过max_size时删除最久没有使用的文件
+
+    :attribute cache_dir:  缓存目录
+    :attribute max_size:  缓存文件的总字节数上限
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def make_key(cls, kind, fingerprint, config):
+        """
+        :param kind:  缓存内容的类别, 如qc或者urs
+        :param fingerprint:  fingerprint_file的结果, 数据变化时键随之变化
+        :param config:  影响计算结果的配置项, dict, 配置变化时键随之变化
+        :return:  键的字符串
+        """
+        payload = json.dumps({'version': PROFILE_CACHE_VERSION, 'kind': kind, 'fingerprint': fingerprint,
+                              'config': config}, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_FILE_SUFFIX)
+
+    def get(self, key):
+        """
+        :return:  缓存的对象, 不存在或者无法读取时返回None
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning('failed to read profile cache %s: %s', entry_path, e)
+            self._remove(entry_path)
+            return None
+        # 更新修改时间, 作为最近使用时间
+        os.utime(entry_path)
+        logger.info('profile cache hit %s', key)
+        return value
+
+    def put(self, key, value):
+        """写入临时文件后再重命名, 中断时不会留下不完整的缓存"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """按最近使用时间从旧到新删除缓存文件, 直到总大小不超过max_size"""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(CACHE_FILE_SUFFIX):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entries.append((stat.st_mtime_ns, stat.st_size, file_name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(os.path.join(self.cache_dir, file_name))
+            total_size -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,29 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Exact quantiles of a data set given as distinct values and their counts
+#
+import numpy as np
+
+
+def _lerp(a, b, t):
+    """linear interpolation in the same way as numpy.percentile"""
+    diff_b_a = b - a
+    return np.where(t >= 0.5, b - diff_b_a * (1 - t), a + diff_b_a * t)
+
+
+def cal_weighted_quantiles(values, counts, quantiles):
+    """
+    calculate quantiles (linear interpolation) of a data set given as distinct values and their counts
+
+    :param values:  sorted distinct values
+    :param counts:  count of each value
+    :return:  an array with one element per quantile
+    """
+    cum_counts = np.cumsum(counts)
+    virtual_idx = np.asarray(quantiles) * (cum_counts[-1] - 1)
+    lower_idx = np.floor(virtual_idx)
+    upper_idx = np.ceil(virtual_idx)
+    lower = values[np.searchsorted(cum_counts, lower_idx, side='right')]
+    upper = values[np.searchsorted(cum_counts, upper_idx, side='right')]
+    return _lerp(lower, upper, virtual_idx - lower_idx)
@@ -0,0 +1,57 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# numpy arrays in shared memory, passed to worker processes by name instead of pickled copies
+#
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArray(object):
+    """
+    numpy array stored in a block of shared memory, only the name, dtype and shape are pickled,
+    worker processes attach to the same memory without copying the data
+
+    :attribute name:  name of the shared memory block
+    :attribute dtype:  dtype string of the array
+    :attribute shape:  shape of the array
+    """
+
+    def __init__(self, name, dtype, shape):
+        self.name = name
+        self.dtype = dtype
+        self.shape = shape
+        self._shm = None
+
+    @classmethod
+    def create_from_array(cls, array):
+        """copy array into a new block of shared memory, the creator is responsible for unlink"""
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared_array = cls(shm.name, array.dtype.str, array.shape)
+        shared_array._shm = shm
+        shared_array.to_array()[...] = array
+        return shared_array
+
+    def to_array(self):
+        """
+        :return:  ndarray backed by the shared memory, valid until close is called
+        """
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=self._shm.buf)
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self):
+        """free the shared memory, called once by the creator after all the workers finished"""
+        shm = self._shm or shared_memory.SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+        self._shm = None
+
+    def __getstate__(self):
+        return {'name': self.name, 'dtype': self.dtype, 'shape': self.shape, '_shm': None}
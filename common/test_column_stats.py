@@ -0,0 +1,55 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for column_stats
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from common.column_stats import ColumnStats, get_column_stats, peek_column_stats, start_sharing, stop_sharing
+
+
+class TestColumnStats(unittest.TestCase):
+    def tearDown(self):
+        stop_sharing()
+
+    def test_sorted_factorize(self):
+        for series in [pd.Series(['b', None, 'a', 'b', 'c']), pd.Series([3, 1, 2, 1]),
+                       pd.Series([2.5, np.nan, -1.0, 2.5]), pd.Series(['b', 'a', None, 'b'], dtype='category')]:
+            stats = ColumnStats.create_from_series(series)
+            codes, uniques = stats.sorted_factorize()
+            expected_codes, expected_uniques = pd.factorize(series.astype(object) if series.dtype == 'category'
+                                                            else series, sort=True)
+            np.testing.assert_array_equal(codes, expected_codes)
+            self.assertEqual(uniques.tolist(), pd.Index(expected_uniques).tolist())
+            self.assertEqual(stats.null_count, series.isnull().sum())
+            self.assertEqual(stats.value_counts().to_dict(), series.value_counts().to_dict())
+
+    def test_sharing(self):
+        df = pd.DataFrame({'a': [1, 2, 2], 'b': ['x', 'y', None]})
+        self.assertIsNone(peek_column_stats(df['a']))
+        self.assertIsNot(get_column_stats(df['a']), get_column_stats(df['a']))
+
+        start_sharing(['a'])
+        stats = get_column_stats(df['a'])
+        # 浅拷贝中没有被替换的列使用同一份结果
+        self.assertIs(get_column_stats(df.copy(deep=False)['a']), stats)
+        self.assertIs(peek_column_stats(df['a']), stats)
+        # 不共享的列以及被替换的列都不使用共享的结果
+        get_column_stats(df['b'])
+        self.assertIsNone(peek_column_stats(df['b']))
+        df_copy = df.copy(deep=False)
+        df_copy['a'] = df_copy['a'].astype(str)
+        self.assertIsNone(peek_column_stats(df_copy['a']))
+        self.assertIs(peek_column_stats(df['a']), stats)
+        # 长度和类型都不变, 但取值不同的列
+        df_copy['a'] = df['a'] * 2
+        self.assertIsNone(peek_column_stats(df_copy['a']))
+
+        stop_sharing()
+        self.assertIsNone(peek_column_stats(df['a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
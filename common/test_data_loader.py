@@ -0,0 +1,110 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for data_loader
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from common.convert_to_columnar import convert_to_columnar
+from common.data_loader import (DataLoaderException, detect_encoding, get_dataset_name, list_partitions, read_ascii,
+                                read_columnar)
+
+ENCODINGS = ('utf-8', 'gbk')
+
+
+class TestDataLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({'车牌号': ['浙A12345', '浙B23456'] * 1000, '标准保费': [1000.5, 2000.25] * 1000})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_csv(self, encoding):
+        path = os.path.join(self.tmp_dir.name, f'test_{encoding}.csv')
+        self.df.to_csv(path, index=False, encoding=encoding)
+        return path
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(self.write_csv('utf-8'), ENCODINGS), 'utf-8')
+        self.assertEqual(detect_encoding(self.write_csv('gbk'), ENCODINGS), 'gbk')
+        self.assertEqual(detect_encoding(self.write_csv('utf-8-sig'), ENCODINGS), 'utf-8-sig')
+
+    def test_detect_encoding_with_small_sample(self):
+        # 样本从文件中间截断多字节字符时仍能检测
+        self.assertEqual(detect_encoding(self.write_csv('gbk'), ENCODINGS, sample_size=101), 'gbk')
+        self.assertEqual(detect_encoding(self.write_csv('utf-8'), ENCODINGS, sample_size=101), 'utf-8')
+
+    def test_read_ascii(self):
+        df = read_ascii(pd.read_csv, self.write_csv('gbk'), ENCODINGS)
+        pd.testing.assert_frame_equal(df, self.df)
+
+    def test_read_ascii_with_detected_encoding(self):
+        # 备选编码都不符合时使用chardet检测出的编码
+        df = read_ascii(pd.read_csv, self.write_csv('gbk'), ('utf-8',))
+        pd.testing.assert_frame_equal(df, self.df)
+
+    def write_mostly_ascii_csv(self, encoding, chinese_row_pos):
+        """:return:  文件开头、中间和结尾的样本都是ASCII, 只有chinese_row_pos处的一行有中文"""
+        df = pd.DataFrame({'车牌号': [f'A{i:07d}' for i in range(200000)], '标准保费': 1000.5})
+        df.loc[chinese_row_pos, '车牌号'] = '浙A12345'
+        path = os.path.join(self.tmp_dir.name, f'mostly_ascii_{encoding}.csv')
+        # 表头也是中文, 写入时换成英文
+        df.rename(columns={'车牌号': 'plate', '标准保费': 'premium'}).to_csv(path, index=False, encoding=encoding)
+        return path, df.rename(columns={'车牌号': 'plate', '标准保费': 'premium'})
+
+    def test_read_ascii_with_ascii_samples(self):
+        path, df = self.write_mostly_ascii_csv('gbk', 50000)
+        self.assertEqual(detect_encoding(path, ENCODINGS, sample_size=1024), 'gbk')
+        # 只解析一次文件
+        with mock.patch.object(pd, 'read_csv', wraps=pd.read_csv) as read_csv:
+            pd.testing.assert_frame_equal(read_ascii(read_csv, path, ENCODINGS), df)
+        self.assertEqual(read_csv.call_count, 1)
+
+        self.assertEqual(detect_encoding(self.write_mostly_ascii_csv('utf-8', 50000)[0], ENCODINGS,
+                                         sample_size=1024), 'utf-8')
+
+    def test_read_ascii_with_mixed_encodings(self):
+        path, _ = self.write_mostly_ascii_csv('gbk', 50000)
+        with open(path, 'ab') as f:
+            f.write('A9999999,1000.5\n浙A12345,1000.5\n'.encode('utf-8'))
+        # 结尾的样本检测出utf-8, 中间的gbk部分无法解码时直接报错, 不再用其他编码重新解析
+        with mock.patch.object(pd, 'read_csv', wraps=pd.read_csv) as read_csv:
+            with self.assertRaises(DataLoaderException):
+                read_ascii(read_csv, path, ENCODINGS)
+        self.assertEqual(read_csv.call_count, 1)
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_read_columnar(self):
+        src_path = self.write_csv('gbk')
+        for fmt in ('parquet', 'feather'):
+            path = convert_to_columnar(src_path, fmt=fmt, encodings=ENCODINGS)
+            self.assertEqual(path, os.path.join(self.tmp_dir.name, f'test_gbk.{fmt}'))
+            pd.testing.assert_frame_equal(read_columnar(path, fmt), self.df)
+            pd.testing.assert_frame_equal(read_columnar(path, fmt, required_cols=['标准保费']), self.df[['标准保费']])
+            with self.assertRaises(DataLoaderException):
+                read_columnar(path, fmt, required_cols=['标准保费', 'not_exist'])
+
+    def test_list_partitions(self):
+        partition_dir = os.path.join(self.tmp_dir.name, '2014-2017')
+        os.makedirs(os.path.join(partition_dir, 'sub_dir'))
+        for file_name in ['2015.csv', '2014.csv', '_SUCCESS', '.DS_Store', '2014.txt']:
+            open(os.path.join(partition_dir, file_name), 'w').close()
+        expected = [os.path.join(partition_dir, file_name) for file_name in ['2014.csv', '2014.txt', '2015.csv']]
+        self.assertEqual(list_partitions(partition_dir), expected)
+        self.assertEqual(list_partitions(os.path.join(partition_dir, '*.csv')), expected[::2])
+        with self.assertRaises(DataLoaderException):
+            list_partitions(os.path.join(partition_dir, '*.pkl'))
+
+        self.assertEqual(get_dataset_name(partition_dir + os.sep), '2014-2017')
+        self.assertEqual(get_dataset_name(os.path.join(partition_dir, '*.csv')), '2014-2017')
+        self.assertEqual(get_dataset_name(os.path.join(partition_dir, '2014.csv')), '2014')
+
+
+if __name__ == '__main__':
+    unittest.main()
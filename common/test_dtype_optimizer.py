@@ -0,0 +1,42 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for dtype_optimizer
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from common.dtype_optimizer import optimize_dtypes, optimize_series
+
+
+class TestDtypeOptimizer(unittest.TestCase):
+    def test_optimize_series(self):
+        self.assertEqual(optimize_series(pd.Series([1, 2, 300])).dtype, np.int16)
+        self.assertEqual(optimize_series(pd.Series([1, 2, 3], dtype=np.uint64)).dtype, np.uint8)
+        self.assertEqual(optimize_series(pd.Series([0.5, np.nan, 1.25])).dtype, np.float32)
+        # 转换为float32会损失精度时保持float64
+        self.assertEqual(optimize_series(pd.Series([0.1, 0.2])).dtype, np.float64)
+
+        series = optimize_series(pd.Series(['b', 'a', None, 'b']))
+        self.assertEqual(series.dtype, 'category')
+        self.assertEqual(series.cat.categories.tolist(), ['a', 'b'])
+        self.assertEqual(series.isnull().tolist(), [False, False, True, False])
+        # 不同类型的取值混在一起时也能转换
+        self.assertEqual(sorted(optimize_series(pd.Series(['b', 1, 'b', 1])).cat.categories, key=str), [1, 'b'])
+        # 取值个数多的字符串列保持object
+        self.assertEqual(optimize_series(pd.Series(['a', 'b', 'c'])).dtype, object)
+
+    def test_optimize_dtypes(self):
+        df = pd.DataFrame({'int': np.arange(1000), 'str': ['a', 'b'] * 500, 'float': np.linspace(0, 1, 1000)})
+        expected_df = df.copy()
+        memory_usage = optimize_dtypes(df)
+        self.assertEqual(list(memory_usage.keys()), ['int', 'str', 'float'])
+        self.assertLess(memory_usage['int'][1], memory_usage['int'][0])
+        self.assertLess(memory_usage['str'][1], memory_usage['str'][0])
+        self.assertEqual(memory_usage['float'][1], memory_usage['float'][0])
+        pd.testing.assert_frame_equal(df, expected_df, check_dtype=False, check_categorical=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for profile_cache
+import os
+import tempfile
+import time
+import unittest
+
+from common.profile_cache import ProfileCache, fingerprint_dataset, fingerprint_file
+
+
+class TestProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'test.csv')
+        with open(self.path, 'w') as f:
+            f.write('a,b\n1,2\n')
+        self.cache = ProfileCache(os.path.join(self.tmp_dir.name, 'cache'), max_size=1024 ** 2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_and_put(self):
+        key = self.cache.make_key('qc', fingerprint_file(self.path), {'HEAD_LINE_NUM': 20})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, {'records_num': 1})
+        self.assertEqual(self.cache.get(key), {'records_num': 1})
+
+    def test_make_key(self):
+        fingerprint = fingerprint_file(self.path)
+        key = self.cache.make_key('qc', fingerprint, {'HEAD_LINE_NUM': 20})
+        self.assertEqual(key, self.cache.make_key('qc', fingerprint_file(self.path), {'HEAD_LINE_NUM': 20}))
+        self.assertNotEqual(key, self.cache.make_key('qc', fingerprint, {'HEAD_LINE_NUM': 10}))
+        self.assertNotEqual(key, self.cache.make_key('urs', fingerprint, {'HEAD_LINE_NUM': 20}))
+        # 数据变化后指纹变化
+        with open(self.path, 'w') as f:
+            f.write('a,b\n1,3\n')
+        self.assertNotEqual(key, self.cache.make_key('qc', fingerprint_file(self.path), {'HEAD_LINE_NUM': 20}))
+
+    def test_fingerprint_dataset(self):
+        self.assertEqual(fingerprint_dataset(self.path), fingerprint_file(self.path))
+        fingerprint = fingerprint_dataset(self.tmp_dir.name)
+        self.assertEqual(fingerprint, {'partitions': [fingerprint_file(self.path)]})
+        # 增加分区后指纹变化
+        with open(os.path.join(self.tmp_dir.name, 'test2.csv'), 'w') as f:
+            f.write('a,b\n3,4\n')
+        self.assertNotEqual(fingerprint_dataset(self.tmp_dir.name), fingerprint)
+
+    def test_evict(self):
+        cache = ProfileCache(os.path.join(self.tmp_dir.name, 'small_cache'), max_size=2500)
+        for key in ['a', 'b']:
+            cache.put(key, b'x' * 1000)
+            time.sleep(0.01)
+        # 读取a使其成为最近使用的, 写入c时淘汰最久没有使用的b
+        cache.get('a')
+        time.sleep(0.01)
+        cache.put('c', b'x' * 1000)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_get_broken_entry(self):
+        with open(os.path.join(self.cache.cache_dir, 'broken.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(self.cache.get('broken'))
+        self.assertFalse(os.path.exists(os.path.join(self.cache.cache_dir, 'broken.pkl')))
+
+
+if __name__ == '__main__':
+    unittest.main()
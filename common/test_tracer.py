@@ -0,0 +1,71 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for tracer
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from common.tracer import (TRACE_FILE_SUFFIX, TRACE_VERSION, finish_tracing, get_tracer, start_tracing,
+                           stop_tracing, trace_record, trace_span)
+
+
+class TestTracer(unittest.TestCase):
+    def tearDown(self):
+        stop_tracing()
+
+    def test_disabled(self):
+        self.assertIsNone(get_tracer())
+        with trace_span('load', path='a.csv') as span:
+            span.set(rows=1)
+        trace_record('column', 1.0)
+        self.assertIsNone(finish_tracing('report.html', 10))
+
+    def test_nested_spans(self):
+        tracer = start_tracing('qc')
+        with trace_span('profile', rows=3):
+            with trace_span('column', col='a') as span:
+                span.set(dtype='int64')
+            trace_record('column', 0.5, col='b', worker=True)
+
+        def run_in_thread():
+            with trace_span('write_var', var='c'):
+                pass
+
+        thread = threading.Thread(target=run_in_thread)
+        thread.start()
+        thread.join()
+
+        profile, column_a, column_b, write_var = tracer.spans
+        self.assertEqual([span.name for span in tracer.spans], ['profile', 'column', 'column', 'write_var'])
+        self.assertEqual(column_a.attrs, {'col': 'a', 'dtype': 'int64'})
+        self.assertEqual((column_a.parent, column_a.depth), (0, 1))
+        self.assertEqual((column_b.parent, column_b.seconds), (0, 0.5))
+        # 其他线程中的阶段不嵌套在当前线程的阶段中
+        self.assertEqual((write_var.parent, write_var.depth), (None, 0))
+        self.assertAlmostEqual(profile.child_seconds, column_a.seconds + 0.5)
+        self.assertEqual(profile.self_seconds, max(profile.seconds - profile.child_seconds, 0))
+
+        summary = tracer.format_slowest(2)
+        self.assertEqual(len(summary.splitlines()), 4)
+        self.assertIn('column col=b worker=True', summary.splitlines()[2])
+
+    def test_finish_tracing(self):
+        start_tracing('urs')
+        with trace_span('load', path='a.csv') as span:
+            span.set(rows=10)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_path = finish_tracing(os.path.join(tmp_dir, 'report.xlsx'), 10)
+            self.assertEqual(trace_path, os.path.join(tmp_dir, 'report' + TRACE_FILE_SUFFIX))
+            with open(trace_path, encoding='utf-8') as f:
+                trace = json.load(f)
+        self.assertIsNone(get_tracer())
+        self.assertEqual((trace['version'], trace['name']), (TRACE_VERSION, 'urs'))
+        self.assertEqual(trace['spans'][0]['attrs'], {'path': 'a.csv', 'rows': 10})
+        self.assertGreaterEqual(trace['seconds'], trace['spans'][0]['seconds'])
+
+
+if __name__ == '__main__':
+    unittest.main()
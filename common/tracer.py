@@ -0,0 +1,225 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Stage-level timing and memory instrumentation shared by the qc and urs reports
+#
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # windows上没有resource模块, 不记录内存峰值
+    resource = None
+
+# trace文件的格式版本, 结构变化时加1
+TRACE_VERSION = 1
+
+# trace文件与报告同名, 使用这个后缀
+TRACE_FILE_SUFFIX = '.trace.json'
+
+
+def peak_rss_mb():
+    """当前进程到目前为止的内存峰值(MB), 无法获取时为None"""
+    # linux上ru_maxrss在exec后保留了父进程的峰值, 使用/proc中只属于当前进程映像的VmHWM
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux上单位是KB, macOS上是字节
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+class Span:
+    """一个阶段的耗时, 阶段中处理的记录数等属性可以在阶段结束前通过set补充"""
+
+    def __init__(self, name, attrs, parent, depth, start):
+        self.name = name
+        self.attrs = attrs
+        # 外层阶段在Tracer.spans中的下标, 顶层阶段为None
+        self.parent = parent
+        self.depth = depth
+        # 相对于开始记录时的秒数
+        self.start = start
+        self.seconds = None
+        # 直接嵌套在其中的阶段的耗时之和
+        self.child_seconds = 0.0
+        # 阶段结束时进程的内存峰值(MB)
+        self.peak_rss_mb = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def self_seconds(self):
+        """不包括嵌套阶段的耗时"""
+        return max(self.seconds - self.child_seconds, 0.0)
+
+    def describe(self):
+        return ' '.join([self.name] + [f'{key}={value}' for key, value in self.attrs.items()])
+
+    def to_dict(self):
+        return {'name': self.name, 'attrs': self.attrs, 'parent': self.parent, 'depth': self.depth,
+                'thread': self.thread, 'start': round(self.start, 4), 'seconds': round(self.seconds, 4),
+                'self_seconds': round(self.self_seconds, 4), 'peak_rss_mb': self.peak_rss_mb}
+
+
+class _NullSpan:
+    """没有开启记录时使用, 不做任何事"""
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    按开始的顺序记录嵌套的阶段, 每个线程分别维护当前所在的阶段;
+    并行模式下子进程中的阶段不会被记录, 需要在子进程中计时后通过record补充
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.created = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.seconds = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _add_span(self, name, attrs, start):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span = Span(name=name, attrs=attrs, parent=parent, depth=len(stack), start=start)
+        with self._lock:
+            self.spans.append(span)
+            return span, len(self.spans) - 1
+
+    def _finish_span(self, span, seconds):
+        span.seconds = seconds
+        span.peak_rss_mb = peak_rss_mb()
+        if span.parent is not None:
+            with self._lock:
+                self.spans[span.parent].child_seconds += seconds
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        span, span_idx = self._add_span(name, attrs, start - self.origin)
+        stack = self._stack()
+        stack.append(span_idx)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            self._finish_span(span, time.perf_counter() - start)
+
+    def record(self, name, seconds, **attrs):
+        """补充一个已经结束的阶段, 如在子进程中计时的阶段, 作为当前阶段的嵌套阶段"""
+        span, _ = self._add_span(name, attrs, time.perf_counter() - self.origin - seconds)
+        self._finish_span(span, seconds)
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.origin
+
+    def to_dict(self):
+        return {'version': TRACE_VERSION, 'name': self.name, 'created': self.created,
+                'seconds': round(self.seconds, 4) if self.seconds is not None else None,
+                'peak_rss_mb': peak_rss_mb(), 'spans': [span.to_dict() for span in self.spans]}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+
+    def format_slowest(self, n):
+        """不包括嵌套阶段的耗时最长的n个阶段"""
+        spans = sorted((span for span in self.spans if span.seconds is not None), key=lambda span: span.self_seconds,
+                       reverse=True)[:n]
+        total = self.seconds if self.seconds is not None else time.perf_counter() - self.origin
+        rss = peak_rss_mb()
+        lines = [f'slowest {len(spans)} stages of {self.name} report (total {total:.2f}s'
+                 + (f', peak memory {rss:.1f}MB)' if rss is not None else ')'),
+                 f'{"self(s)":>10} {"total(s)":>10}  stage']
+        for span in spans:
+            lines.append(f'{span.self_seconds:>10.3f} {span.seconds:>10.3f}  {span.describe()}')
+        return '\n'.join(lines)
+
+
+# 当前正在记录的Tracer, 为None时不记录
+_tracer = None
+
+
+def start_tracing(name):
+    """开始记录, 之后trace_span标记的阶段都会被记录"""
+    global _tracer
+    _tracer = Tracer(name)
+    return _tracer
+
+
+def get_tracer():
+    """:return:  当前的Tracer, 没有开启记录时为None"""
+    return _tracer
+
+
+def trace_span(name, **attrs):
+    """
+    标记一个阶段, 没有开启记录时不做任何事
+
+    例如: with trace_span('load', path=path) as span:
+             df = read(path)
+             span.set(rows=len(df))
+    """
+    if _tracer is None:
+        return contextlib.nullcontext(_NULL_SPAN)
+    return _tracer.span(name, **attrs)
+
+
+def trace_record(name, seconds, **attrs):
+    """补充一个在别处计时的阶段, 没有开启记录时不做任何事"""
+    if _tracer is not None:
+        _tracer.record(name, seconds, **attrs)
+
+
+def stop_tracing():
+    """:return:  停止记录的Tracer, 没有开启记录时为None"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.stop()
+    return tracer
+
+
+def finish_tracing(report_path, slowest_n):
+    """
+    停止记录, 把trace写到报告旁边并打印耗时最长的阶段
+
+    :param report_path:  报告文件的路径, trace文件与其同名, 后缀为TRACE_FILE_SUFFIX
+    :return:  trace文件的路径, 没有开启记录时为None
+    """
+    tracer = stop_tracing()
+    if tracer is None:
+        return None
+    trace_path = os.path.splitext(report_path)[0] + TRACE_FILE_SUFFIX
+    tracer.write(trace_path)
+    print(tracer.format_slowest(slowest_n))
+    print(f'trace is written to {trace_path}')
+    return trace_path
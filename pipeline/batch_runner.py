@@ -0,0 +1,315 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Run the qc and urs reports of many data sets listed in a manifest on a bounded pool of processes
+#
+# 例如: python pipeline/batch_runner.py manifest.json --output-dir ./batch_reports --workers 4
+#
+# manifest是一个json列表, 每项是一个任务:
+#     {"name": "client_a", "path": "./data_sources/client_a.csv", "type": "csv", "report": "both",
+#      "overrides": {"VARS_GROUPS": {"从车因素": ["veh_age"]}, "SKIP_ROWS": [1]}}
+# report为qc、urs或者both(只读取一次数据集, 见run_reports.py), type为urs/config.py中DSType的取值,
+# overrides覆盖qc/format_config.py或urs/config.py中的同名配置, 只对该任务生效
+#
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from common.data_loader import DataLoaderException, is_partitioned, list_partitions
+from common.tracer import peak_rss_mb
+
+# 汇总文件的格式版本, 结构变化时加1
+SUMMARY_VERSION = 1
+
+# 汇总文件写在输出目录下的这个文件中
+SUMMARY_FILE_NAME = 'batch_summary.json'
+
+REPORT_KINDS = ('qc', 'urs', 'both')
+
+# 估计任务的内存占用时, 读入后的DataFrame大约是文件大小的倍数
+MEMORY_PER_INPUT_SIZE = {'csv': 5, 'xlsx': 10, 'pkl': 2, 'parquet': 6, 'feather': 2}
+
+# 任务进程本身(python解释器、pandas等)的内存占用(MB)
+BASE_MEMORY_MB = 200
+
+# 没有指定内存上限时, 使用开始时可用内存的这个比例
+MEMORY_BUDGET_RATIO = 0.8
+
+
+class BatchException(Exception):
+    pass
+
+
+class BatchJob:
+    """manifest中的一个任务"""
+
+    def __init__(self, name, path, data_source_type, report, overrides=None, memory_mb=None):
+        self.name = name
+        self.path = path
+        # urs/config.py中DSType的取值, 如csv
+        self.data_source_type = data_source_type
+        self.report = report
+        # {配置名: 取值}, 在任务进程导入报告模块之前覆盖配置
+        self.overrides = overrides or {}
+        self.input_mb = get_input_mb(path)
+        # 估计的内存占用(MB), 决定可以同时运行的任务
+        self.memory_mb = memory_mb if memory_mb is not None else estimate_memory_mb(self.input_mb, data_source_type)
+
+    @classmethod
+    def create_from_dict(cls, job):
+        missing_keys = [key for key in ('path', 'type', 'report') if key not in job]
+        if missing_keys:
+            raise BatchException(f'{missing_keys} are required in job {job}')
+        if job['report'] not in REPORT_KINDS:
+            raise BatchException(f'Unsupported report {job["report"]} of job {job}, expected one of {REPORT_KINDS}')
+        if job['type'] not in MEMORY_PER_INPUT_SIZE:
+            raise BatchException(f'Unsupported type {job["type"]} of job {job}, '
+                                 f'expected one of {tuple(MEMORY_PER_INPUT_SIZE)}')
+        name = job.get('name') or os.path.splitext(os.path.basename(os.path.normpath(job['path'])))[0]
+        return cls(name=name, path=job['path'], data_source_type=job['type'], report=job['report'],
+                   overrides=job.get('overrides'), memory_mb=job.get('memory_mb'))
+
+
+def load_manifest(path):
+    """:return:  BatchJob的列表, 任务名重复时报错"""
+    with open(path, encoding='utf-8') as f:
+        jobs = [BatchJob.create_from_dict(job) for job in json.load(f)]
+    names = [job.name for job in jobs]
+    duplicated_names = sorted({name for name in names if names.count(name) > 1})
+    if duplicated_names:
+        raise BatchException(f'job names {duplicated_names} are duplicated in {path}')
+    return jobs
+
+
+def get_input_mb(path):
+    """数据集的大小(MB), 分区数据集为所有分区之和, 不存在时为0(任务运行时报错)"""
+    try:
+        paths = list_partitions(path) if is_partitioned(path) else [path]
+        return sum(os.path.getsize(partition_path) for partition_path in paths) / 1024 ** 2
+    except (OSError, DataLoaderException):
+        return 0.0
+
+
+def estimate_memory_mb(input_mb, data_source_type):
+    return BASE_MEMORY_MB + input_mb * MEMORY_PER_INPUT_SIZE[data_source_type]
+
+
+def available_memory_mb():
+    """当前可用的内存(MB), 无法获取时为None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def pick_next_job(pending_jobs, running_num, running_memory_mb, workers, memory_budget_mb):
+    """
+    在正在运行的任务之外选出下一个可以开始的任务
+
+    :param pending_jobs:  等待的任务, 按估计的内存占用从大到小排列, 大任务先开始, 最后由小任务填满空闲的进程
+    :param memory_budget_mb:  同时运行的任务估计的内存占用之和的上限, 为None时只限制进程数;
+            没有任务在运行时, 超过上限的任务也会单独运行
+    :return:  pending_jobs中的下标, 没有可以开始的任务时为None
+    """
+    if running_num >= workers:
+        return None
+    for job_idx, job in enumerate(pending_jobs):
+        if running_num == 0 or memory_budget_mb is None or running_memory_mb + job.memory_mb <= memory_budget_mb:
+            return job_idx
+    return None
+
+
+def _apply_overrides(overrides):
+    """在任务进程中导入报告模块之前覆盖配置, 报告模块中作为默认参数的配置也会使用覆盖后的取值"""
+    import config
+    import format_config
+    for key, value in overrides.items():
+        modules = [module for module in (format_config, config) if hasattr(module, key)]
+        if not modules:
+            raise BatchException(f'{key} is neither in qc/format_config.py nor in urs/config.py')
+        if key == 'TARGET_VARS_CALC_CONFIG':
+            # json中计算方式为字符串, 两列相除时的原始列为列表
+            value = {target_var: {'orig_cols': tuple(calc_config['orig_cols'])
+                                  if isinstance(calc_config['orig_cols'], list) else calc_config['orig_cols'],
+                                  'calc_way': config.TargetVarsCalcWay(calc_config['calc_way'])}
+                     for target_var, calc_config in value.items()}
+        for module in modules:
+            setattr(module, key, value)
+
+
+def run_job(job, report_folder):
+    """
+    在单独的进程中运行一个任务, 每个任务一个新的进程, 配置的覆盖和内存峰值互不影响
+
+    :return:  报告文件的路径列表
+    """
+    sys.path.append(os.path.join(ROOT_DIR, 'qc'))
+    sys.path.append(os.path.join(ROOT_DIR, 'urs'))
+    _apply_overrides(dict(job.overrides, REPORT_FOLDER=report_folder))
+    from config import DSType
+    data_source_type = DSType(job.data_source_type)
+    if job.report == 'both':
+        from pipeline.run_reports import load_dataset, run_reports
+        df = load_dataset(job.path, data_source_type)
+        return list(run_reports(df, job.path, qc_report_folder=report_folder, urs_report_folder=report_folder))
+    elif job.report == 'qc':
+        from data_quality_reporter import ReportInfo
+        from format_config import DATA_SOURCE_TYPE
+        qc_type = {DSType.CSV: DATA_SOURCE_TYPE.CSV, DSType.PKL: DATA_SOURCE_TYPE.PICKLE,
+                   DSType.EXCEL: DATA_SOURCE_TYPE.EXCEL, DSType.PARQUET: DATA_SOURCE_TYPE.PARQUET,
+                   DSType.FEATHER: DATA_SOURCE_TYPE.FEATHER}[data_source_type]
+        report_info = ReportInfo.create_from_data_frame_info(data_source_type=qc_type, path=job.path)
+        return [report_info.to_html(report_folder=report_folder)]
+    else:
+        from urs_reporter import ReportInfo
+        report_info = ReportInfo(data_source_type=data_source_type, path=job.path)
+        report_info.to_excel()
+        return [report_info.report_generator.get_excel_path()]
+
+
+def _run_job_in_worker(job, report_folder):
+    """:return:  (报告文件的路径列表, 错误信息, 耗时的秒数, 进程的内存峰值), 任务失败时报告文件的路径为None"""
+    start = time.perf_counter()
+    try:
+        outputs, error = run_job(job, report_folder), None
+    except Exception:
+        outputs, error = None, traceback.format_exc()
+    return outputs, error, time.perf_counter() - start, peak_rss_mb()
+
+
+class BatchRunner:
+    """在最多workers个进程中运行任务, 同时运行的任务估计的内存占用之和不超过memory_budget_mb"""
+
+    def __init__(self, jobs, output_dir, workers, memory_budget_mb=None):
+        self.jobs = jobs
+        self.output_dir = output_dir
+        self.workers = workers
+        self.memory_budget_mb = memory_budget_mb
+        self.results = {}
+        self._condition = threading.Condition()
+        self._running_num = 0
+        self._running_memory_mb = 0.0
+
+    def run(self):
+        """:return:  按manifest顺序排列的任务结果"""
+        start = time.perf_counter()
+        pending_jobs = sorted(self.jobs, key=lambda job: job.memory_mb, reverse=True)
+        threads = []
+        with self._condition:
+            while pending_jobs:
+                job_idx = pick_next_job(pending_jobs, self._running_num, self._running_memory_mb, self.workers,
+                                        self.memory_budget_mb)
+                if job_idx is None:
+                    self._condition.wait()
+                    continue
+                job = pending_jobs.pop(job_idx)
+                self._running_num += 1
+                self._running_memory_mb += job.memory_mb
+                thread = threading.Thread(target=self._run_job, args=(job, time.perf_counter() - start),
+                                          name=f'batch-{job.name}')
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return [self.results[job.name] for job in self.jobs]
+
+    def _run_job(self, job, start_offset):
+        report_folder = os.path.join(self.output_dir, job.name)
+        print(f'start {job.report} job {job.name} ({job.input_mb:.1f}MB, estimated {job.memory_mb:.0f}MB memory)')
+        try:
+            os.makedirs(report_folder, exist_ok=True)
+            # 每个任务一个新的进程: 配置的覆盖互不影响, 进程异常退出(如内存不足被杀掉)也只影响这个任务
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                outputs, error, seconds, rss = executor.submit(_run_job_in_worker, job, report_folder).result()
+        except BrokenProcessPool:
+            outputs, error, seconds, rss = None, 'the job process terminated abruptly', None, None
+        except Exception:
+            outputs, error, seconds, rss = None, traceback.format_exc(), None, None
+        result = {'name': job.name, 'report': job.report, 'path': job.path, 'type': job.data_source_type,
+                  'status': 'ok' if error is None else 'failed', 'error': error, 'outputs': outputs,
+                  'input_mb': round(job.input_mb, 3), 'estimated_memory_mb': round(job.memory_mb, 1),
+                  'start': round(start_offset, 3), 'seconds': round(seconds, 3) if seconds is not None else None,
+                  'peak_rss_mb': rss}
+        print(f'{result["status"]} {job.report} job {job.name}' +
+              (f' in {seconds:.2f}s' if seconds is not None else '') +
+              (f': {error.strip().splitlines()[-1]}' if error else ''))
+        with self._condition:
+            self.results[job.name] = result
+            self._running_num -= 1
+            self._running_memory_mb -= job.memory_mb
+            self._condition.notify()
+
+
+def summarize(results, wall_seconds, workers, memory_budget_mb):
+    """:return:  可以序列化为json的汇总, 包括吞吐量以及相对于依次运行的加速比"""
+    succeeded = [result for result in results if result['status'] == 'ok']
+    job_seconds = sum(result['seconds'] or 0 for result in results)
+    input_mb = sum(result['input_mb'] for result in succeeded)
+    return {'version': SUMMARY_VERSION, 'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'workers': workers, 'memory_budget_mb': memory_budget_mb,
+            'jobs': len(results), 'succeeded': len(succeeded), 'failed': len(results) - len(succeeded),
+            'wall_seconds': round(wall_seconds, 3), 'job_seconds': round(job_seconds, 3),
+            'speedup': round(job_seconds / wall_seconds, 2) if wall_seconds else None,
+            'jobs_per_hour': round(len(succeeded) / wall_seconds * 3600, 1) if wall_seconds else None,
+            'input_mb_per_second': round(input_mb / wall_seconds, 3) if wall_seconds else None,
+            'results': results}
+
+
+def format_summary(summary):
+    """每行一个任务, 最后是整体的耗时和吞吐量"""
+    lines = [f'{"status":<7} {"report":<6} {"input_mb":>10} {"seconds":>10} {"peak_rss_mb":>12}  job']
+    for result in summary['results']:
+        seconds = f'{result["seconds"]:>10.2f}' if result['seconds'] is not None else f'{"-":>10}'
+        rss = f'{result["peak_rss_mb"]:>12.1f}' if result['peak_rss_mb'] is not None else f'{"-":>12}'
+        lines.append(f'{result["status"]:<7} {result["report"]:<6} {result["input_mb"]:>10.1f} {seconds} {rss}  '
+                     f'{result["name"]}')
+    lines.append(f'{summary["succeeded"]}/{summary["jobs"]} jobs succeeded in {summary["wall_seconds"]:.2f}s '
+                 f'with {summary["workers"]} workers ({summary["job_seconds"]:.2f}s in total, '
+                 f'speedup {summary["speedup"]}, {summary["jobs_per_hour"]} jobs/hour, '
+                 f'{summary["input_mb_per_second"]}MB/s)')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='run the qc and urs reports of the jobs in a manifest')
+    parser.add_argument('manifest', help='任务列表的json文件')
+    parser.add_argument('--output-dir', default='./batch_reports', help='每个任务的报告写在其中以任务名命名的目录下')
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)),
+                        help='同时运行的任务数')
+    parser.add_argument('--max-memory-mb', type=float,
+                        help='同时运行的任务估计的内存占用之和的上限, 默认为可用内存的80%%')
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    memory_budget_mb = args.max_memory_mb
+    if memory_budget_mb is None:
+        available_mb = available_memory_mb()
+        memory_budget_mb = available_mb * MEMORY_BUDGET_RATIO if available_mb is not None else None
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = BatchRunner(jobs, args.output_dir, args.workers, memory_budget_mb).run()
+    summary = summarize(results, time.perf_counter() - start, args.workers, memory_budget_mb)
+    summary_path = os.path.join(args.output_dir, SUMMARY_FILE_NAME)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(format_summary(summary))
+    print(f'summary is written to {summary_path}')
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Local report server keeping one data set in memory, the frequency tables and urs tables are calculated on demand
+#
+# 例如: python pipeline/report_server.py --path ./data_sources/全变量.csv --type csv --port 8080
+# 然后在浏览器中打开 http://127.0.0.1:8080/ (qc报告) 或者 http://127.0.0.1:8080/urs (urs表)
+#
+import argparse
+import collections
+import datetime
+import os
+import sys
+import threading
+from urllib.parse import quote
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+# qc和urs的模块使用各自目录下的配置(format_config.py和config.py), 两者的模块名不重复
+sys.path.append(os.path.join(ROOT_DIR, 'qc'))
+sys.path.append(os.path.join(ROOT_DIR, 'urs'))
+from bottle import Bottle, HTTPError, SimpleTemplate, response, static_file
+from common.data_loader import get_dataset_name
+from common.dtype_optimizer import optimize_dtypes
+from common.tracer import finish_tracing, start_tracing, trace_span
+from config import DS_FILE_PATH, DS_TYPE, OPTIMIZE_DTYPES, TRACE_ENABLED, TRACE_SLOWEST_N, DSType
+from data_quality_reporter import DataFrameColsInfo, DataFrameInfo
+from format_config import COLS_FORCED_TO_STR, COLS_TYPE_SHOW_DESC, FILL_NAN_WITH_BLANK, HEAD_LINE_NUM
+from pipeline.run_reports import load_dataset
+from profile_artifact import (REPORT_TEMPLATE, TEMPLATE_DIR, create_col_profile, create_profile_artifact,
+                              get_var_id, iter_report_fragments, render_freq_table_script)
+from urs_reporter import ReportGenerator, URSException
+
+# 缓存的频数统计表和urs表的个数, 超过时删除最久没有查看的
+SERVER_CACHE_SIZE = 256
+
+# 报告页面中的频数统计表从这个路径加载, 见profile_artifact.iter_report_fragments
+FRAGMENTS_URL = '/fragments'
+
+# qc报告使用的样式表
+CSS_DIR = os.path.join(ROOT_DIR, 'qc', 'dataQualityReports', 'css')
+
+URS_INDEX_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta http-equiv="Content-type" content="text/html; charset=utf-8">
+    <title>URS - {{df_name}}</title>
+    <link type="text/css" href="/css/main.css" rel="stylesheet">
+</head>
+<body>
+<p class="SystemTitle2">{{df_name}} urs表</p>
+% if error:
+<p>{{error}}</p>
+% else:
+<ul>
+    % for var_name in var_names:
+    <li><a href="/urs/{{quote(var_name, safe='')}}">{{var_name}}</a></li>
+    % end
+</ul>
+% end
+</body>
+</html>
+'''
+
+URS_TABLE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta http-equiv="Content-type" content="text/html; charset=utf-8">
+    <title>URS - {{var_name}}</title>
+    <link type="text/css" href="/css/main.css" rel="stylesheet">
+</head>
+<body>
+<p><a href="/urs">所有变量</a></p>
+<div align="center">
+{{!table}}
+</div>
+</body>
+</html>
+'''
+
+
+class ReportServerException(Exception):
+    pass
+
+
+class LRUCache:
+    """按最近一次使用的顺序保存结果, 超过maxsize时删除最久没有使用的"""
+
+    def __init__(self, maxsize=SERVER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, func):
+        """:return:  key的缓存结果, 没有缓存时调用func计算并缓存; 计算出错时不缓存"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        # 计算时不持有锁, 同一个结果同时被请求时可能计算两次
+        value = func()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ReportServer:
+    """
+    数据集只读取一次并保留在内存中:
+    - qc报告的页面只包含概览、变量列表、综合统计和样本数据, 第一次打开时计算
+    - 每个变量的频数统计表在展开时计算, urs表在打开时计算, 结果都放在LRU缓存中, 再次查看时直接返回
+    """
+
+    def __init__(self, df, path, memory_usage=None, cache_size=SERVER_CACHE_SIZE, cols_forced_to_str=None):
+        # urs使用原始的数据集
+        self.df = df
+        self.path = path
+        self.memory_usage = memory_usage
+        # qc使用浅拷贝, 强制转换为字符串的列只在拷贝中可见
+        self.qc_df = df.copy(deep=False)
+        for col_name in (COLS_FORCED_TO_STR if cols_forced_to_str is None else cols_forced_to_str):
+            self.qc_df[col_name] = self.qc_df[col_name].astype(str)
+        # 与qc报告相同, 按字母序排列的列, 列的下标就是频数统计表的编号(get_var_id)
+        self.col_names = sorted(df.columns)
+        self.cache = LRUCache(cache_size)
+        self.report_template = SimpleTemplate(name=REPORT_TEMPLATE, lookup=[TEMPLATE_DIR])
+        self.urs_index_template = SimpleTemplate(URS_INDEX_TEMPLATE)
+        self.urs_table_template = SimpleTemplate(URS_TABLE_TEMPLATE)
+        self._profile = None
+        self._overview_html = None
+        self._overview_lock = threading.Lock()
+        # urs只需要目标变量用到的原始列, 自变量可以是任意一列; 缺少原始列时qc报告仍然可以查看
+        try:
+            self.report_generator = ReportGenerator.create_generator_from_df(df, path=path, var_groups={},
+                                                                             cache_dir=None)
+            self.urs_error = None
+        except URSException as e:
+            self.report_generator = None
+            self.urs_error = str(e)
+
+    def get_profile(self):
+        """:return:  不含频数统计表的profile, 可以计算频数统计表的列设置了freq_table_on_demand"""
+        with self._overview_lock:
+            if self._profile is None:
+                with trace_span('overview', rows=len(self.qc_df), cols=self.qc_df.shape[1]):
+                    df_info = DataFrameInfo.create_df_comm_op(orig_df=self.qc_df, path=self.path,
+                                                              cols_forced_to_str=[],
+                                                              fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                                                              head_line_num=HEAD_LINE_NUM, optimize=False,
+                                                              freq_tables=False)
+                    df_info.memory_usage = self.memory_usage
+                    process_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    profile = create_profile_artifact(df_info.release_data(), process_time)
+                for col, col_info in zip(profile['cols'], df_info.cols.values()):
+                    col['freq_table_on_demand'] = col_info.type_code in COLS_TYPE_SHOW_DESC
+                self._profile = profile
+            return self._profile
+
+    def get_overview_html(self):
+        """:return:  qc报告的页面, 频数统计表展开时从FRAGMENTS_URL加载"""
+        profile = self.get_profile()
+        with self._overview_lock:
+            if self._overview_html is None:
+                self._overview_html = ''.join(iter_report_fragments(profile, fragments_url=FRAGMENTS_URL))
+            return self._overview_html
+
+    def get_freq_table_script(self, col_pos):
+        """:return:  第col_pos列的频数统计表, 调用报告页面中qcFragmentLoaded的脚本"""
+        profile = self.get_profile()
+        if not 0 <= col_pos < len(profile['cols']) or not profile['cols'][col_pos]['freq_table_on_demand']:
+            raise ReportServerException(f'No frequency table of column {col_pos}')
+        return self.cache.get_or_compute(('freq_table', col_pos), lambda: self._render_freq_table(col_pos))
+
+    def _render_freq_table(self, col_pos):
+        profile = self.get_profile()
+        col_name = self.col_names[col_pos]
+        with trace_span('column', col=col_name, rows=len(self.qc_df)):
+            col_info = DataFrameColsInfo(col_name, self.qc_df, COLS_TYPE_SHOW_DESC)
+            col = create_col_profile(col_info, profile['cols'][col_pos]['idx'],
+                                     profile['cols'][col_pos]['memory'])
+            return render_freq_table_script(self.report_template, profile, col, get_var_id(col_pos))
+
+    def get_urs_df(self, var_name):
+        """:return:  变量的urs表"""
+        if self.report_generator is None:
+            raise ReportServerException(self.urs_error)
+        if var_name not in self.df.columns:
+            raise ReportServerException(f'{var_name} does not included in dataframe')
+        return self.cache.get_or_compute(('urs', var_name),
+                                         lambda: self.report_generator.create_calculator(var_name).generate_urs_df())
+
+    def get_urs_index_html(self):
+        """:return:  所有变量的列表, 点击后打开变量的urs表"""
+        return self.urs_index_template.render(df_name=get_dataset_name(self.path), error=self.urs_error,
+                                              var_names=self.col_names, quote=quote)
+
+    def get_urs_html(self, var_name):
+        urs_df = self.get_urs_df(var_name)
+        return self.urs_table_template.render(var_name=var_name, table=urs_df.to_html(classes='Table', na_rep=''))
+
+    def create_app(self):
+        """:return:  bottle应用, 可以用bottle.run或者任意wsgi服务运行"""
+        app = Bottle()
+
+        @app.get('/')
+        def overview():
+            return self.get_overview_html()
+
+        @app.get(FRAGMENTS_URL + '/var_<col_pos:int>.js')
+        def freq_table(col_pos):
+            try:
+                script = self.get_freq_table_script(col_pos)
+            except ReportServerException as e:
+                raise HTTPError(404, str(e))
+            response.content_type = 'application/javascript; charset=utf-8'
+            return script
+
+        @app.get('/urs')
+        def urs_index():
+            return self.get_urs_index_html()
+
+        @app.get('/urs/<var_name:path>')
+        def urs_table(var_name):
+            try:
+                return self.get_urs_html(var_name)
+            except ReportServerException as e:
+                raise HTTPError(404, str(e))
+            except URSException as e:
+                # 如不支持的类型
+                raise HTTPError(400, str(e))
+
+        @app.get('/css/<file_name>')
+        def css(file_name):
+            return static_file(file_name, root=CSS_DIR)
+
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='serve the qc report and urs tables of a data set kept in memory')
+    parser.add_argument('--path', default=DS_FILE_PATH, help='数据集的路径, 默认为urs/config.py中的DS_FILE_PATH')
+    parser.add_argument('--type', choices=[ds_type.value for ds_type in DSType], default=DS_TYPE.value,
+                        help='数据集的格式, 默认为urs/config.py中的DS_TYPE')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache-size', type=int, default=SERVER_CACHE_SIZE, help='缓存的频数统计表和urs表的个数')
+    args = parser.parse_args(argv)
+
+    if TRACE_ENABLED:
+        start_tracing('server')
+    df = load_dataset(args.path, DSType(args.type))
+    memory_usage = optimize_dtypes(df) if OPTIMIZE_DTYPES else None
+    server = ReportServer(df, args.path, memory_usage=memory_usage, cache_size=args.cache_size)
+    print(f'serving {args.path} on http://{args.host}:{args.port}/')
+    server.create_app().run(host=args.host, port=args.port)
+    # 服务停止(Ctrl+C)后, 在当前目录写入读取、概览以及每个查看过的频数统计表和urs表的耗时
+    finish_tracing(f'{get_dataset_name(args.path)}_server', TRACE_SLOWEST_N)
+
+
+if __name__ == '__main__':
+    main()
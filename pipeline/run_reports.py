@@ -0,0 +1,137 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Generate the qc and the urs report from one load of the data set
+#
+# 例如: python pipeline/run_reports.py --path ./data_sources/全变量.csv --type csv
+#
+import argparse
+import logging
+import os
+import sys
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+# qc和urs的模块使用各自目录下的配置(format_config.py和config.py), 两者的模块名不重复
+sys.path.append(os.path.join(ROOT_DIR, 'qc'))
+sys.path.append(os.path.join(ROOT_DIR, 'urs'))
+from common.column_stats import start_sharing, stop_sharing
+from common.data_loader import DataLoaderException, is_partitioned, read_ascii, read_columnar
+from common.dtype_optimizer import optimize_dtypes
+from common.tracer import finish_tracing, start_tracing, trace_span
+from config import (DS_ENCODINGS, DS_FILE_PATH, DS_TYPE, OPTIMIZE_DTYPES, PROFILE_CACHE_DIR, REPORT_FOLDER, SKIP_ROWS,
+                    TRACE_ENABLED, TRACE_SLOWEST_N, USE_COLS, VARS_GROUPS, DSType)
+from data_quality_reporter import DataFrameInfo, ReportInfo
+from format_config import COLS_FORCED_TO_STR, FILL_NAN_WITH_BLANK, HEAD_LINE_NUM
+from urs_reporter import ReportGenerator, URSException
+
+# qc报告的目录, 与qc/data_quality_reporter.py中ReportInfo.to_html的默认目录相同
+QC_REPORT_FOLDER = 'dataQualityReports'
+
+
+class PipelineException(Exception):
+    pass
+
+
+def load_dataset(path, data_source_type, skip_rows=SKIP_ROWS, use_cols=USE_COLS, encodings=DS_ENCODINGS):
+    """
+    读取整个数据集一次, qc需要所有的列, urs只使用其中的自变量和目标变量的原始列
+
+    :param data_source_type:  DSType, 数据集的格式
+    :param use_cols:  读取的列的下标, 为None时读取所有列
+    :return:  DataFrame
+    """
+    if is_partitioned(path):
+        raise PipelineException(f'{path} is a partitioned data set, which is never loaded as a whole, '
+                                f'please run qc/report_generator.py and urs/urs_reporter.py separately')
+    try:
+        with trace_span('load', path=path) as span:
+            if data_source_type == DSType.PKL:
+                df = pd.read_pickle(path)
+            elif data_source_type == DSType.CSV:
+                df = read_ascii(pd.read_csv, path, encodings, skiprows=skip_rows, usecols=use_cols)
+            elif data_source_type == DSType.EXCEL:
+                df = read_ascii(pd.read_excel, path, encodings, skiprows=skip_rows, usecols=use_cols)
+            elif data_source_type in (DSType.PARQUET, DSType.FEATHER):
+                # 与qc相同, use_cols为列的下标
+                df = read_columnar(path, data_source_type.value)
+                if use_cols is not None:
+                    df = df.iloc[:, list(use_cols)]
+            else:
+                raise PipelineException(f'{data_source_type} does not support currently!')
+            span.set(rows=len(df), cols=df.shape[1])
+    except DataLoaderException as e:
+        raise PipelineException(str(e))
+    return df
+
+
+def run_reports(df, path, var_groups=VARS_GROUPS, qc_report_folder=QC_REPORT_FOLDER,
+                urs_report_folder=REPORT_FOLDER, load_config=None, optimize=OPTIMIZE_DTYPES,
+                cache_dir=PROFILE_CACHE_DIR):
+    """
+    由同一个DataFrame生成qc报告和urs报告:
+    - 只读取和解析一次数据集, 需要时也只压缩一次各列的类型
+    - urs自变量的factorize结果(各取值的记录数、每行的编号和空值)在qc统计频数时计算一次, urs分箱时直接使用
+
+    :param df:  load_dataset读取的数据集, qc强制转换为字符串的列不会影响urs使用的数据
+    :param load_config:  读取数据集的参数, 作为urs缓存键的一部分
+    :param cache_dir:  urs表的缓存目录, 为None时不使用缓存
+    :return:  (qc报告的路径, urs报告的路径)
+    """
+    try:
+        report_generator = ReportGenerator.create_generator_from_df(df, path=path, var_groups=var_groups,
+                                                                    report_folder=urs_report_folder,
+                                                                    cache_dir=cache_dir, load_config=load_config)
+    except URSException as e:
+        raise PipelineException(str(e))
+    memory_usage = None
+    if optimize:
+        with trace_span('optimize_dtypes'):
+            memory_usage = optimize_dtypes(df)
+
+    # qc强制转换为字符串的列与urs中的取值不同, 不共享
+    start_sharing([var_name for var_name in report_generator.get_var_names() if var_name not in COLS_FORCED_TO_STR])
+    try:
+        with trace_span('qc'):
+            # qc强制转换为字符串的列只在qc内部的浅拷贝中替换, urs使用的数据不变
+            df_info = DataFrameInfo.create_df_comm_op(orig_df=df, path=path,
+                                                      cols_forced_to_str=COLS_FORCED_TO_STR,
+                                                      fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                                                      head_line_num=HEAD_LINE_NUM, optimize=False)
+            df_info.memory_usage = memory_usage
+            qc_report_path = ReportInfo(df_info).to_html(report_folder=qc_report_folder)
+        with trace_span('urs'):
+            report_generator.to_excel()
+    finally:
+        stop_sharing()
+    return qc_report_path, report_generator.get_excel_path()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='generate the qc and the urs report from one load of the data set')
+    parser.add_argument('--path', default=DS_FILE_PATH, help='数据集的路径, 默认为urs/config.py中的DS_FILE_PATH')
+    parser.add_argument('--type', choices=[ds_type.value for ds_type in DSType], default=DS_TYPE.value,
+                        help='数据集的格式, 默认为urs/config.py中的DS_TYPE')
+    parser.add_argument('--qc-report-folder', default=QC_REPORT_FOLDER)
+    parser.add_argument('--urs-report-folder', default=REPORT_FOLDER)
+    parser.add_argument('--cache-dir', default=PROFILE_CACHE_DIR,
+                        help='urs表的缓存目录, 默认为urs/config.py中的PROFILE_CACHE_DIR')
+    args = parser.parse_args(argv)
+
+    if TRACE_ENABLED:
+        start_tracing('pipeline')
+    df = load_dataset(args.path, DSType(args.type))
+    qc_report_path, urs_report_path = run_reports(df, args.path, qc_report_folder=args.qc_report_folder,
+                                                  urs_report_folder=args.urs_report_folder, cache_dir=args.cache_dir,
+                                                  load_config={'skip_rows': SKIP_ROWS, 'use_cols': USE_COLS})
+    finish_tracing(urs_report_path, TRACE_SLOWEST_N)
+    print(f'qc report is written to {qc_report_path}')
+    print(f'urs report is written to {urs_report_path}')
+    return qc_report_path, urs_report_path
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
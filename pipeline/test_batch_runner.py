@@ -0,0 +1,99 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for batch_runner
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.synthetic_data import generate_dataset
+from pipeline.batch_runner import (SUMMARY_FILE_NAME, BatchException, BatchJob, format_summary, load_manifest, main,
+                                   pick_next_job)
+
+
+class TestBatchRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_manifest(self, jobs):
+        path = os.path.join(self.tmp_dir.name, 'manifest.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(jobs, f, ensure_ascii=False)
+        return path
+
+    def test_pick_next_job(self):
+        jobs = [BatchJob(name=name, path=name, data_source_type='csv', report='qc', memory_mb=memory_mb)
+                for name, memory_mb in [('a', 800), ('b', 500), ('c', 100)]]
+        self.assertEqual(pick_next_job(jobs, 0, 0, workers=2, memory_budget_mb=600), 0)
+        # 放不下的大任务等待, 由小任务填满空闲的进程
+        self.assertEqual(pick_next_job(jobs[1:], 1, 800, workers=2, memory_budget_mb=1000), 1)
+        self.assertIsNone(pick_next_job(jobs[1:], 1, 950, workers=2, memory_budget_mb=1000))
+        self.assertIsNone(pick_next_job(jobs, 2, 0, workers=2, memory_budget_mb=None))
+        self.assertEqual(pick_next_job(jobs, 1, 10000, workers=2, memory_budget_mb=None), 0)
+
+    def test_load_manifest(self):
+        with self.assertRaises(BatchException):
+            load_manifest(self._write_manifest([{'path': 'a.csv', 'type': 'csv', 'report': 'html'}]))
+        with self.assertRaises(BatchException):
+            load_manifest(self._write_manifest([{'path': 'a.csv', 'type': 'csv', 'report': 'qc'},
+                                                {'path': 'b/a.csv', 'type': 'csv', 'report': 'urs'}]))
+
+    def test_main(self):
+        path = os.path.join(self.tmp_dir.name, 'client.csv')
+        generate_dataset(500, seed=1).to_csv(path, index=False)
+        no_cache = {'PROFILE_CACHE_DIR': None}
+        manifest_path = self._write_manifest([
+            {'name': 'qc', 'path': path, 'type': 'csv', 'report': 'qc', 'overrides': no_cache},
+            {'name': 'urs', 'path': path, 'type': 'csv', 'report': 'urs',
+             'overrides': dict(no_cache, VARS_GROUPS={'从车因素': ['veh_age']}, REPORT_PREFIX='client')},
+            {'name': 'both', 'path': path, 'type': 'csv', 'report': 'both', 'overrides': no_cache},
+            # 失败的任务不影响其他任务
+            {'name': 'missing', 'path': os.path.join(self.tmp_dir.name, 'missing.csv'), 'type': 'csv',
+             'report': 'urs', 'overrides': no_cache},
+            {'name': 'bad_override', 'path': path, 'type': 'csv', 'report': 'qc', 'overrides': {'NOT_EXIST': 1}}])
+        output_dir = os.path.join(self.tmp_dir.name, 'reports')
+        summary = main([manifest_path, '--output-dir', output_dir, '--workers', '2'])
+
+        results = {result['name']: result for result in summary['results']}
+        self.assertEqual([result['name'] for result in summary['results']],
+                         ['qc', 'urs', 'both', 'missing', 'bad_override'])
+        self.assertEqual((summary['succeeded'], summary['failed']), (3, 2))
+        self.assertIn('NOT_EXIST', results['bad_override']['error'])
+        self.assertTrue(os.path.basename(results['urs']['outputs'][0]).startswith('client_'))
+        self.assertEqual([os.path.splitext(output)[1] for output in results['both']['outputs']], ['.html', '.xlsx'])
+        for result in results.values():
+            for output in result['outputs'] or []:
+                self.assertTrue(os.path.isfile(output))
+                self.assertEqual(os.path.dirname(output), os.path.join(output_dir, result['name']))
+        self.assertGreater(summary['speedup'], 0)
+        with open(os.path.join(output_dir, SUMMARY_FILE_NAME), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['jobs'], 5)
+        self.assertEqual(len(format_summary(summary).splitlines()), 7)
+
+    def test_overrides_in_cache_key(self):
+        path = os.path.join(self.tmp_dir.name, 'client.csv')
+        generate_dataset(200, seed=2).to_csv(path, index=False)
+        cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        # 同一个数据集, 只有覆盖的配置不同, 不能使用对方的缓存
+        manifest_path = self._write_manifest([
+            {'name': f'head_{head_line_num}', 'path': path, 'type': 'csv', 'report': 'qc',
+             'overrides': {'PROFILE_CACHE_DIR': cache_dir, 'HEAD_LINE_NUM': head_line_num}}
+            for head_line_num in (5, 10)])
+        summary = main([manifest_path, '--output-dir', os.path.join(self.tmp_dir.name, 'reports'), '--workers', '1'])
+
+        self.assertEqual(summary['succeeded'], 2)
+        self.assertEqual(len([file_name for file_name in os.listdir(cache_dir) if file_name.endswith('.pkl')]), 2)
+        for result, head_line_num in zip(summary['results'], (5, 10)):
+            # 报告旁边的profile(profile_artifact.py)中的样本数据
+            with gzip.open(os.path.splitext(result['outputs'][0])[0] + '.profile.json.gz', 'rt', encoding='utf-8') as f:
+                profile = json.load(f)
+            self.assertEqual(len(profile['head_rows']), head_line_num)
+
+
+if __name__ == '__main__':
+    unittest.main()
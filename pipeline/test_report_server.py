@@ -0,0 +1,105 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for report_server
+import io
+import unittest
+from unittest import mock
+from urllib.parse import quote, unquote
+from wsgiref.util import setup_testing_defaults
+
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_dataset
+from common.tracer import start_tracing, stop_tracing
+from pipeline.report_server import LRUCache, ReportServer
+from data_quality_reporter import DataFrameInfo, ReportInfo
+from profile_artifact import get_var_id, iter_freq_table_fragments
+from urs_reporter import ReportGenerator, URSDfCalculator
+
+
+def request(app, path):
+    """:return:  (状态码, 响应内容)"""
+    # 与wsgi服务相同, PATH_INFO为解码后的utf-8字节按latin-1解释的字符串
+    environ = {'PATH_INFO': unquote(path).encode('utf-8').decode('latin-1'), 'wsgi.input': io.BytesIO()}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = b''.join(app(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    return int(statuses[0].split()[0]), body.decode('utf-8')
+
+
+class TestReportServer(unittest.TestCase):
+    def setUp(self):
+        self.df = generate_dataset(1000, extra_cols_num=2, seed=5)
+        self.server = ReportServer(self.df, 'synthetic.csv', cols_forced_to_str=['保单年'])
+        self.app = self.server.create_app()
+        # 出错时直接抛出异常, 而不是返回500页面
+        self.app.catchall = False
+
+    def test_freq_tables_on_demand(self):
+        status, overview = request(self.app, '/')
+        self.assertEqual(status, 200)
+        # 页面中只有频数统计表的占位, 没有计算任何频数统计表
+        self.assertIn(f'data-src="/fragments/{get_var_id(0)}.js"', overview)
+        self.assertNotIn('频数统计</th>', overview)
+        self.assertEqual(len(self.server.cache), 0)
+
+        # 与批量生成的拆分报告中的频数统计表相同
+        profile = ReportInfo(DataFrameInfo.create_df_comm_op(
+            orig_df=self.df.copy(), path='synthetic.csv', cols_forced_to_str=['保单年'], fill_nan_with_blank=True,
+            head_line_num=20, workers=1, optimize=False)).to_profile_artifact()
+        expected_scripts = dict(iter_freq_table_fragments(profile))
+        self.assertEqual(len(expected_scripts), len(self.server.get_profile()['cols']) - 1)
+        for var_id, expected_script in expected_scripts.items():
+            status, script = request(self.app, f'/fragments/{var_id}.js')
+            self.assertEqual(status, 200)
+            self.assertEqual(script, expected_script)
+        self.assertTrue(pd.api.types.is_numeric_dtype(self.df['保单年']))
+
+        # 时间列没有频数统计表
+        date_pos = self.server.col_names.index('起保日期')
+        self.assertEqual(request(self.app, f'/fragments/{get_var_id(date_pos)}.js')[0], 404)
+
+    def test_urs_tables_cached(self):
+        expected_df = ReportGenerator.create_generator_from_df(self.df, path='synthetic.csv', var_groups={},
+                                                               cache_dir=None).create_calculator(
+            'veh_age').generate_urs_df()
+        with mock.patch.object(URSDfCalculator, 'generate_urs_df', autospec=True,
+                               side_effect=URSDfCalculator.generate_urs_df) as generate_urs_df:
+            pd.testing.assert_frame_equal(self.server.get_urs_df('veh_age'), expected_df)
+            status, html = request(self.app, '/urs/veh_age')
+            self.assertEqual(status, 200)
+            self.assertEqual(generate_urs_df.call_count, 1)
+        self.assertEqual(self.server.cache.hits, 1)
+
+        status, html = request(self.app, '/urs')
+        self.assertIn(f'/urs/{quote("车辆类别", safe="")}', html)
+        self.assertEqual(request(self.app, f'/urs/{quote("车辆类别")}')[0], 200)
+        self.assertEqual(request(self.app, '/urs/unknown')[0], 404)
+        self.assertEqual(request(self.app, f'/urs/{quote("起保日期")}')[0], 400)
+
+    def test_traced(self):
+        start_tracing('server')
+        try:
+            request(self.app, f'/fragments/{get_var_id(0)}.js')
+            request(self.app, '/urs/veh_age')
+        finally:
+            tracer = stop_tracing()
+        self.assertEqual([span.name for span in tracer.spans if span.depth == 0], ['overview', 'column', 'urs_df'])
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        cache.get_or_compute('a', lambda: 1)
+        cache.get_or_compute('b', lambda: 2)
+        self.assertEqual(cache.get_or_compute('a', lambda: 0), 1)
+        cache.get_or_compute('c', lambda: 3)
+        # b最久没有使用
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        with self.assertRaises(ValueError):
+            cache.get_or_compute('d', lambda: int('x'))
+        self.assertNotIn('d', cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
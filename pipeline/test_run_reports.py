@@ -0,0 +1,73 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for run_reports
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_dataset
+from pipeline.run_reports import PipelineException, load_dataset, main, run_reports
+from config import DSType
+from urs_aggregator import VarBins
+from urs_reporter import ReportGenerator
+
+
+class TestRunReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'synthetic.csv')
+        generate_dataset(2000, extra_cols_num=2, seed=3).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _collect_urs_dfs(self, func):
+        urs_dfs = []
+        with mock.patch.object(ReportGenerator, 'write_excel', autospec=True,
+                               side_effect=lambda report_generator, results: urs_dfs.extend(results)):
+            func()
+        return urs_dfs
+
+    def test_same_urs_dfs_as_separate_run(self):
+        expected_urs_dfs = self._collect_urs_dfs(lambda: ReportGenerator.create_generator_from_ascii(
+            pd.read_csv, path=self.path, cache_dir=None).to_excel())
+
+        df = load_dataset(self.path, DSType.CSV)
+        qc_folder = os.path.join(self.tmp_dir.name, 'qc')
+        os.makedirs(qc_folder)
+        # qc中强制转换为字符串的列不影响urs, 也不共享; 其余的自变量使用qc统计频数时factorize的结果分箱, 不再重新扫描
+        with mock.patch('pipeline.run_reports.COLS_FORCED_TO_STR', ['保单年']), \
+                mock.patch.object(VarBins, 'create_numeric_bins', side_effect=AssertionError), \
+                mock.patch.object(VarBins, 'create_enum_bins', wraps=VarBins.create_enum_bins) as create_enum_bins:
+            urs_dfs = self._collect_urs_dfs(lambda: run_reports(df, self.path, qc_report_folder=qc_folder,
+                                                                cache_dir=None))
+        self.assertEqual([call.args[0].name for call in create_enum_bins.call_args_list], ['保单年'])
+        self.assertEqual([var_name for var_name, _ in urs_dfs], [var_name for var_name, _ in expected_urs_dfs])
+        for (_, urs_df), (_, expected_df) in zip(urs_dfs, expected_urs_dfs):
+            pd.testing.assert_frame_equal(urs_df, expected_df)
+        self.assertTrue(pd.api.types.is_numeric_dtype(df['保单年']))
+        self.assertEqual(len(os.listdir(qc_folder)), 2)
+
+    def test_main(self):
+        qc_folder = os.path.join(self.tmp_dir.name, 'qc')
+        urs_folder = os.path.join(self.tmp_dir.name, 'urs')
+        os.makedirs(qc_folder)
+        os.makedirs(urs_folder)
+        cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        qc_report_path, urs_report_path = main(['--path', self.path, '--type', 'csv', '--qc-report-folder', qc_folder,
+                                                '--urs-report-folder', urs_folder, '--cache-dir', cache_dir])
+        self.assertTrue(os.path.isfile(qc_report_path))
+        self.assertTrue(os.path.isfile(urs_report_path))
+        # urs表写入指定的缓存目录
+        self.assertTrue(os.listdir(cache_dir))
+
+        with self.assertRaises(PipelineException):
+            load_dataset(self.tmp_dir.name, DSType.CSV)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,305 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Mergeable column statistics used to profile data sets chunk by chunk
+#
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.column_stats import get_column_stats
+from common.quantiles import cal_weighted_quantiles
+from format_config import (COLS_TYPE, FILL_NAN_WITH_BLANK, HEAD_NUM_CONTINUS_VAR, LIMIT_DISCRETE_COLS,
+                           HEAD_NUM_DISCRETE_VAR, DISCRETE_CARDINALITY_THRESHOLD, OTHER_VALUES_LABEL)
+
+# quantiles in DataFrame.describe
+DESCRIBE_PERCENTILES = [0.25, 0.5, 0.75]
+
+# quantiles shown in numeric summary besides the ones in DataFrame.describe
+DECILES = [(i + 1) / 10 for i in range(10)]
+
+NUMERIC_DESC_QUANTILES = DESCRIBE_PERCENTILES + DECILES
+
+
+def cal_col_type_code(dtype):
+    """
+    calculate the data type code of column
+
+    :param dtype:  column's dtype
+    :return:  column data type: NUMERIC=1, STR=2, TIME=3
+    """
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iuf':
+        return COLS_TYPE.NUMERIC
+    elif dtype == np.dtype('<M8[ns]'):
+        return COLS_TYPE.TIME
+    else:
+        return COLS_TYPE.STR
+
+
+def cal_head_num(col_name, type_code, distinct_num):
+    """
+    calculate the max number of rows of the frequency table
+
+    :param type_code:  column type enum(NUMERIC=1, STR=2, TIME=3)
+    :param distinct_num:  number of distinct non missing values of the column
+    :return:  max number of rows, None for showing all the values
+    """
+    if type_code == COLS_TYPE.NUMERIC:
+        return HEAD_NUM_CONTINUS_VAR
+    if col_name in LIMIT_DISCRETE_COLS:
+        return HEAD_NUM_DISCRETE_VAR
+    if DISCRETE_CARDINALITY_THRESHOLD is not None and distinct_num > DISCRETE_CARDINALITY_THRESHOLD:
+        return HEAD_NUM_DISCRETE_VAR
+    return None
+
+
+def cal_head_value_counts(col_name, series, type_code):
+    """
+    calculate the value counts shown in the frequency table from the factorized column,
+    only the head values are selected and sorted, the full value counts are never built.
+    The factorized column is shared with the urs report when both run in one process, see common.column_stats
+
+    :param type_code:  column type enum(NUMERIC=1, STR=2, TIME=3)
+    :return:  (value counts of the head values including nan sorted by frequency descending,
+               number of distinct non missing values)
+    """
+    stats = get_column_stats(series)
+    uniques = pd.Index(stats.uniques)
+    if isinstance(uniques, pd.CategoricalIndex):
+        # 取值按照普通的Index处理, 才能插入和填充不在类别中的缺失值
+        uniques = uniques.astype(object)
+    # 第0位为缺失值的数量, 第i位为第i-1个取值的数量
+    counts = stats.counts
+    head_num = cal_head_num(col_name, type_code, len(uniques))
+    slots = np.flatnonzero(counts)
+    if head_num is not None and len(slots) > head_num:
+        slots = np.sort(slots[np.argpartition(-counts[slots], head_num - 1)[:head_num]])
+    # 频数相同时按照在数据中首次出现的顺序排列
+    slots = slots[np.argsort(-counts[slots], kind='mergesort')]
+    positions = slots - 1
+    index = uniques.take(positions[positions >= 0])
+    if counts[0]:
+        index = index.insert(int(np.flatnonzero(positions < 0)[0]), np.nan)
+    return pd.Series(counts[slots], index=index), len(uniques)
+
+
+def cal_head_records_desc(col_name, value_counts, records_num, type_code, distinct_num=None):
+    """
+    build the frequency table of a column from its value counts, values beyond the head rows
+    are collapsed into one row labeled OTHER_VALUES_LABEL
+
+    :param value_counts:  value counts of the column (including nan), sorted by frequency descending,
+                may contain only the head values
+    :param records_num:  number of records of the column
+    :param type_code:  column type enum(NUMERIC=1, STR=2, TIME=3)
+    :param distinct_num:  number of distinct non missing values, default to the length of value_counts
+    :return:  A list with tuple element to store high frequency record.
+            Each tuple with index and a dict.
+    """
+    if distinct_num is None:
+        distinct_num = value_counts.index.notnull().sum()
+    head_num = cal_head_num(col_name, type_code, distinct_num)
+    df_desc = pd.DataFrame()
+    df_desc['freq'] = value_counts.iloc[:head_num]
+    if type_code == COLS_TYPE.NUMERIC:
+        df_desc.index = df_desc.index.map(lambda x: x if np.isnan(x) else round(x, 2))
+    other_freq = records_num - df_desc['freq'].sum()
+    if other_freq > 0:
+        df_desc = pd.concat([df_desc, pd.DataFrame({'freq': [other_freq]}, index=[OTHER_VALUES_LABEL])])
+    df_desc['freq_percentage'] = df_desc['freq'] / records_num
+    df_desc['cum_freq'] = df_desc['freq'].cumsum(skipna=False)
+    df_desc['cum_freq_percentage'] = df_desc['cum_freq'] / records_num
+
+    if FILL_NAN_WITH_BLANK:
+        return zip(df_desc.index.fillna('').tolist(), df_desc.fillna('').to_dict(orient='records'))
+    else:
+        return zip(df_desc.index.tolist(), df_desc.to_dict(orient='records'))
+
+
+def cal_numeric_desc(count, mean, std, min_value, max_value, quantile_values, records_num):
+    """
+    assemble the statistics of a numeric column in the order of DataFrame.describe followed by the deciles
+
+    :param quantile_values:  values of NUMERIC_DESC_QUANTILES
+    :return:  A dict with statistics name as key, nan filled with 0
+    """
+    quantile_desc = {f'{round(q * 100)}%': value for q, value in zip(NUMERIC_DESC_QUANTILES, quantile_values)}
+    numeric_desc = {'count': count, 'mean': mean, 'std': std, 'min': min_value}
+    numeric_desc.update((f'{round(q * 100)}%', quantile_desc[f'{round(q * 100)}%']) for q in DESCRIBE_PERCENTILES)
+    numeric_desc['max'] = max_value
+    numeric_desc['# MISSING'] = records_num - count
+    numeric_desc.update((f'{round(q * 100)}%', quantile_desc[f'{round(q * 100)}%']) for q in DECILES)
+    return {key: 0 if pd.isnull(value) else float(value) for key, value in numeric_desc.items()}
+
+
+def cal_series_numeric_desc(series, records_num):
+    """
+    calculate the statistics of a numeric column, all quantiles are read from one partition of the column
+    instead of sorting it once per quantile
+
+    :return:  A dict with the same statistics as DataFrame.describe and the deciles
+    """
+    if series.dtype == np.float32:
+        # 压缩为float32的列按float64统计, 与压缩前的结果一致
+        series = series.astype(np.float64)
+    values = series.values
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return cal_numeric_desc(0, np.nan, np.nan, np.nan, np.nan, [np.nan] * len(NUMERIC_DESC_QUANTILES),
+                                records_num)
+    quantile_values = np.percentile(values, np.asarray(NUMERIC_DESC_QUANTILES) * 100.0)
+    return cal_numeric_desc(len(values), series.mean(), series.std(), values.min(), values.max(), quantile_values,
+                            records_num)
+
+
+class ColumnAccumulator(object):
+    """
+    Mergeable statistics of a column, updated with one chunk of the column at a time
+
+    :attribute col_name:  column name
+    :attribute records_num:  number of records seen
+    :attribute missing_num:  number of missing records
+    :attribute dtypes:  dtypes of the chunks containing non missing values
+    :attribute value_counts:  counts of non missing values
+    :attribute numeric_num:  number of non missing records of numeric chunks
+    :attribute mean:  mean of numeric chunks
+    :attribute m2:  sum of squares of differences from the mean of numeric chunks
+    :attribute min:  minimum of numeric chunks
+    :attribute max:  maximum of numeric chunks
+    """
+
+    def __init__(self, col_name):
+        self.col_name = col_name
+        self.records_num = 0
+        self.missing_num = 0
+        self.dtypes = set()
+        self.value_counts = pd.Series([], dtype=np.float64)
+        self.numeric_num = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    @classmethod
+    def create_from_series(cls, series):
+        acc = cls(series.name)
+        acc.records_num = len(series)
+        non_missing = series.dropna()
+        acc.missing_num = acc.records_num - len(non_missing)
+        if len(non_missing) == 0:
+            return acc
+        acc.dtypes.add(series.dtype)
+        acc.value_counts = non_missing.value_counts().astype(np.float64)
+        if series.dtype in [np.float64, np.int64]:
+            values = non_missing.values.astype(np.float64)
+            acc.numeric_num = len(values)
+            acc.mean = values.mean()
+            acc.m2 = ((values - acc.mean) ** 2).sum()
+            acc.min = values.min()
+            acc.max = values.max()
+        return acc
+
+    def update(self, series):
+        self.merge(self.create_from_series(series))
+
+    def merge(self, other):
+        """merge the statistics of another part of the same column into this one"""
+        self.records_num += other.records_num
+        self.missing_num += other.missing_num
+        self.dtypes |= other.dtypes
+        self._merge_values(other)
+        numeric_num = self.numeric_num + other.numeric_num
+        if other.numeric_num:
+            # parallel algorithm of Chan et al. for mean and variance
+            delta = other.mean - self.mean
+            self.mean += delta * other.numeric_num / numeric_num
+            self.m2 += other.m2 + delta ** 2 * self.numeric_num * other.numeric_num / numeric_num
+            self.min = np.fmin(self.min, other.min)
+            self.max = np.fmax(self.max, other.max)
+        self.numeric_num = numeric_num
+
+    def _merge_values(self, other):
+        self.value_counts = self.value_counts.add(other.value_counts, fill_value=0)
+
+    def _get_non_missing_value_counts(self):
+        return self.value_counts
+
+    def _cal_quantiles(self, quantiles):
+        value_counts = self.value_counts.sort_index()
+        return cal_weighted_quantiles(value_counts.index.values.astype(np.float64), value_counts.values, quantiles)
+
+    def get_distinct_num(self):
+        """
+        :return:  number of distinct non missing values
+        """
+        return len(self.value_counts)
+
+    @property
+    def dtype(self):
+        """dtype of the whole column, resolved in the same way as parsing the file at once"""
+        if not self.dtypes:
+            return np.dtype(np.float64)
+        if self.dtypes <= {np.dtype(np.int64), np.dtype(np.float64)}:
+            if np.dtype(np.float64) in self.dtypes or self.missing_num:
+                return np.dtype(np.float64)
+            return np.dtype(np.int64)
+        if len(self.dtypes) == 1 and not self.missing_num:
+            return next(iter(self.dtypes))
+        return np.dtype(object)
+
+    def get_value_counts(self):
+        """
+        :return:  value counts of the whole column including nan, sorted by frequency descending
+        """
+        value_counts = self._get_non_missing_value_counts()
+        if self.dtype == object and self.dtypes != {np.dtype(object)}:
+            # values of numeric chunks would have been parsed as str together with the others
+            value_counts = value_counts.groupby(value_counts.index.map(str)).sum()
+        if self.missing_num:
+            value_counts = pd.concat([value_counts, pd.Series([self.missing_num], index=[np.nan], dtype=np.float64)])
+        return value_counts.astype(np.int64).sort_values(ascending=False)
+
+    def get_numeric_desc(self):
+        """
+        :return:  A dict with the same statistics as DataFrame.describe and the deciles
+        """
+        count = self.numeric_num
+        if count:
+            quantile_values = self._cal_quantiles(NUMERIC_DESC_QUANTILES)
+        else:
+            quantile_values = [np.nan] * len(NUMERIC_DESC_QUANTILES)
+        return cal_numeric_desc(count=count, mean=self.mean if count else np.nan,
+                                std=np.sqrt(self.m2 / (count - 1)) if count > 1 else np.nan,
+                                min_value=self.min, max_value=self.max, quantile_values=quantile_values,
+                                records_num=self.records_num)
+
+
+class ColumnSummary(object):
+    """
+    Column information computed from a ColumnAccumulator, with the same attributes as DataFrameColsInfo
+    that are used by the report
+
+    :attribute col_name:  column name
+    :attribute type_code:  type of columns enum(NUMERIC=1, STR=2, TIME=3)
+    :attribute type:  column's dtype.
+    :attribute type_length:  memory space used.
+    :attribute missing_num:  number of missing records
+    :attribute df_desc:  column data distribution info
+    """
+
+    def __init__(self, acc, cols_type_show_desc):
+        self.col_name = acc.col_name
+        self.df = None
+        self.type = acc.dtype
+        self.type_code = cal_col_type_code(self.type)
+        self.type_length = "" if self.type_code == COLS_TYPE.STR else self.type.itemsize
+        self.missing_num = acc.missing_num
+        if self.type_code in cols_type_show_desc:
+            self.df_desc = cal_head_records_desc(self.col_name, acc.get_value_counts(), acc.records_num,
+                                                 self.type_code, distinct_num=acc.get_distinct_num())
+        else:
+            self.df_desc = None
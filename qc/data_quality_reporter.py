@@ -3,23 +3,40 @@
 import collections
 import datetime
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-from bottle import template
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.data_loader import (DataLoaderException, detect_encoding, get_dataset_name, is_partitioned,
+                                list_partitions, read_ascii, read_columnar, read_columnar_columns)
+from common.dtype_optimizer import optimize_dtypes
+from common.profile_cache import ProfileCache, fingerprint_dataset
+from common.shared_array import SharedArray
+from common.tracer import trace_record, trace_span
+from column_profile import (ColumnAccumulator, ColumnSummary, cal_col_type_code, cal_head_records_desc,
+                            cal_head_value_counts, cal_series_numeric_desc)
 from format_config import (COLS_TYPE, COLS_TYPE_SHOW_DESC, PATH_TO_DATA, COLS_FORCED_TO_STR, FILL_NAN_WITH_BLANK,
-                           HEAD_LINE_NUM, SKIP_ROWS, USE_COLS, HEAD_NUM_CONTINUS_VAR, LIMIT_DISCRETE_COLS,
-                           HEAD_NUM_DISCRETE_VAR, REPORT_PREFIX, DATA_SOURCE_TYPE, DS_ENCODINGS)
+                           HEAD_LINE_NUM, SKIP_ROWS, USE_COLS, REPORT_PREFIX, DATA_SOURCE_TYPE, DS_ENCODINGS,
+                           CSV_CHUNK_SIZE, APPROXIMATE_STATS, EXACT_DISTINCT_LIMIT, QC_WORKERS, PROFILE_CACHE_DIR,
+                           PROFILE_CACHE_MAX_SIZE, WRITE_PROFILE_ARTIFACT, OPTIMIZE_DTYPES,
+                           SPLIT_REPORT, get_profile_config)
+from profile_artifact import (PROFILE_ARTIFACT_SUFFIX, create_profile_artifact, render_profile_html,
+                              write_profile_artifact)
+from sketches import (ApproxColumnAccumulator, bound_accumulator, frequent_items_error, hll_relative_error,
+                      kll_rank_error, merge_accumulators)
 
 
-# TODO（lujia）: add navigation sidebar for quick scan
 class DataFrameInfo(object):
     """
     Store marco information of DataFrame
 
     :attribute orig_df:  original DataFrame.
-    :attribute df:  DataFrame after rearranging columns order via alphabet.
+    :attribute df:  DataFrame profiled, orig_df with the columns forced to str and the compressed dtypes,
+                the columns keep their order and are only sorted by name when profiled and shown.
     :attribute cols_num:  number of columns.
     :attribute records_num:  number of record.
     :attribute cols:  an ordered dict stored mapping from column_name to column information.
@@ -28,10 +45,14 @@ class DataFrameInfo(object):
     :attribute head_rows:  data of head rows.
     :attribute orig_df_col_to_idx:  an dict stored mapping from column_name to columns_index in orig_df.
     :attribute df_name:  name parsed from path_to_df.
+    :attribute approximate_sections:  list of (section name, error description) of the approximate statistics,
+                empty when all statistics are exact.
+    :attribute memory_usage:  dict mapping column name to (bytes before, bytes after) the dtype optimization,
+                None when the dtypes are not optimized.
     """
 
     def __init__(self, orig_df, df, cols_num, records_num, cols, numeric_cols_desc, str_cols_desc, head_rows,
-                 orig_df_col_to_idx, df_name):
+                 orig_df_col_to_idx, df_name, approximate_sections=None, memory_usage=None):
         self.orig_df = orig_df
         self.df = df
         self.cols_num = cols_num
@@ -42,41 +63,104 @@ class DataFrameInfo(object):
         self.head_rows = head_rows
         self.orig_df_col_to_idx = orig_df_col_to_idx
         self.df_name = df_name
+        self.approximate_sections = approximate_sections or []
+        self.memory_usage = memory_usage
+
+    def release_data(self):
+        """
+        drop the references to the DataFrame and turn the iterators into lists,
+        so that the info can be pickled and rendered more than once without the data set in memory
+
+        :return:  self
+        """
+        self.orig_df = None
+        self.df = None
+        self.head_rows = list(self.head_rows)
+        for col in self.cols.values():
+            col.df = None
+            if col.df_desc is not None:
+                col.df_desc = list(col.df_desc)
+        return self
 
     @classmethod
-    def _setup_df_cols(cls, df):
+    def _setup_df_cols(cls, df, workers=QC_WORKERS, col_names=None, cols_type_show_desc=COLS_TYPE_SHOW_DESC):
         """
         setup the mapping from column name to DataFrameColsInfo instance
 
+        :param workers:  number of processes profiling the columns in parallel, 1 for serial
+        :param col_names:  columns in the order of the result, None for the order of df
+        :param cols_type_show_desc:  column types whose frequency table is calculated, empty for none of them
         :return:  A dict with column name as key and DataFrameColsInfo instance as value
         """
+        if col_names is None:
+            col_names = df.columns.tolist()
+        if workers > 1 and len(col_names) > 1 and cols_type_show_desc:
+            return cls._setup_df_cols_in_parallel(df=df, workers=workers, col_names=col_names)
         cols = collections.OrderedDict()
-        for col_name in df.columns.tolist():
+        for col_name in col_names:
             print(col_name)
-            cols[col_name] = DataFrameColsInfo(col_name, df, COLS_TYPE_SHOW_DESC)
+            with trace_span('column', col=col_name, rows=len(df)) as span:
+                cols[col_name] = DataFrameColsInfo(col_name, df, cols_type_show_desc)
+                span.set(dtype=str(cols[col_name].type))
+        return cols
+
+    @classmethod
+    def _setup_df_cols_in_parallel(cls, df, workers, col_names):
+        """
+        profile the columns in a process pool, numeric and datetime columns are passed to the workers
+        through shared memory instead of pickled copies. At most 2 * workers columns are in flight,
+        so the extra memory is bounded whatever the number of columns.
+
+        :return:  A dict with column name as key and DataFrameColsInfo instance as value, in the order of col_names
+        """
+        cols = collections.OrderedDict()
+        pending = collections.deque()
+
+        def collect():
+            future, shared_array = pending.popleft()
+            try:
+                col, seconds = future.result()
+            finally:
+                if shared_array is not None:
+                    shared_array.unlink()
+            print(col.col_name)
+            trace_record('column', seconds, col=col.col_name, rows=len(df), dtype=str(col.type), worker=True)
+            col.df = df
+            cols[col.col_name] = col
+
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(col_names))) as executor:
+                for col_name in col_names:
+                    values = df[col_name].values
+                    if isinstance(values, np.ndarray) and values.dtype.kind in 'biufcmM':
+                        shared_array = SharedArray.create_from_array(values)
+                        pending.append((executor.submit(_setup_df_col_in_worker, col_name, shared_array),
+                                        shared_array))
+                    else:
+                        pending.append((executor.submit(_setup_df_col_in_worker, col_name, df[col_name]), None))
+                    if len(pending) >= 2 * workers:
+                        collect()
+                while pending:
+                    collect()
+        finally:
+            for _, shared_array in pending:
+                if shared_array is not None:
+                    shared_array.unlink()
         return cols
 
     @classmethod
-    def _get_numeric_cols_desc(cls, records_num, df):
+    def _get_numeric_cols_desc(cls, records_num, df, col_names=None):
         """
         calculate the macro statistics information of numeric columns 
 
+        :param col_names:  columns in the order of the result, None for the order of df
         :return:  A list with tuple element to store macro statistics information of numeric columns.
                 Each tuple with index and a dict. 
         """
-        numeric_cols = df.describe().T
-        numeric_cols['# MISSING'] = records_num - numeric_cols['count']
-        numeric_cols['10%'] = df.quantile(0.1)
-        numeric_cols['20%'] = df.quantile(0.2)
-        numeric_cols['30%'] = df.quantile(0.3)
-        numeric_cols['40%'] = df.quantile(0.4)
-        numeric_cols['50%'] = df.quantile(0.5)
-        numeric_cols['60%'] = df.quantile(0.6)
-        numeric_cols['70%'] = df.quantile(0.7)
-        numeric_cols['80%'] = df.quantile(0.8)
-        numeric_cols['90%'] = df.quantile(0.9)
-        numeric_cols['100%'] = df.quantile(1)
-        return zip(numeric_cols.index, numeric_cols.fillna(0).to_dict(orient='records'))
+        if col_names is None:
+            col_names = df.columns.tolist()
+        return [(col_name, cal_series_numeric_desc(df[col_name], records_num)) for col_name in col_names
+                if isinstance(df[col_name].dtype, np.dtype) and np.issubdtype(df[col_name].dtype, np.number)]
 
     @classmethod
     def _get_str_cols_desc(cls, cols, records_num):
@@ -105,10 +189,14 @@ class DataFrameInfo(object):
         :return:  A list with tuple element to store example data in report.
                 Each tuple with index and a dict. 
         """
+        head_df = df.head(head_line_num)
+        # category列不能填充不在类别中的空白
+        head_df = head_df.astype({col_name: object for col_name, dtype in head_df.dtypes.items()
+                                  if isinstance(dtype, pd.CategoricalDtype)})
         if fill_nan_with_blank:
-            return zip(df.index.tolist(), df.head(head_line_num).fillna('').to_dict(orient='records'))
+            return zip(head_df.index.tolist(), head_df.fillna('').to_dict(orient='records'))
         else:
-            return zip(df.index.tolist(), df.head(head_line_num).to_dict(orient='records'))
+            return zip(head_df.index.tolist(), head_df.to_dict(orient='records'))
 
     @classmethod
     def _force_convert_numeric_col_to_str(cls, cols_forced_to_str, df):
@@ -130,19 +218,262 @@ class DataFrameInfo(object):
                                    skip_rows=SKIP_ROWS,
                                    use_cols=USE_COLS):
         """create DataFrame from csv file"""
-        orig_df = None
-        for encoding in DS_ENCODINGS:
-            try:
-                orig_df = read_func(path, skiprows=skip_rows, usecols=use_cols, encoding=encoding)
-            except Exception as e:
-                print(e)
-                continue
-            else:
-                break
-        if orig_df is None:
+        try:
+            with trace_span('load', path=path) as span:
+                orig_df = read_ascii(read_func, path, DS_ENCODINGS, skiprows=skip_rows, usecols=use_cols)
+                span.set(rows=len(orig_df), cols=orig_df.shape[1])
+        except DataLoaderException as e:
+            raise QCException(str(e))
+        return cls.create_df_comm_op(orig_df=orig_df, path=path, cols_forced_to_str=cols_forced_to_str,
+                                     fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num,
+                                     inplace=True)
+
+    @classmethod
+    def create_df_info_from_csv_chunks(cls, path=PATH_TO_DATA,
+                                       chunk_size=CSV_CHUNK_SIZE,
+                                       cols_forced_to_str=COLS_FORCED_TO_STR,
+                                       fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                                       head_line_num=HEAD_LINE_NUM,
+                                       skip_rows=SKIP_ROWS,
+                                       use_cols=USE_COLS,
+                                       approximate=APPROXIMATE_STATS,
+                                       exact_limit=EXACT_DISTINCT_LIMIT):
+        """
+        create DataFrameInfo from csv file by reading chunk_size records at a time,
+        only the statistics of each column are kept in memory, orig_df and df are None
+
+        :param approximate:  use sketches for frequency tables, quantiles and distinct counts
+        :param exact_limit:  when not approximate, columns with more distinct values use sketches, None for no limit
+        """
+        encoding = detect_encoding(path, DS_ENCODINGS)
+        if encoding is None:
             raise QCException('Error! coding type not included in ENCONDINGS_PENDING!')
+        reader = pd.read_csv(path, skiprows=skip_rows, usecols=use_cols, encoding=encoding, chunksize=chunk_size)
+        return cls.create_df_info_from_chunks(chunks=reader, path=path, cols_forced_to_str=cols_forced_to_str,
+                                              fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num,
+                                              approximate=approximate, exact_limit=exact_limit)
+
+    @classmethod
+    def create_df_info_from_chunks(cls, chunks, path, cols_forced_to_str, fill_nan_with_blank, head_line_num,
+                                   approximate=False, exact_limit=EXACT_DISTINCT_LIMIT):
+        """
+        create DataFrameInfo from an iterable of DataFrames with the same columns
+
+        :param chunks:  iterable of DataFrame, e.g. the reader returned by read_csv with chunksize
+        :param approximate:  use ApproxColumnAccumulator instead of ColumnAccumulator
+        :param exact_limit:  see bound_accumulator
+        """
+        accumulators, head_df = cls._accumulate_chunks(chunks=chunks, cols_forced_to_str=cols_forced_to_str,
+                                                       head_line_num=head_line_num, approximate=approximate,
+                                                       exact_limit=exact_limit)
+        if accumulators is None:
+            raise QCException(f'No data found in {path}')
+        return cls.create_df_info_from_accumulators(accumulators=accumulators, head_df=head_df, path=path,
+                                                    fill_nan_with_blank=fill_nan_with_blank,
+                                                    head_line_num=head_line_num)
+
+    @classmethod
+    def _accumulate_chunks(cls, chunks, cols_forced_to_str, head_line_num, approximate,
+                           exact_limit=EXACT_DISTINCT_LIMIT):
+        """
+        update the accumulators of each column with the chunks one at a time
+
+        :return:  A tuple (accumulators, head_df), accumulators is an ordered dict mapping column name
+                to accumulator in original column order, both are None when there is no chunk
+        """
+        accumulator_cls = ApproxColumnAccumulator if approximate else ColumnAccumulator
+        head_df = None
+        accumulators = None
+        # 读取各块的耗时计入accumulate_chunks本身
+        with trace_span('accumulate_chunks', approximate=approximate) as span:
+            records_num = 0
+            for chunk in chunks:
+                with trace_span('chunk', rows=len(chunk)):
+                    chunk = cls._force_convert_numeric_col_to_str(cols_forced_to_str=cols_forced_to_str, df=chunk)
+                    if accumulators is None:
+                        head_df = chunk.head(head_line_num)
+                        accumulators = collections.OrderedDict((col_name, accumulator_cls(col_name))
+                                                               for col_name in chunk.columns.tolist())
+                    for col_name, acc in accumulators.items():
+                        acc.update(chunk[col_name])
+                        accumulators[col_name] = bound_accumulator(acc, exact_limit)
+                records_num += len(chunk)
+            span.set(rows=records_num)
+        return accumulators, head_df
+
+    @classmethod
+    def create_df_info_from_partitions(cls, data_source_type, path=PATH_TO_DATA,
+                                       cols_forced_to_str=COLS_FORCED_TO_STR,
+                                       fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                                       head_line_num=HEAD_LINE_NUM,
+                                       skip_rows=SKIP_ROWS,
+                                       use_cols=USE_COLS,
+                                       approximate=APPROXIMATE_STATS,
+                                       exact_limit=EXACT_DISTINCT_LIMIT,
+                                       workers=QC_WORKERS):
+        """
+        create DataFrameInfo from a directory or glob of partition files with the same columns,
+        each partition is profiled into accumulators in a worker process and the accumulators are merged,
+        the partitions are never concatenated
+
+        :param data_source_type:  format of every partition
+        :param path:  directory or glob of the partitions, see common.data_loader.list_partitions
+        :param approximate:  use ApproxColumnAccumulator instead of ColumnAccumulator
+        :param exact_limit:  see bound_accumulator
+        :param workers:  number of processes profiling the partitions in parallel, 1 for serial
+        """
+        try:
+            paths = list_partitions(path)
+        except DataLoaderException as e:
+            raise QCException(str(e))
+        partition_args = [(data_source_type, partition_path, cols_forced_to_str, head_line_num, skip_rows, use_cols,
+                           approximate, exact_limit) for partition_path in paths]
+        accumulators = None
+        head_df = None
+        for partition_path, (partition_accumulators, partition_head_df, seconds) in zip(
+                paths, cls._accumulate_partitions(partition_args, workers)):
+            print(partition_path)
+            trace_record('partition', seconds, path=partition_path, workers=workers)
+            if partition_accumulators is None:
+                continue
+            if accumulators is None:
+                accumulators, head_df = partition_accumulators, partition_head_df
+                continue
+            if set(partition_accumulators.keys()) != set(accumulators.keys()):
+                raise QCException(f'Columns of {partition_path} differ from the other partitions, details: '
+                                  f'{set(partition_accumulators.keys()) ^ set(accumulators.keys())}')
+            for col_name, acc in accumulators.items():
+                accumulators[col_name] = merge_accumulators(acc, partition_accumulators[col_name], exact_limit)
+            if len(head_df) < head_line_num:
+                head_df = pd.concat([head_df, partition_head_df[head_df.columns]]).head(head_line_num)
+        if accumulators is None:
+            raise QCException(f'No data found in {path}')
+        return cls.create_df_info_from_accumulators(accumulators=accumulators, head_df=head_df, path=path,
+                                                    fill_nan_with_blank=fill_nan_with_blank,
+                                                    head_line_num=head_line_num)
+
+    @classmethod
+    def _accumulate_partitions(cls, partition_args, workers):
+        """
+        :return:  iterator of (accumulators, head_df, seconds) of each partition, in the order of partition_args
+        """
+        if workers > 1 and len(partition_args) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(partition_args))) as executor:
+                yield from executor.map(_accumulate_partition, *zip(*partition_args))
+        else:
+            for args in partition_args:
+                yield _accumulate_partition(*args)
+
+    @classmethod
+    def _read_partition_chunks(cls, data_source_type, path, skip_rows, use_cols):
+        """
+        read one partition, csv partitions are read CSV_CHUNK_SIZE records at a time when it is set
+
+        :return:  iterable of DataFrame
+        """
+        try:
+            if data_source_type == DATA_SOURCE_TYPE.PICKLE:
+                return [pd.read_pickle(path)]
+            elif data_source_type == DATA_SOURCE_TYPE.CSV and CSV_CHUNK_SIZE:
+                encoding = detect_encoding(path, DS_ENCODINGS)
+                if encoding is None:
+                    raise QCException(f'Coding type of {path} not included in {DS_ENCODINGS}!')
+                return pd.read_csv(path, skiprows=skip_rows, usecols=use_cols, encoding=encoding,
+                                   chunksize=CSV_CHUNK_SIZE)
+            elif data_source_type == DATA_SOURCE_TYPE.CSV:
+                return [read_ascii(pd.read_csv, path, DS_ENCODINGS, skiprows=skip_rows, usecols=use_cols)]
+            elif data_source_type == DATA_SOURCE_TYPE.EXCEL:
+                return [read_ascii(pd.read_excel, path, DS_ENCODINGS, skiprows=skip_rows, usecols=use_cols)]
+            elif data_source_type == DATA_SOURCE_TYPE.PARQUET:
+                return [cls._read_columnar(fmt='parquet', path=path, use_cols=use_cols)]
+            elif data_source_type == DATA_SOURCE_TYPE.FEATHER:
+                return [cls._read_columnar(fmt='feather', path=path, use_cols=use_cols)]
+        except DataLoaderException as e:
+            raise QCException(str(e))
+        raise QCException(f'{data_source_type} does not support currently!')
+
+    @classmethod
+    def create_df_info_from_accumulators(cls, accumulators, head_df, path, fill_nan_with_blank, head_line_num):
+        """
+        create DataFrameInfo from the merged statistics of each column
+
+        :param accumulators:  an ordered dict mapping column name to ColumnAccumulator, in original column order
+        :param head_df:  DataFrame with the head records
+        """
+        sorted_col_names = sorted(accumulators.keys())
+        records_num = next(iter(accumulators.values())).records_num
+        cols = collections.OrderedDict((col_name, ColumnSummary(accumulators[col_name], COLS_TYPE_SHOW_DESC))
+                                       for col_name in sorted_col_names)
+        numeric_cols_desc = [(col_name, accumulators[col_name].get_numeric_desc())
+                             for col_name, col in cols.items() if col.type_code == COLS_TYPE.NUMERIC]
+        str_cols_desc = [(col_name, {'# MISSING': col.missing_num, '# NONMISSING': records_num - col.missing_num})
+                         for col_name, col in cols.items() if col.type_code != COLS_TYPE.NUMERIC]
+        approximate_sections = cls._get_approximate_sections(accumulators)
+        if approximate_sections:
+            for col_name, per_str_col_desc in str_cols_desc:
+                per_str_col_desc['# DISTINCT'] = accumulators[col_name].get_distinct_num()
+        head_rows = cls._get_head_rows(fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num,
+                                       df=head_df.reindex(sorted_col_names, axis=1))
+        orig_df_col_to_idx = dict(zip(accumulators.keys(), range(0, len(accumulators))))
+        df_name = get_dataset_name(path)
+        return cls(orig_df=None, df=None, cols_num=len(cols), records_num=records_num, cols=cols,
+                   numeric_cols_desc=numeric_cols_desc, str_cols_desc=str_cols_desc, head_rows=head_rows,
+                   orig_df_col_to_idx=orig_df_col_to_idx, df_name=df_name,
+                   approximate_sections=approximate_sections)
+
+    @classmethod
+    def _get_approximate_sections(cls, accumulators):
+        """
+        describe the sections of the report computed from sketches and their error bounds
+
+        :return:  A list with tuple (section name, error description), empty when the accumulators are exact
+        """
+        approx_accs = [acc for acc in accumulators.values() if isinstance(acc, ApproxColumnAccumulator)]
+        if not approx_accs:
+            return []
+        acc = approx_accs[0]
+        top_k = acc.frequent_items.top_k
+        sections = [('频数统计', f'每个变量只保留出现次数最多的{top_k}个取值, '
+                             f'频数最多低估总记录数的{frequent_items_error(top_k):.2%}'),
+                    ('数值变量分位数', f'秩误差约为{kll_rank_error(acc.quantile_sketch.k):.2%}(99%置信度), '
+                                f'MIN/MAX/MEAN/STD为精确值'),
+                    ('字符变量去重数', f'相对标准误差约为{hll_relative_error(acc.distinct_sketch.precision):.2%}')]
+        if len(approx_accs) < len(accumulators):
+            # 精确统计时只有取值个数超过EXACT_DISTINCT_LIMIT的变量使用近似统计
+            col_names = ', '.join(sorted(acc.col_name for acc in approx_accs))
+            sections = [(f'{section_name}({col_names})', error_desc) for section_name, error_desc in sections]
+        return sections
+
+    @classmethod
+    def create_df_info_from_columnar(cls, fmt, path=PATH_TO_DATA,
+                                     cols_forced_to_str=COLS_FORCED_TO_STR,
+                                     fill_nan_with_blank=FILL_NAN_WITH_BLANK,
+                                     head_line_num=HEAD_LINE_NUM,
+                                     use_cols=USE_COLS):
+        """
+        create DataFrame from parquet/feather file with memory-mapped reads
+
+        :param fmt:  'parquet' or 'feather'
+        :param use_cols:  indexes of the columns to load, None for all columns
+        """
+        try:
+            with trace_span('load', path=path) as span:
+                orig_df = cls._read_columnar(fmt=fmt, path=path, use_cols=use_cols)
+                span.set(rows=len(orig_df), cols=orig_df.shape[1])
+        except DataLoaderException as e:
+            raise QCException(str(e))
         return cls.create_df_comm_op(orig_df=orig_df, path=path, cols_forced_to_str=cols_forced_to_str,
-                                     fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num)
+                                     fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num,
+                                     inplace=True)
+
+    @classmethod
+    def _read_columnar(cls, fmt, path, use_cols):
+        """read the columns with indexes in use_cols of parquet/feather file, all columns when use_cols is None"""
+        required_cols = None
+        if use_cols is not None:
+            col_names = read_columnar_columns(path, fmt)
+            required_cols = [col_names[col_idx] for col_idx in use_cols]
+        return read_columnar(path, fmt, required_cols=required_cols)
 
     @classmethod
     def create_df_info_from_pickle(cls, path=PATH_TO_DATA,
@@ -155,30 +486,91 @@ class DataFrameInfo(object):
         :path  
         """
 
-        orig_df = pd.read_pickle(path)
+        with trace_span('load', path=path) as span:
+            orig_df = pd.read_pickle(path)
+            span.set(rows=len(orig_df), cols=orig_df.shape[1])
         return cls.create_df_comm_op(orig_df=orig_df, path=path, cols_forced_to_str=cols_forced_to_str,
-                                     fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num)
+                                     fill_nan_with_blank=fill_nan_with_blank, head_line_num=head_line_num,
+                                     inplace=True)
 
     @classmethod
-    def create_df_comm_op(cls, orig_df, path, cols_forced_to_str, fill_nan_with_blank, head_line_num):
-        # 按字母序排列DataFrame的列
-        df = orig_df.reindex(sorted(orig_df.columns), axis=1)
-        # 强制转换几个变量类型 numeric -> str
-        df = cls._force_convert_numeric_col_to_str(cols_forced_to_str=cols_forced_to_str, df=df)
+    def create_df_comm_op(cls, orig_df, path, cols_forced_to_str, fill_nan_with_blank, head_line_num,
+                          workers=QC_WORKERS, optimize=OPTIMIZE_DTYPES, freq_tables=True, inplace=False):
+        """
+        :param optimize:  compress the columns with lossless dtypes before profiling,
+                the memory of each column before and after is shown in the report
+        :param freq_tables:  calculate the frequency tables, False for the overview only (column types,
+                summaries and head rows), the frequency tables are then calculated on demand by the report server
+        :param inplace:  replace the columns forced to str and the compressed columns in orig_df itself,
+                only for the data set read by the report, so that the original columns are released;
+                False to replace them in a shallow copy, orig_df of the caller is unchanged
+        """
+        # 不按字母序复制DataFrame, 只在统计和展示时按字母序排列列; 浅拷贝只在替换列时复制被替换的列所在的数据
+        df = orig_df if inplace else orig_df.copy(deep=False)
+        sorted_col_names = sorted(df.columns)
         cols_num = df.shape[1]
         records_num = df.shape[0]
-        cols = cls._setup_df_cols(df=df)
-        numeric_cols_desc = cls._get_numeric_cols_desc(records_num=records_num, df=df)
-        str_cols_desc = cls._get_str_cols_desc(cols=cols, records_num=records_num)
-        head_rows = cls._get_head_rows(fill_nan_with_blank=fill_nan_with_blank,
-                                       head_line_num=head_line_num,
-                                       df=df)
+        with trace_span('profile', rows=records_num, cols=cols_num, workers=workers):
+            # 强制转换几个变量类型 numeric -> str
+            df = cls._force_convert_numeric_col_to_str(cols_forced_to_str=cols_forced_to_str, df=df)
+            memory_usage = None
+            if optimize:
+                with trace_span('optimize_dtypes'):
+                    memory_usage = optimize_dtypes(df)
+            with trace_span('setup_cols'):
+                cols = cls._setup_df_cols(df=df, workers=workers, col_names=sorted_col_names,
+                                          cols_type_show_desc=COLS_TYPE_SHOW_DESC if freq_tables else [])
+            with trace_span('numeric_cols_desc'):
+                numeric_cols_desc = cls._get_numeric_cols_desc(records_num=records_num, df=df,
+                                                               col_names=sorted_col_names)
+            with trace_span('str_cols_desc'):
+                str_cols_desc = cls._get_str_cols_desc(cols=cols, records_num=records_num)
+            head_rows = cls._get_head_rows(fill_nan_with_blank=fill_nan_with_blank,
+                                           head_line_num=head_line_num,
+                                           df=df.head(head_line_num).reindex(sorted_col_names, axis=1))
         # 保留原始DataFrame中的列名和列下标的关系
         orig_df_col_to_idx = dict(zip(orig_df.columns.tolist(), range(0, cols_num)))
         df_name = os.path.split(path)[-1].split('.')[0]
         return cls(orig_df=orig_df, df=df, cols_num=cols_num, records_num=records_num, cols=cols,
                    numeric_cols_desc=numeric_cols_desc, str_cols_desc=str_cols_desc, head_rows=head_rows,
-                   orig_df_col_to_idx=orig_df_col_to_idx, df_name=df_name)
+                   orig_df_col_to_idx=orig_df_col_to_idx, df_name=df_name, memory_usage=memory_usage)
+
+
+def _accumulate_partition(data_source_type, path, cols_forced_to_str, head_line_num, skip_rows, use_cols,
+                          approximate, exact_limit):
+    """
+    profile one partition into accumulators in a worker process
+
+    :return:  A tuple (accumulators, head_df, seconds spent on the partition), see DataFrameInfo._accumulate_chunks
+    """
+    start = time.perf_counter()
+    chunks = DataFrameInfo._read_partition_chunks(data_source_type=data_source_type, path=path, skip_rows=skip_rows,
+                                                  use_cols=use_cols)
+    accumulators, head_df = DataFrameInfo._accumulate_chunks(chunks=chunks, cols_forced_to_str=cols_forced_to_str,
+                                                             head_line_num=head_line_num, approximate=approximate,
+                                                             exact_limit=exact_limit)
+    return accumulators, head_df, time.perf_counter() - start
+
+
+def _setup_df_col_in_worker(col_name, col):
+    """
+    profile one column in a worker process
+
+    :param col:  Series of the column, or SharedArray holding the values of a numeric or datetime column
+    :return:  A tuple (DataFrameColsInfo without the reference to the DataFrame, the caller sets it back,
+            seconds spent on profiling the column)
+    """
+    start = time.perf_counter()
+    series = pd.Series(col.to_array(), name=col_name, copy=False) if isinstance(col, SharedArray) else col
+    col_info = DataFrameColsInfo(col_name, series.to_frame(), COLS_TYPE_SHOW_DESC)
+    col_info.df = None
+    if col_info.df_desc is not None:
+        col_info.df_desc = list(col_info.df_desc)
+    if isinstance(col, SharedArray):
+        # 释放对共享内存的引用之后才能关闭共享内存
+        del series
+        col.close()
+    return col_info, time.perf_counter() - start
 
 
 class DataFrameColsInfo(object):
@@ -214,23 +606,11 @@ class DataFrameColsInfo(object):
         """
         if type_code not in cols_type_show_desc:
             return
-        df_desc = pd.DataFrame()
-        if type_code == COLS_TYPE.NUMERIC:
-            df_desc['freq'] = self.df[self.col_name].value_counts(dropna=False).iloc[:HEAD_NUM_CONTINUS_VAR]
-            df_desc.index = df_desc.index.map(lambda x: x if np.isnan(x) else round(x, 2))
-        else:
-            if self.col_name in LIMIT_DISCRETE_COLS:
-                df_desc['freq'] = self.df[self.col_name].value_counts(dropna=False).iloc[:HEAD_NUM_DISCRETE_VAR]
-            else:
-                df_desc['freq'] = self.df[self.col_name].value_counts(dropna=False)
-        df_desc['freq_percentage'] = df_desc['freq'] / len(self.df[self.col_name])
-        df_desc['cum_freq'] = df_desc['freq'].cumsum(skipna=False)
-        df_desc['cum_freq_percentage'] = df_desc['cum_freq'] / len(self.df[self.col_name])
-
-        if FILL_NAN_WITH_BLANK:
-            return zip(df_desc.index.fillna('').tolist(), df_desc.fillna('').to_dict(orient='records'))
-        else:
-            return zip(df_desc.index.tolist(), df_desc.to_dict(orient='records'))
+        value_counts, distinct_num = cal_head_value_counts(col_name=self.col_name, series=self.df[self.col_name],
+                                                           type_code=type_code)
+        return cal_head_records_desc(col_name=self.col_name, value_counts=value_counts,
+                                     records_num=len(self.df[self.col_name]), type_code=type_code,
+                                     distinct_num=distinct_num)
 
     def _cal_col_dtype_length(self, type_code):
         """
@@ -250,12 +630,7 @@ class DataFrameColsInfo(object):
                 
         :return:  column data type: NUMERIC=1, STR=2, TIME=3
         """
-        if self.df[self.col_name].dtype in [np.float64, np.int64]:
-            return COLS_TYPE.NUMERIC
-        elif self.df[self.col_name].dtype == np.dtype('<M8[ns]'):
-            return COLS_TYPE.TIME
-        else:
-            return COLS_TYPE.STR
+        return cal_col_type_code(self.df[self.col_name].dtype)
 
 
 class ReportInfo(object):
@@ -271,23 +646,75 @@ class ReportInfo(object):
         self.process_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     @classmethod
-    def create_from_data_frame_info(cls, data_source_type):
-        if data_source_type == DATA_SOURCE_TYPE.PICKLE:
-            df_info = DataFrameInfo.create_df_info_from_pickle()
+    def create_from_data_frame_info(cls, data_source_type, path=PATH_TO_DATA, cache_dir=PROFILE_CACHE_DIR):
+        """
+        create ReportInfo from the cached DataFrameInfo when the data set and the config in PROFILE_CONFIG_KEYS
+        are unchanged, otherwise profile the data set and cache the result
+
+        :param cache_dir:  directory of the profile cache, None for no cache
+        """
+        if cache_dir is None:
+            return cls(df_info=cls._create_df_info(data_source_type, path))
+        cache = ProfileCache(cache_dir, PROFILE_CACHE_MAX_SIZE)
+        key = cache.make_key('qc', fingerprint_dataset(path),
+                             dict(get_profile_config(), data_source_type=data_source_type))
+        with trace_span('load_profile_cache') as span:
+            df_info = cache.get(key)
+            span.set(hit=df_info is not None)
+        if df_info is None:
+            df_info = cls._create_df_info(data_source_type, path).release_data()
+            cache.put(key, df_info)
+        return cls(df_info=df_info)
+
+    @classmethod
+    def _create_df_info(cls, data_source_type, path=PATH_TO_DATA):
+        if is_partitioned(path):
+            df_info = DataFrameInfo.create_df_info_from_partitions(data_source_type=data_source_type, path=path)
+        elif data_source_type == DATA_SOURCE_TYPE.PICKLE:
+            df_info = DataFrameInfo.create_df_info_from_pickle(path=path)
+        elif data_source_type == DATA_SOURCE_TYPE.CSV and CSV_CHUNK_SIZE:
+            df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=path)
         elif data_source_type == DATA_SOURCE_TYPE.CSV:
-            df_info = DataFrameInfo.create_df_info_from_ascill(read_func=pd.read_csv)
+            df_info = DataFrameInfo.create_df_info_from_ascill(read_func=pd.read_csv, path=path)
         elif data_source_type == DATA_SOURCE_TYPE.EXCEL:
-            df_info = DataFrameInfo.create_df_info_from_ascill(read_func=pd.read_excel)
+            df_info = DataFrameInfo.create_df_info_from_ascill(read_func=pd.read_excel, path=path)
+        elif data_source_type == DATA_SOURCE_TYPE.PARQUET:
+            df_info = DataFrameInfo.create_df_info_from_columnar(fmt='parquet', path=path)
+        elif data_source_type == DATA_SOURCE_TYPE.FEATHER:
+            df_info = DataFrameInfo.create_df_info_from_columnar(fmt='feather', path=path)
         else:
             raise QCException(f'{data_source_type} does not support currently!')
-        return cls(df_info=df_info)
+        return df_info
 
-    def to_html(self):
-        html = template("./report_template.html", data_quality_checker=self)
-        fname = "%s_%s_%s.html" % (REPORT_PREFIX, self.df_info.df_name, self.process_time)
-        fpath = os.path.join('dataQualityReports', fname)
-        with open(fpath, 'wb') as f:
-            f.write(html.encode('utf-8'))
+    def to_profile_artifact(self):
+        """
+        extract the compact profile the report is rendered from, the DataFrame is released first
+
+        :return:  A dict, see profile_artifact.create_profile_artifact
+        """
+        return create_profile_artifact(self.df_info.release_data(), self.process_time)
+
+    def to_html(self, report_folder='dataQualityReports', write_profile=WRITE_PROFILE_ARTIFACT, split=SPLIT_REPORT):
+        """
+        render the report from the profile, the data set is not needed during rendering
+
+        :param write_profile:  also save the profile next to the report, so that the report can be rendered again
+                by profile_artifact.py without profiling the data set
+        :param split:  write an index page with the overview and navigation, the frequency table of each column
+                is written to a separate file and loaded only when it is opened,
+                see profile_artifact.render_profile_html
+        :return:  path of the html report
+        """
+        with trace_span('profile_artifact'):
+            profile = self.to_profile_artifact()
+        fname = "%s_%s_%s" % (REPORT_PREFIX, self.df_info.df_name, self.process_time)
+        if write_profile:
+            with trace_span('write_profile_artifact'):
+                write_profile_artifact(profile, os.path.join(report_folder, fname + PROFILE_ARTIFACT_SUFFIX))
+        html_path = os.path.join(report_folder, fname + '.html')
+        with trace_span('render', cols=len(profile['cols']), split=split):
+            render_profile_html(profile, html_path, split=split)
+        return html_path
 
 
 class QCException(Exception):
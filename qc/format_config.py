@@ -13,8 +13,8 @@ def enum(**enums):
 
 ###################### 默认配置（一般情况不用修改） ######################
 
-# 数据集支持的格式(CSV和PICKLE)
-DATA_SOURCE_TYPE = enum(CSV=1, PICKLE=2, EXCEL=3)
+# 数据集支持的格式(CSV, PICKLE, EXCEL, 以及列式存储的PARQUET和FEATHER)
+DATA_SOURCE_TYPE = enum(CSV=1, PICKLE=2, EXCEL=3, PARQUET=4, FEATHER=5)
 
 # 解析csv或者excel时备选的编码方式
 DS_ENCODINGS = ('utf-8', 'gbk')
@@ -40,9 +40,51 @@ HEAD_NUM_CONTINUS_VAR = 20
 # 离散型变量在频数统计时显示的行数(防止数量太多刷屏）
 HEAD_NUM_DISCRETE_VAR = 20
 
+# 离散型变量的取值个数超过该阈值时(如ID、VIN码、地址), 频数统计只显示HEAD_NUM_DISCRETE_VAR行, 为None时不自动限制
+DISCRETE_CARDINALITY_THRESHOLD = 100
+
+# 频数统计中超出显示行数的取值合并为一行, 该行的标签
+OTHER_VALUES_LABEL = '其他'
+
+# 并行统计各列(分区数据集为各分区)的进程数, 1表示串行统计. 数值和时间类型的列通过共享内存传给子进程
+QC_WORKERS = 1
+
+# 近似统计模式下分位数概要(KLL)的参数k, k=200时分位数的秩误差约为1.3%
+SKETCH_QUANTILE_K = 200
+
+# 近似统计模式下频数统计保留的取值个数, 每个取值的频数最多低估总记录数的1/(SKETCH_TOP_K+1)
+SKETCH_TOP_K = 1000
+
+# 近似统计模式下去重数概要(HyperLogLog)的精度, 使用2**SKETCH_HLL_PRECISION字节, 14时相对误差约为0.8%
+SKETCH_HLL_PRECISION = 14
+
+# 读入数据集后是否压缩各列的类型(取值较少的字符串列转为category, 数值列无损降为更小的类型), 可以统计更大的数据集,
+# 报告中会显示每列压缩前后占用的内存, 分块读取和分区数据集不需要压缩
+OPTIMIZE_DTYPES = False
+
+# 是否记录各阶段(读取、每一列的统计、渲染等)的耗时、记录数和内存峰值, 开启后在报告旁边写入同名的.trace.json文件,
+# 并在结束时打印耗时最长的TRACE_SLOWEST_N个阶段
+TRACE_ENABLED = False
+TRACE_SLOWEST_N = 10
+
+# 生成报告时是否同时保存报告用到的统计结果(profile), 之后可以用profile_artifact.py直接重新渲染报告
+WRITE_PROFILE_ARTIFACT = True
+
+# 是否生成拆分的报告: 报告页面只包含概览、综合统计和导航栏, 每个变量的频数统计表写入报告旁边的<报告名>_files目录,
+# 展开时才加载, 变量很多时可以快速打开报告; 直接打开本地文件即可, 不需要启动服务
+SPLIT_REPORT = False
+
+# 统计结果的缓存目录, 数据集和影响统计结果的配置(PROFILE_CONFIG_KEYS)都没有变化时直接使用缓存生成报告, 为None时不使用缓存
+# 示例：PROFILE_CACHE_DIR = './profile_cache'
+PROFILE_CACHE_DIR = None
+
+# 缓存目录的大小上限(字节), 超过时删除最久没有使用的缓存
+PROFILE_CACHE_MAX_SIZE = 1024 ** 3
+
 ######################  通用配置（每次选择不同数据集的时候，需要按需调整） ######################
 
-# 原始数据集的路径
+# 原始数据集的路径, 也可以是目录或者通配符(如"./data/2014-2017/*.csv"), 此时目录中的每个文件是一个分区,
+# 各分区的格式都是DATA_SOURCE_DEFAULT_TYPE且列相同, 分区分别统计(QC_WORKERS大于1时并行)后合并, 不会拼接成一个DataFrame
 PATH_TO_DATA = "/Users/hzzlj/Desktop/Projects/dm/安华农/安华农数据步骤整理/step_15_合并违章数据_2014_2016.pkl"
 
 # 默认的数据格式PICKLE, 可以根据需要更改为数据集支持的格式
@@ -51,7 +93,7 @@ DATA_SOURCE_DEFAULT_TYPE = DATA_SOURCE_TYPE.PICKLE
 # 需要强制转换为STR的列的列表, 例如["Credit-No", "Dealer", "DefectCode"]
 COLS_FORCED_TO_STR = []
 
-# 列表中的离散变量最多展示《默认配置》中HEAD_NUM_DISCRETE_VAR数量的行数
+# 列表中的离散变量最多展示《默认配置》中HEAD_NUM_DISCRETE_VAR数量的行数(取值个数超过DISCRETE_CARDINALITY_THRESHOLD的变量会自动限制)
 LIMIT_DISCRETE_COLS = ['被保人姓名', '车主姓名', '车型代码', '车牌号', '车系代码', '车系名称', '车队代码',
                        '品牌代码', '品牌名称', '车型名称', 'VIN码', 'brand', '发动机号']
 
@@ -64,3 +106,25 @@ SKIP_ROWS = []
 # 需要LOAD的列编号
 # 示例：USE_COLS = range(1, 63)
 USE_COLS = None
+# 分块读取csv时每块的记录数, 设置后逐块统计, 内存占用只与块大小和EXACT_DISTINCT_LIMIT有关(适用于超过内存大小的文件)
+# 示例：CSV_CHUNK_SIZE = 500000, 为None时一次性读入整个文件
+CSV_CHUNK_SIZE = None
+# 分块读取csv时是否使用近似统计(适用于十亿行级别的数据集), 只在设置了CSV_CHUNK_SIZE或者PATH_TO_DATA为分区数据集时生效,
+# 一次性读入内存的数据集总是精确统计
+# 频数统计、分位数和去重数使用可合并的概要数据结构计算, 每列内存占用固定, 报告开头会注明近似统计的部分及其误差
+APPROXIMATE_STATS = False
+# 逐块精确统计(APPROXIMATE_STATS为False)时每列最多保留精确频数的取值个数, 超过时(如ID、VIN码)该列改用近似统计,
+# 报告开头会列出这些变量; 为None时不限制, 内存占用和每块的合并时间都与取值个数成正比
+EXACT_DISTINCT_LIMIT = 100000
+
+# 影响统计结果的配置, 其中任何一项变化时缓存失效(报告前缀、并行进程数等只影响输出或者速度的配置不在其中)
+PROFILE_CONFIG_KEYS = ['COLS_TYPE_SHOW_DESC', 'FILL_NAN_WITH_BLANK', 'HEAD_LINE_NUM', 'HEAD_NUM_CONTINUS_VAR',
+                       'HEAD_NUM_DISCRETE_VAR', 'DISCRETE_CARDINALITY_THRESHOLD', 'OTHER_VALUES_LABEL',
+                       'SKETCH_QUANTILE_K', 'SKETCH_TOP_K', 'SKETCH_HLL_PRECISION', 'DS_ENCODINGS',
+                       'COLS_FORCED_TO_STR', 'LIMIT_DISCRETE_COLS', 'SKIP_ROWS', 'USE_COLS', 'CSV_CHUNK_SIZE',
+                       'APPROXIMATE_STATS', 'EXACT_DISTINCT_LIMIT', 'OPTIMIZE_DTYPES']
+
+
+def get_profile_config():
+    """:return:  PROFILE_CONFIG_KEYS中各配置当前的取值, 在计算缓存的键时读取, 运行时覆盖的配置(如batch_runner)同样生效"""
+    return {key: globals()[key] for key in PROFILE_CONFIG_KEYS}
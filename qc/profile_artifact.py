@@ -0,0 +1,214 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Compact, versioned profile artifact holding only what the report template needs,
+# the report can be rendered from the artifact alone without pandas or the data set
+#
+import argparse
+import gzip
+import json
+import os
+from urllib.parse import quote
+
+from bottle import SimpleTemplate
+
+# 格式版本, profile的结构变化时加1
+PROFILE_ARTIFACT_VERSION = 1
+
+# 模板所在的目录以及模板文件名
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_TEMPLATE = 'report_template.html'
+
+# profile文件的后缀
+PROFILE_ARTIFACT_SUFFIX = '.profile.json.gz'
+
+# 拆分模式下存放各变量频数统计表的目录, 与报告同名加上这个后缀
+SPLIT_REPORT_FILES_SUFFIX = '_files'
+
+
+class ProfileArtifactException(Exception):
+    pass
+
+
+def create_profile_artifact(df_info, process_time):
+    """
+    extract what the report needs from DataFrameInfo
+
+    :param df_info:  instance of DataFrameInfo
+    :param process_time:  report generate time
+    :return:  A dict with only lists, dicts and scalars
+    """
+    memory_usage = df_info.memory_usage or {}
+    cols = [create_col_profile(col, df_info.orig_df_col_to_idx.get(col.col_name), memory_usage.get(col.col_name))
+            for col in df_info.cols.values()]
+    col_names = [col['name'] for col in cols]
+    return {'version': PROFILE_ARTIFACT_VERSION,
+            'df_name': df_info.df_name,
+            'process_time': process_time,
+            'records_num': df_info.records_num,
+            'cols_num': df_info.cols_num,
+            'approximate_sections': [list(section) for section in df_info.approximate_sections],
+            'cols': cols,
+            'str_cols_desc': [[desc_name, desc_item] for desc_name, desc_item in df_info.str_cols_desc],
+            'numeric_cols_desc': [[desc_name, desc_item] for desc_name, desc_item in df_info.numeric_cols_desc],
+            'head_rows': [[row_idx, [row.get(col_name) for col_name in col_names]]
+                          for row_idx, row in df_info.head_rows]}
+
+
+def create_col_profile(col, idx, memory=None):
+    """
+    extract what the report needs from one column
+
+    :param col:  instance of DataFrameColsInfo or ColumnSummary
+    :param idx:  index of the column in the original DataFrame
+    :param memory:  memory of the column before and after compressing the dtypes, None if not compressed
+    :return:  A dict, freq_table is None for the columns without frequency table
+    """
+    freq_table = None
+    if col.df_desc is not None:
+        freq_table = [[statis_name, statis_item.get('freq'), statis_item.get('freq_percentage'),
+                       statis_item.get('cum_freq'), statis_item.get('cum_freq_percentage')]
+                      for statis_name, statis_item in col.df_desc]
+    return {'name': col.col_name, 'idx': idx, 'type': str(col.type), 'type_length': col.type_length,
+            'freq_table': freq_table, 'memory': memory}
+
+
+def _to_json_value(value):
+    """numpy scalars are converted to python scalars, the others (e.g. timestamps) to their str as shown in report"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def write_profile_artifact(profile, path):
+    """write the profile as gzipped json"""
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, separators=(',', ':'), default=_to_json_value)
+
+
+def read_profile_artifact(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        profile = json.load(f)
+    if profile.get('version') != PROFILE_ARTIFACT_VERSION:
+        raise ProfileArtifactException(f'Unsupported profile version {profile.get("version")} of {path}, '
+                                       f'expected {PROFILE_ARTIFACT_VERSION}')
+    return profile
+
+
+def get_var_id(col_pos):
+    """id of the frequency table of the col_pos-th column in the report, also the name of its fragment file"""
+    return f'var_{col_pos}'
+
+
+def has_freq_table(col):
+    """
+    whether the column has a frequency table in the report, the report server (pipeline/report_server.py)
+    sets freq_table_on_demand instead of the frequency table, which is calculated when it is opened
+    """
+    return bool(col['freq_table']) or col.get('freq_table_on_demand', False)
+
+
+def iter_report_fragments(profile, template_path=REPORT_TEMPLATE, fragments_url=None):
+    """
+    render the report section by section, the rows of the variable list and summaries and the frequency table
+    of each column are rendered one at a time, so only one fragment is held in memory whatever the number of columns
+
+    :param fragments_url:  relative url of the directory holding the frequency tables in split mode,
+            only a placeholder of each frequency table is rendered; None to render the frequency tables inline
+    :return:  iterator of html fragments in the order of the report
+    """
+    report_template = SimpleTemplate(name=template_path, lookup=[TEMPLATE_DIR])
+
+    def render(section, **kwargs):
+        return report_template.render(section=section, profile=profile, **kwargs)
+
+    show_memory = any(col.get('memory') for col in profile['cols'])
+    yield render('header', show_memory=show_memory)
+    for col in profile['cols']:
+        yield render('var_row', col=col, show_memory=show_memory)
+    yield render('freq_header')
+    for col_pos, col in enumerate(profile['cols']):
+        if not has_freq_table(col):
+            continue
+        var_id = get_var_id(col_pos)
+        if fragments_url is None:
+            yield render('freq_table', col=col, var_id=var_id)
+        else:
+            yield render('freq_placeholder', col=col, var_id=var_id, fragment_src=f'{fragments_url}/{var_id}.js')
+    yield render('str_header')
+    for desc_name, desc_item in profile['str_cols_desc']:
+        yield render('str_row', desc_name=desc_name, desc_item=desc_item)
+    yield render('numeric_header')
+    for desc_name, desc_item in profile['numeric_cols_desc']:
+        yield render('numeric_row', desc_name=desc_name, desc_item=desc_item)
+    yield render('sample_header')
+    for row_idx, row in profile['head_rows']:
+        yield render('sample_row', row_idx=row_idx, row=row)
+    yield render('sample_footer')
+    yield render('nav_header')
+    for col_pos, col in enumerate(profile['cols']):
+        if has_freq_table(col):
+            yield render('nav_item', col=col, var_id=get_var_id(col_pos))
+    yield render('nav_footer')
+    yield render('footer')
+
+
+def iter_freq_table_fragments(profile, template_path=REPORT_TEMPLATE):
+    """
+    render the frequency table of each column as a script calling qcFragmentLoaded of the index page,
+    which is loaded by a script tag when the table is opened, so that it works from the local filesystem
+
+    :return:  iterator of (var_id, script)
+    """
+    report_template = SimpleTemplate(name=template_path, lookup=[TEMPLATE_DIR])
+    for col_pos, col in enumerate(profile['cols']):
+        if col['freq_table']:
+            var_id = get_var_id(col_pos)
+            yield var_id, render_freq_table_script(report_template, profile, col, var_id)
+
+
+def render_freq_table_script(report_template, profile, col, var_id):
+    """
+    :param report_template:  SimpleTemplate of the report
+    :param col:  column in profile with its frequency table
+    :return:  script calling qcFragmentLoaded of the index page with the frequency table of the column
+    """
+    html = report_template.render(section='freq_table', profile=profile, col=col, var_id=var_id)
+    return f'qcFragmentLoaded({json.dumps(var_id)}, {json.dumps(html, ensure_ascii=False)});\n'
+
+
+def render_profile_html(profile, path, template_path=REPORT_TEMPLATE, split=False):
+    """
+    render the report from profile and write it to path fragment by fragment
+
+    :param split:  write a lightweight index to path with the overview, summaries and navigation,
+            and the frequency table of each column to a separate file in the directory path without .html
+            plus SPLIT_REPORT_FILES_SUFFIX, loaded only when the table is opened
+    """
+    fragments_url = None
+    if split:
+        files_dir = os.path.splitext(path)[0] + SPLIT_REPORT_FILES_SUFFIX
+        os.makedirs(files_dir, exist_ok=True)
+        for var_id, script in iter_freq_table_fragments(profile, template_path):
+            with open(os.path.join(files_dir, var_id + '.js'), 'w', encoding='utf-8') as f:
+                f.write(script)
+        # 报告名中可能有空格、冒号和中文, 编码后作为相对路径
+        fragments_url = './' + quote(os.path.basename(files_dir))
+    with open(path, 'w', encoding='utf-8') as f:
+        for fragment in iter_report_fragments(profile, template_path, fragments_url):
+            f.write(fragment)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='render qc report from a saved profile')
+    parser.add_argument('profile_path', help=f'profile file ending with {PROFILE_ARTIFACT_SUFFIX}')
+    parser.add_argument('--output', help='path of the html report, default to the profile path with .html')
+    parser.add_argument('--split', action='store_true',
+                        help='write the frequency tables to separate files loaded when opened')
+    args = parser.parse_args()
+    output = args.output
+    if output is None:
+        output = (args.profile_path[:-len(PROFILE_ARTIFACT_SUFFIX)] if args.profile_path.endswith(
+            PROFILE_ARTIFACT_SUFFIX) else args.profile_path) + '.html'
+    render_profile_html(read_profile_artifact(args.profile_path), output, split=args.split)
+    print(f'report is written to {output}')
@@ -6,11 +6,21 @@
 # Data Qaulity Reporter (html format)
 #
 
+import logging
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.tracer import finish_tracing, start_tracing
 from data_quality_reporter import ReportInfo
-from format_config import DATA_SOURCE_DEFAULT_TYPE
+from format_config import DATA_SOURCE_DEFAULT_TYPE, TRACE_ENABLED, TRACE_SLOWEST_N
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     print('start to generate qc report')
+    if TRACE_ENABLED:
+        start_tracing('qc')
     data_quality_checker = ReportInfo.create_from_data_frame_info(data_source_type=DATA_SOURCE_DEFAULT_TYPE)
-    data_quality_checker.to_html()
+    report_path = data_quality_checker.to_html()
+    finish_tracing(report_path, TRACE_SLOWEST_N)
     print('finished generating qc report')
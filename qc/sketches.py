@@ -0,0 +1,313 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# Mergeable sketches with constant memory per column, used by the approximate statistics mode
+#
+import numpy as np
+import pandas as pd
+
+from column_profile import ColumnAccumulator, cal_weighted_quantiles
+from format_config import EXACT_DISTINCT_LIMIT, SKETCH_HLL_PRECISION, SKETCH_QUANTILE_K, SKETCH_TOP_K
+
+# dtypes of the chunks whose values are all numbers, see ColumnAccumulator.create_from_series
+NUMERIC_DTYPES = {np.dtype(np.int64), np.dtype(np.float64)}
+
+
+def kll_rank_error(k):
+    """
+    normalized rank error of KLLSketch with parameter k (empirical bound at 99% confidence)
+
+    :return:  e.g. 0.0133 for k=200, the rank of a returned quantile is within 1.33% of the requested one
+    """
+    return 2.296 / k ** 0.9723
+
+
+def hll_relative_error(precision):
+    """relative standard error of the distinct count estimated by HyperLogLog"""
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def hash_values(values):
+    """
+    64 bit hashes of values, equal numbers get the same hash whatever the dtype of their chunk,
+    e.g. 3 in an int64 chunk and 3.0 in a float64 chunk (a chunk with missing values)
+
+    :return:  uint64 array
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return pd.util.hash_array(values.astype(np.int64))
+    if values.dtype.kind != 'f':
+        return pd.util.hash_array(values)
+    values = values.astype(np.float64)
+    hashes = pd.util.hash_array(values)
+    integral = (np.mod(values, 1) == 0) & (np.abs(values) < 2 ** 63)
+    if integral.any():
+        hashes[integral] = pd.util.hash_array(values[integral].astype(np.int64))
+    return hashes
+
+
+def frequent_items_error(top_k):
+    """upper bound of the undercount of each frequency in FrequentItemsSketch, as a fraction of records"""
+    return 1 / (top_k + 1)
+
+
+class KLLSketch(object):
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty, 2016)
+
+    Items are kept in levels of compactors, an item in level h stands for 2**h items of the input.
+    A full level is sorted and every other item (from a random offset) is promoted to the next level.
+    Memory is O(k) items whatever the number of items seen.
+
+    :attribute k:  size of the top level, larger k means smaller error, see kll_rank_error
+    :attribute n:  number of items seen
+    :attribute levels:  arrays of items of each level
+    :attribute min:  exact minimum
+    :attribute max:  exact maximum
+    """
+
+    def __init__(self, k=SKETCH_QUANTILE_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.min = np.nan
+        self.max = np.nan
+        self._rng = np.random.RandomState(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # 奇数个时留下一个, 其余的隔一个取一个升级到上一层, 权重翻倍
+                kept, items = items[:len(items) % 2], items[len(items) % 2:]
+                promoted = items[self._rng.randint(2)::2]
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # 层数增加后下层的容量变小, 从底层重新检查
+                level = 0
+            else:
+                level += 1
+
+    def update(self, values):
+        """
+        :param values:  array of numbers without nan
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def update_value_counts(self, value_counts):
+        """
+        add each value as many times as its count without repeating it, a count is split into powers of two
+        and the value is added once to each level of the corresponding bits
+
+        :param value_counts:  Series with numbers as index and their counts as values
+        """
+        if len(value_counts) == 0:
+            return
+        values = value_counts.index.values.astype(np.float64)
+        counts = value_counts.values.astype(np.int64)
+        self.n += int(counts.sum())
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+        for level in range(int(counts.max()).bit_length()):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], values[((counts >> level) & 1) == 1]])
+        self._compress()
+
+    def merge(self, other):
+        self.n += other.n
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+
+    def get_quantiles(self, quantiles):
+        """
+        :param quantiles:  list of quantiles between 0 and 1
+        :return:  an array with one element per quantile, 0 and 1 are the exact minimum and maximum
+        """
+        if self.n == 0:
+            return np.full(len(quantiles), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2 ** level)
+                                  for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind='mergesort')
+        values = cal_weighted_quantiles(items[order], weights[order], quantiles)
+        quantiles = np.asarray(quantiles)
+        values = np.where(quantiles <= 0, self.min, np.where(quantiles >= 1, self.max, values))
+        return np.clip(values, self.min, self.max)
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog distinct count sketch (Flajolet et al., 2007) on 64 bit hashes
+
+    :attribute precision:  the sketch uses 2**precision registers of one byte, see hll_relative_error
+    :attribute registers:  max rank of the hashes falling into each register
+    """
+
+    def __init__(self, precision=SKETCH_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """
+        :param values:  array of values without nan, duplicated values do not change the sketch,
+                see hash_values for numbers of different dtypes
+        """
+        if len(values) == 0:
+            return
+        hashes = hash_values(values)
+        value_bits = 64 - self.precision
+        idx = (hashes >> np.uint64(value_bits)).astype(np.int64)
+        remaining = hashes & np.uint64((1 << value_bits) - 1)
+        # 剩余位中第一个1的位置, 低于2**53的整数转换为浮点数是精确的, frexp的指数即为二进制位数
+        _, bit_length = np.frexp(remaining.astype(np.float64))
+        ranks = (value_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def get_distinct_num(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # 基数较小时使用linear counting
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class FrequentItemsSketch(object):
+    """
+    Mergeable Misra-Gries summary keeping at most top_k values (Agarwal et al., 2012)
+
+    Counts are never overestimated, the undercount of each value is at most error,
+    which is at most records / (top_k + 1), see frequent_items_error
+
+    :attribute top_k:  max number of values kept
+    :attribute counts:  estimated counts of the kept values
+    :attribute error:  max undercount of each count
+    """
+
+    def __init__(self, top_k=SKETCH_TOP_K):
+        self.top_k = top_k
+        self.counts = pd.Series([], dtype=np.float64)
+        self.error = 0.0
+
+    def update(self, value_counts):
+        """
+        :param value_counts:  exact counts of a part of the column, e.g. value counts of a chunk
+        """
+        counts = self.counts.add(value_counts.astype(np.float64), fill_value=0)
+        if len(counts) > self.top_k:
+            counts = counts.sort_values(ascending=False, kind='mergesort')
+            offset = counts.iloc[self.top_k]
+            counts = counts.iloc[:self.top_k] - offset
+            counts = counts[counts > 0]
+            self.error += offset
+        self.counts = counts
+
+    def merge(self, other):
+        self.error += other.error
+        self.update(other.counts)
+
+
+class ApproxColumnAccumulator(ColumnAccumulator):
+    """
+    ColumnAccumulator keeping sketches instead of the exact value counts, memory per column is constant.
+    Frequency tables, quantiles and distinct counts are approximate, the others stay exact.
+    Used for all the columns in the approximate mode, otherwise only for the columns with more than
+    EXACT_DISTINCT_LIMIT distinct values, see bound_accumulator.
+
+    :attribute frequent_items:  FrequentItemsSketch of non missing values
+    :attribute quantile_sketch:  KLLSketch of numeric values
+    :attribute distinct_sketch:  HyperLogLog of non missing values
+    """
+
+    def __init__(self, col_name, quantile_k=SKETCH_QUANTILE_K, top_k=SKETCH_TOP_K,
+                 hll_precision=SKETCH_HLL_PRECISION):
+        super(ApproxColumnAccumulator, self).__init__(col_name)
+        self.value_counts = None
+        self.frequent_items = FrequentItemsSketch(top_k)
+        self.quantile_sketch = KLLSketch(quantile_k)
+        self.distinct_sketch = HyperLogLog(hll_precision)
+
+    @classmethod
+    def create_from_accumulator(cls, acc):
+        """
+        :param acc:  ColumnAccumulator with the exact value counts
+        """
+        approx_acc = cls(acc.col_name)
+        approx_acc.merge(acc)
+        return approx_acc
+
+    def update(self, series):
+        self.merge(ColumnAccumulator.create_from_series(series))
+
+    def _merge_values(self, other):
+        if isinstance(other, ApproxColumnAccumulator):
+            self.frequent_items.merge(other.frequent_items)
+            self.quantile_sketch.merge(other.quantile_sketch)
+            self.distinct_sketch.merge(other.distinct_sketch)
+        elif len(other.value_counts):
+            self.frequent_items.update(other.value_counts)
+            self.distinct_sketch.update(other.value_counts.index.values)
+            # 有非数值的块时整列不是数值变量, 不需要分位数
+            if other.numeric_num and other.dtypes <= NUMERIC_DTYPES:
+                self.quantile_sketch.update_value_counts(other.value_counts)
+
+    def _get_non_missing_value_counts(self):
+        return self.frequent_items.counts
+
+    def _cal_quantiles(self, quantiles):
+        return self.quantile_sketch.get_quantiles(quantiles)
+
+    def get_distinct_num(self):
+        return self.distinct_sketch.get_distinct_num()
+
+
+def bound_accumulator(acc, exact_limit=EXACT_DISTINCT_LIMIT):
+    """
+    keep the memory of a column bounded in the exact mode, its value counts grow with its distinct values
+
+    :param exact_limit:  max number of distinct values kept exactly, None for no limit
+    :return:  acc, or an ApproxColumnAccumulator created from acc when it has more than exact_limit distinct values
+    """
+    if exact_limit is None or isinstance(acc, ApproxColumnAccumulator) or acc.get_distinct_num() <= exact_limit:
+        return acc
+    return ApproxColumnAccumulator.create_from_accumulator(acc)
+
+
+def merge_accumulators(acc, other, exact_limit=EXACT_DISTINCT_LIMIT):
+    """
+    merge the accumulator of another part of the same column, e.g. another partition
+
+    :return:  the merged accumulator, an ApproxColumnAccumulator when either of them is approximate
+            or it has more than exact_limit distinct values
+    """
+    if isinstance(other, ApproxColumnAccumulator) and not isinstance(acc, ApproxColumnAccumulator):
+        acc = ApproxColumnAccumulator.create_from_accumulator(acc)
+    acc.merge(other)
+    return bound_accumulator(acc, exact_limit)
@@ -7,13 +7,16 @@
 # unittest for data_quality_reporter
 import collections
 import datetime
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import pandas as pd
 
 import format_config
-from data_quality_reporter import DataFrameInfo, DataFrameColsInfo
+from common.tracer import TRACE_FILE_SUFFIX, finish_tracing, start_tracing
+from data_quality_reporter import DataFrameInfo, DataFrameColsInfo, ReportInfo
 
 
 class TestDataFrameInfo(unittest.TestCase):
@@ -45,6 +48,24 @@ class TestDataFrameInfo(unittest.TestCase):
         for (_, content_left), (_, content_right) in zip(numeric_col_desc, self.df_info.numeric_cols_desc):
             self.assertEqual(content_left, content_right)
 
+    def test_get_numeric_cols_desc_same_as_describe(self):
+        # 与原来由describe和quantile计算的结果完全相同, 包括有空值的列、整数列和全部为空的列
+        rng = np.random.RandomState(0)
+        s_float = pd.Series(rng.normal(size=1001).round(3))
+        s_float[rng.rand(1001) < 0.2] = np.nan
+        df = pd.DataFrame({'float': s_float, 'int': rng.randint(-50, 50, 1001), 'all_nan': np.nan,
+                           'str': rng.choice(['a', 'b'], 1001)})
+        numeric_cols = df.describe().T
+        numeric_cols['# MISSING'] = len(df) - numeric_cols['count']
+        for i in range(10):
+            numeric_cols[f'{(i + 1) * 10}%'] = df.quantile((i + 1) / 10, numeric_only=True)
+        expected = list(zip(numeric_cols.index, numeric_cols.fillna(0).to_dict(orient='records')))
+
+        numeric_cols_desc = DataFrameInfo._get_numeric_cols_desc(records_num=len(df), df=df)
+        self.assertEqual([col_name for col_name, _ in numeric_cols_desc], [col_name for col_name, _ in expected])
+        for (_, desc), (_, expected_desc) in zip(numeric_cols_desc, expected):
+            self.assertEqual(list(desc.items()), list(expected_desc.items()))
+
     def test_get_str_cols_desc(self):
         str_cols_desc = []
         for col_name, col in self.df_info.cols.items():
@@ -64,6 +85,16 @@ class TestDataFrameInfo(unittest.TestCase):
     def test_force_convert_numeric_col_to_str(self):
         self.assertEqual(self.df_info.df['numeric'].dtype, object)
 
+    def test_setup_df_cols_in_parallel(self):
+        cols = DataFrameInfo._setup_df_cols(df=self.df_info.df, workers=2)
+        self.assertEqual(list(cols.keys()), list(self.df_info.cols.keys()))
+        for col_name, col in cols.items():
+            expected_col = self.df_info.cols[col_name]
+            self.assertIs(col.df, self.df_info.df)
+            self.assertEqual((col.type_code, col.type, col.type_length),
+                             (expected_col.type_code, expected_col.type, expected_col.type_length))
+            self.assertEqual(list(col.df_desc or []), list(expected_col.df_desc or []))
+
 
 class TestDataFrameColsInfo(unittest.TestCase):
     def setUp(self):
@@ -92,6 +123,26 @@ class TestDataFrameColsInfo(unittest.TestCase):
         for (_, content_left), (_, content_right) in zip(target_res, self.df_info.cols['numeric2'].df_desc):
             self.assertEqual(content_left, content_right)
 
+    def test_cal_head_records_desc_with_high_cardinality(self):
+        records_num = format_config.DISCRETE_CARDINALITY_THRESHOLD * 2
+        ids = pd.Series([f'id{i}' for i in range(records_num)])
+        ids[:10] = 'id0'
+        ids[10:15] = np.nan
+        df = pd.DataFrame({'id': ids, 'enum': ['a', 'b'] * (records_num // 2)})
+        df_desc = list(DataFrameColsInfo('id', df, [format_config.COLS_TYPE.STR]).df_desc)
+        self.assertEqual(len(df_desc), format_config.HEAD_NUM_DISCRETE_VAR + 1)
+        self.assertEqual(df_desc[0], ('id0', {'freq': 10, 'freq_percentage': 10 / records_num, 'cum_freq': 10,
+                                              'cum_freq_percentage': 10 / records_num}))
+        self.assertEqual(df_desc[1][0], '')
+        self.assertEqual(df_desc[1][1]['freq'], 5)
+        other_name, other_item = df_desc[-1]
+        self.assertEqual(other_name, format_config.OTHER_VALUES_LABEL)
+        self.assertEqual(other_item['freq'], records_num - 15 - (format_config.HEAD_NUM_DISCRETE_VAR - 2))
+        self.assertEqual(other_item['cum_freq'], records_num)
+
+        df_desc = list(DataFrameColsInfo('enum', df, [format_config.COLS_TYPE.STR]).df_desc)
+        self.assertEqual([name for name, _ in df_desc], ['a', 'b'])
+
     def test_cal_col_type_code(self):
         self.assertEqual(self.df_info.cols['numeric'].type_code, format_config.COLS_TYPE.STR)
         self.assertEqual(self.df_info.cols['numeric2'].type_code, format_config.COLS_TYPE.NUMERIC)
@@ -99,5 +150,149 @@ class TestDataFrameColsInfo(unittest.TestCase):
         self.assertEqual(self.df_info.cols['time'].type_code, format_config.COLS_TYPE.TIME)
 
 
+class TestStreamingDataFrameInfo(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        records_num = 3000
+        s_float = pd.Series(rng.normal(size=records_num).round(2))
+        s_float[rng.rand(records_num) < 0.1] = np.nan
+        test_orig_df = pd.DataFrame({'numeric': rng.randint(0, 5, records_num),
+                                     'numeric2': rng.randint(0, 50, records_num),
+                                     'float': s_float,
+                                     'str': rng.choice(['a', 'b', 'c', None], records_num)})
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp_dir.name, 'test.csv')
+        test_orig_df.to_csv(path, index=False)
+        self.df_info = DataFrameInfo.create_df_info_from_ascill(read_func=pd.read_csv, path=path,
+                                                                cols_forced_to_str=['numeric'])
+        self.streaming_df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=path, chunk_size=700,
+                                                                              cols_forced_to_str=['numeric'])
+        # 同样的数据拆分为多个分区文件
+        partition_dir = os.path.join(self.tmp_dir.name, 'partitions')
+        os.makedirs(partition_dir)
+        for partition_idx, partition_df in enumerate(np.array_split(test_orig_df, 3)):
+            partition_df.to_csv(os.path.join(partition_dir, f'{partition_idx}.csv'), index=False)
+        self.partitioned_df_infos = [
+            DataFrameInfo.create_df_info_from_partitions(format_config.DATA_SOURCE_TYPE.CSV, path=partition_dir,
+                                                         cols_forced_to_str=['numeric'], workers=workers)
+            for workers in (1, 2)]
+        self.other_df_infos = [self.streaming_df_info] + self.partitioned_df_infos
+        self.csv_df = pd.read_csv(path)
+        self.optimized_df_info = DataFrameInfo.create_df_comm_op(orig_df=self.csv_df, path=path,
+                                                                 cols_forced_to_str=['numeric'],
+                                                                 fill_nan_with_blank=True, head_line_num=20,
+                                                                 optimize=True)
+        # 频数统计和样本数据可以多次读取
+        for df_info in [self.df_info, self.optimized_df_info] + self.other_df_infos:
+            df_info.release_data()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_numeric_cols_desc(self):
+        numeric_cols_desc = list(self.df_info.numeric_cols_desc)
+        for other_df_info in self.other_df_infos:
+            streaming_numeric_cols_desc = list(other_df_info.numeric_cols_desc)
+            self.assertEqual([col_name for col_name, _ in numeric_cols_desc],
+                             [col_name for col_name, _ in streaming_numeric_cols_desc])
+            for (_, content_left), (_, content_right) in zip(numeric_cols_desc, streaming_numeric_cols_desc):
+                self.assertEqual(content_left.keys(), content_right.keys())
+                for key in content_left:
+                    self.assertAlmostEqual(content_left[key], content_right[key])
+
+    def test_str_cols_desc(self):
+        for other_df_info in self.other_df_infos:
+            self.assertEqual(self.df_info.str_cols_desc, other_df_info.str_cols_desc)
+
+    def test_cols(self):
+        for other_df_info in self.other_df_infos:
+            self.assertEqual(self.df_info.cols.keys(), other_df_info.cols.keys())
+            self.assertEqual(self.df_info.orig_df_col_to_idx, other_df_info.orig_df_col_to_idx)
+            for col_name, col in self.df_info.cols.items():
+                streaming_col = other_df_info.cols[col_name]
+                self.assertEqual(col.type, streaming_col.type)
+                self.assertEqual(col.type_length, streaming_col.type_length)
+                # values with the same frequency may be listed in different order
+                self.assertEqual([statis_item['freq'] for _, statis_item in col.df_desc],
+                                 [statis_item['freq'] for _, statis_item in streaming_col.df_desc])
+
+    def test_head_rows(self):
+        for other_df_info in self.other_df_infos:
+            self.assertEqual(str(list(self.df_info.head_rows)), str(list(other_df_info.head_rows)))
+
+    def test_optimize_dtypes(self):
+        # 压缩类型不改变任何统计结果
+        self.assertEqual(self.df_info.numeric_cols_desc, self.optimized_df_info.numeric_cols_desc)
+        self.assertEqual(self.df_info.str_cols_desc, self.optimized_df_info.str_cols_desc)
+        self.assertEqual(str(self.df_info.head_rows), str(self.optimized_df_info.head_rows))
+        for col_name, col in self.df_info.cols.items():
+            optimized_col = self.optimized_df_info.cols[col_name]
+            self.assertEqual(col.type_code, optimized_col.type_code)
+            self.assertEqual(col.df_desc, optimized_col.df_desc)
+        self.assertEqual(str(self.optimized_df_info.cols['numeric2'].type), 'int8')
+        self.assertEqual(str(self.optimized_df_info.cols['str'].type), 'category')
+        self.assertIsNone(self.df_info.memory_usage)
+        # 调用方的DataFrame不变, 强制转换为字符串和压缩类型只替换浅拷贝中的列
+        pd.testing.assert_frame_equal(self.csv_df, pd.read_csv(os.path.join(self.tmp_dir.name, 'test.csv')))
+        memory_usage = self.optimized_df_info.memory_usage
+        for col_name in ['numeric', 'numeric2', 'str']:
+            self.assertLess(memory_usage[col_name][1], memory_usage[col_name][0])
+        # 保留两位小数的值不能无损地转换为float32
+        self.assertEqual(memory_usage['float'][1], memory_usage['float'][0])
+
+    def test_partitioned_df_name(self):
+        self.assertEqual(self.partitioned_df_infos[0].df_name, 'partitions')
+
+
+
+class TestReportInfo(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'test.csv')
+        pd.DataFrame({'numeric': [1.5, 2.5, np.nan], 'str': ['a', 'b', 'a']}).to_csv(self.path, index=False)
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def render(self, report_info):
+        report_info.process_time = ''
+        report_info.to_html(report_folder=self.tmp_dir.name, write_profile=False)
+        with open(os.path.join(self.tmp_dir.name, f'{format_config.REPORT_PREFIX}_test_.html'),
+                  encoding='utf-8') as f:
+            return f.read()
+
+    def test_create_from_data_frame_info_with_cache(self):
+        report_info = ReportInfo.create_from_data_frame_info(format_config.DATA_SOURCE_TYPE.CSV, path=self.path,
+                                                             cache_dir=self.cache_dir)
+        self.assertIsNone(report_info.df_info.df)
+        html = self.render(report_info)
+        # 缓存的统计结果可以多次渲染, 与不使用缓存时的报告一致
+        self.assertEqual(html, self.render(report_info))
+        self.assertEqual(html, self.render(ReportInfo.create_from_data_frame_info(
+            format_config.DATA_SOURCE_TYPE.CSV, path=self.path, cache_dir=None)))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        cached_report_info = ReportInfo.create_from_data_frame_info(format_config.DATA_SOURCE_TYPE.CSV,
+                                                                    path=self.path, cache_dir=self.cache_dir)
+        self.assertEqual(html, self.render(cached_report_info))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_to_html_with_tracing(self):
+        tracer = start_tracing('qc')
+        report_info = ReportInfo.create_from_data_frame_info(format_config.DATA_SOURCE_TYPE.CSV, path=self.path,
+                                                             cache_dir=None)
+        html_path = report_info.to_html(report_folder=self.tmp_dir.name, write_profile=False)
+        trace_path = finish_tracing(html_path, 5)
+        self.assertEqual(trace_path, html_path[:-len('.html')] + TRACE_FILE_SUFFIX)
+        self.assertTrue(os.path.exists(trace_path))
+        spans = {(span.name, span.attrs.get('col')): span for span in tracer.spans}
+        self.assertEqual(spans[('load', None)].attrs['rows'], 3)
+        for col_name in ['numeric', 'str']:
+            column = spans[('column', col_name)]
+            self.assertEqual(tracer.spans[tracer.spans[column.parent].parent].name, 'profile')
+        self.assertIn(('render', None), spans)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,116 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for profile_artifact
+import datetime
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data_quality_reporter import DataFrameInfo, ReportInfo
+from profile_artifact import (PROFILE_ARTIFACT_SUFFIX, SPLIT_REPORT_FILES_SUFFIX, ProfileArtifactException,
+                              iter_report_fragments, read_profile_artifact, write_profile_artifact)
+
+
+class TestProfileArtifact(unittest.TestCase):
+    def setUp(self):
+        test_orig_df = pd.DataFrame({'numeric': [1.5, np.nan, 2.5],
+                                     'str': ['a', None, 'a'],
+                                     'time': [datetime.datetime(2011, 1, i) for i in range(1, 4)]})
+        df_info = DataFrameInfo.create_df_comm_op(orig_df=test_orig_df, path='test', cols_forced_to_str=[],
+                                                  fill_nan_with_blank=True, head_line_num=20)
+        self.report_info = ReportInfo(df_info)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_to_profile_artifact(self):
+        profile = self.report_info.to_profile_artifact()
+        self.assertIsNone(self.report_info.df_info.df)
+        self.assertEqual([col['name'] for col in profile['cols']], ['numeric', 'str', 'time'])
+        self.assertEqual(profile['cols'][1]['freq_table'][0], ['a', 2, 2 / 3, 2, 2 / 3])
+        self.assertIsNone(profile['cols'][2]['freq_table'])
+        self.assertEqual(profile['head_rows'][1], [1, ['', '', datetime.datetime(2011, 1, 2)]])
+
+        path = os.path.join(self.tmp_dir.name, 'test' + PROFILE_ARTIFACT_SUFFIX)
+        write_profile_artifact(profile, path)
+        saved_profile = read_profile_artifact(path)
+        self.assertEqual(saved_profile['cols'], profile['cols'])
+        self.assertEqual(saved_profile['head_rows'][1], [1, ['', '', '2011-01-02 00:00:00']])
+
+        profile['version'] = 0
+        write_profile_artifact(profile, path)
+        with self.assertRaises(ProfileArtifactException):
+            read_profile_artifact(path)
+
+    def test_render_without_pandas(self):
+        self.report_info.process_time = 'now'
+        self.report_info.to_html(report_folder=self.tmp_dir.name)
+        report_path = os.path.join(self.tmp_dir.name, 'dataQualityReport_test_now.html')
+        with open(report_path, encoding='utf-8') as f:
+            html = f.read()
+        os.remove(report_path)
+
+        # 只用profile重新渲染, 渲染进程不导入pandas
+        qc_dir = os.path.dirname(os.path.abspath(__file__))
+        code = ('import sys, runpy; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name="__main__"); '
+                'assert "pandas" not in sys.modules')
+        subprocess.run([sys.executable, '-c', code, os.path.join(qc_dir, 'profile_artifact.py'),
+                        report_path[:-len('.html')] + PROFILE_ARTIFACT_SUFFIX], check=True, cwd=self.tmp_dir.name)
+        with open(report_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), html)
+
+    def test_iter_report_fragments(self):
+        profile = self.report_info.to_profile_artifact()
+        fragments = list(iter_report_fragments(profile))
+        # 每个变量一行变量列表, 有频数统计的变量各一张频数表和一个导航项, 字符/数值变量各一行综合统计, 每行样本一个片段
+        self.assertEqual(len(fragments), 9 + 3 + 2 * 2 + len(profile['str_cols_desc']) +
+                         len(profile['numeric_cols_desc']) + len(profile['head_rows']))
+        html = ''.join(fragments)
+        self.assertEqual(html.count('<table'), html.count('</table>'))
+        self.assertEqual(html.count('<tbody>'), html.count('</tbody>'))
+
+        # 片段的大小与变量的个数无关
+        wide_df = pd.DataFrame({f'col{i:03d}': np.arange(50) % (i + 2) for i in range(200)})
+        wide_profile = ReportInfo(DataFrameInfo.create_df_comm_op(
+            orig_df=wide_df, path='wide', cols_forced_to_str=[], fill_nan_with_blank=True,
+            head_line_num=0)).to_profile_artifact()
+        wide_fragments = list(iter_report_fragments(wide_profile))
+        self.assertEqual(len(wide_fragments), 9 + 200 * 4)
+        self.assertLess(max(len(fragment) for fragment in wide_fragments), 5 * max(len(fragment)
+                                                                                   for fragment in fragments))
+
+    def test_render_split_report(self):
+        self.report_info.process_time = 'now 12:00'
+        report_path = self.report_info.to_html(report_folder=self.tmp_dir.name, write_profile=False, split=True)
+        files_dir = report_path[:-len('.html')] + SPLIT_REPORT_FILES_SUFFIX
+        with open(report_path, encoding='utf-8') as f:
+            index_html = f.read()
+        # 频数统计表不在报告页面中, 只有展开时加载的占位
+        self.assertNotIn('频数统计</th>', index_html)
+        self.assertEqual(index_html.count('<details'), 2)
+        self.assertIn('data-src="./dataQualityReport_test_now%2012%3A00_files/var_0.js"', index_html)
+        self.assertIn('href="#var_1"', index_html)
+
+        fragment_paths = sorted(glob.glob(os.path.join(files_dir, '*.js')))
+        self.assertEqual([os.path.basename(path) for path in fragment_paths], ['var_0.js', 'var_1.js'])
+        with open(fragment_paths[1], encoding='utf-8') as f:
+            script = f.read()
+        prefix = 'qcFragmentLoaded("var_1", '
+        self.assertTrue(script.startswith(prefix))
+        fragment_html = json.loads(script[len(prefix):-len(');\n')])
+        self.assertIn('<th class="r b Header" scope="col">str</th>', fragment_html)
+        # 与不拆分的报告中的频数统计表相同
+        self.assertIn(fragment_html, ''.join(iter_report_fragments(self.report_info.to_profile_artifact())))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# coding:utf-8
+# !/usr/bin/python3
+#
+# unittest for sketches
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from column_profile import ColumnAccumulator
+from data_quality_reporter import DataFrameInfo
+from sketches import (ApproxColumnAccumulator, FrequentItemsSketch, HyperLogLog, KLLSketch, bound_accumulator,
+                      frequent_items_error, hll_relative_error, kll_rank_error, merge_accumulators)
+
+QUANTILES = [0, 0.1, 0.25, 0.5, 0.75, 0.9, 1]
+
+
+class TestKLLSketch(unittest.TestCase):
+    def assert_rank_error(self, sketch, values):
+        values = np.sort(values)
+        for q, value in zip(QUANTILES, sketch.get_quantiles(QUANTILES)):
+            rank = np.searchsorted(values, value, side='right') / len(values)
+            self.assertLessEqual(abs(rank - q), kll_rank_error(sketch.k) + 1 / len(values))
+
+    def test_get_quantiles(self):
+        values = np.random.RandomState(0).exponential(size=200000)
+        sketch = KLLSketch(k=200, seed=0)
+        for chunk in np.array_split(values, 7):
+            sketch.update(chunk)
+        self.assertEqual(sketch.n, len(values))
+        self.assertLess(sum(len(items) for items in sketch.levels), 1000)
+        self.assert_rank_error(sketch, values)
+        self.assertEqual(sketch.get_quantiles([0, 1]).tolist(), [values.min(), values.max()])
+
+    def test_merge(self):
+        values = np.random.RandomState(1).normal(size=100000)
+        sketches = []
+        for seed, chunk in enumerate(np.array_split(values, 5)):
+            sketch = KLLSketch(k=200, seed=seed)
+            sketch.update(chunk)
+            sketches.append(sketch)
+        for sketch in sketches[1:]:
+            sketches[0].merge(sketch)
+        self.assert_rank_error(sketches[0], values)
+
+    def test_update_value_counts(self):
+        values = pd.Series(np.random.RandomState(3).normal(size=100000).round(3))
+        sketch = KLLSketch(k=200, seed=0)
+        for chunk in np.array_split(values, 4):
+            sketch.update_value_counts(chunk.value_counts())
+        self.assertEqual(sketch.n, len(values))
+        self.assertLess(sum(len(items) for items in sketch.levels), 1000)
+        self.assert_rank_error(sketch, values.values)
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_get_distinct_num(self):
+        for distinct_num in [10, 1000, 200000]:
+            values = np.array([f'浙A{i:07d}' for i in range(distinct_num)], dtype=object)
+            sketch = HyperLogLog(precision=14)
+            sketch.update(values)
+            sketch.update(values[:distinct_num // 2])
+            self.assertLessEqual(abs(sketch.get_distinct_num() / distinct_num - 1), 4 * hll_relative_error(14))
+
+    def test_merge(self):
+        left, right = HyperLogLog(precision=12), HyperLogLog(precision=12)
+        left.update(np.arange(50000))
+        right.update(np.arange(25000, 75000))
+        left.merge(right)
+        self.assertLessEqual(abs(left.get_distinct_num() / 75000 - 1), 4 * hll_relative_error(12))
+
+    def test_update_mixed_dtypes(self):
+        # 分块读取时同一列在没有空值的块中为整数, 在有空值的块中为浮点数, 相同的数只计一次
+        acc = ApproxColumnAccumulator('a', hll_precision=12)
+        acc.update(pd.Series(np.arange(20000)))
+        acc.update(pd.Series(np.append(np.arange(10000, 30000), np.nan)))
+        acc.update(pd.Series(np.arange(30000, 40000, dtype=np.int32)))
+        self.assertLessEqual(abs(acc.get_distinct_num() / 40000 - 1), 4 * hll_relative_error(12))
+        acc.update(pd.Series(np.arange(40000) + 0.5))
+        self.assertLessEqual(abs(acc.get_distinct_num() / 80000 - 1), 4 * hll_relative_error(12))
+
+
+class TestFrequentItemsSketch(unittest.TestCase):
+    def test_update(self):
+        values = pd.Series(np.random.RandomState(2).zipf(1.5, 100000))
+        sketch = FrequentItemsSketch(top_k=50)
+        for chunk in np.array_split(values, 10):
+            sketch.update(chunk.value_counts())
+        value_counts = values.value_counts()
+        self.assertLessEqual(len(sketch.counts), 50)
+        self.assertLessEqual(sketch.error, frequent_items_error(50) * len(values))
+        for value, count in sketch.counts.items():
+            self.assertLessEqual(count, value_counts[value])
+            self.assertGreaterEqual(count, value_counts[value] - sketch.error)
+        # 频数超过误差上限的取值都被保留
+        self.assertTrue(set(value_counts[value_counts > sketch.error].index) <= set(sketch.counts.index))
+
+
+class TestApproxDataFrameInfo(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        records_num = 5000
+        s_float = pd.Series(rng.normal(size=records_num).round(2))
+        s_float[rng.rand(records_num) < 0.1] = np.nan
+        self.test_orig_df = pd.DataFrame({'float': s_float,
+                                          'str': rng.choice(['a', 'b', 'c', None], records_num),
+                                          'id': [f'id{i}' for i in range(records_num)]})
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'test.csv')
+        self.test_orig_df.to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_create_df_info_from_csv_chunks(self):
+        df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=self.path, chunk_size=700, approximate=True)
+        exact_df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=self.path, chunk_size=700)
+        self.assertEqual([section_name for section_name, _ in df_info.approximate_sections],
+                         ['频数统计', '数值变量分位数', '字符变量去重数'])
+        self.assertEqual(exact_df_info.approximate_sections, [])
+
+        str_cols_desc = dict(df_info.str_cols_desc)
+        self.assertEqual(str_cols_desc['str']['# DISTINCT'], 3)
+        self.assertAlmostEqual(str_cols_desc['id']['# DISTINCT'] / 5000, 1, delta=4 * hll_relative_error(14))
+
+        numeric_desc = dict(df_info.numeric_cols_desc)['float']
+        exact_numeric_desc = dict(exact_df_info.numeric_cols_desc)['float']
+        for key in ['count', 'mean', 'std', 'min', 'max', '# MISSING', '100%']:
+            self.assertAlmostEqual(numeric_desc[key], exact_numeric_desc[key])
+        self.assertAlmostEqual(numeric_desc['50%'], exact_numeric_desc['50%'], delta=0.1)
+
+        self.assertEqual(list(df_info.cols['str'].df_desc), list(exact_df_info.cols['str'].df_desc))
+        self.assertLessEqual(len(list(df_info.cols['id'].df_desc)), 1000)
+
+    def test_exact_limit(self):
+        df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=self.path, chunk_size=700, exact_limit=1000)
+        exact_df_info = DataFrameInfo.create_df_info_from_csv_chunks(path=self.path, chunk_size=700, exact_limit=None)
+        # 只有取值个数超过上限的id使用近似统计
+        self.assertEqual([section_name for section_name, _ in df_info.approximate_sections],
+                         ['频数统计(id)', '数值变量分位数(id)', '字符变量去重数(id)'])
+        self.assertEqual(dict(df_info.numeric_cols_desc), dict(exact_df_info.numeric_cols_desc))
+        self.assertEqual(list(df_info.cols['str'].df_desc), list(exact_df_info.cols['str'].df_desc))
+        str_cols_desc = dict(df_info.str_cols_desc)
+        self.assertEqual(str_cols_desc['str']['# DISTINCT'], 3)
+        self.assertAlmostEqual(str_cols_desc['id']['# DISTINCT'] / 5000, 1, delta=4 * hll_relative_error(14))
+
+    def test_merge_accumulators(self):
+        series = pd.Series(np.arange(3000) % 700, dtype=np.float64)
+        acc = bound_accumulator(ColumnAccumulator.create_from_series(series[:1000]), exact_limit=800)
+        self.assertNotIsInstance(acc, ApproxColumnAccumulator)
+        approx_acc = ApproxColumnAccumulator('a')
+        approx_acc.update(series[1000:2000])
+        acc = merge_accumulators(acc, approx_acc, exact_limit=800)
+        self.assertIsInstance(acc, ApproxColumnAccumulator)
+        acc = merge_accumulators(acc, ColumnAccumulator.create_from_series(series[2000:]), exact_limit=800)
+        self.assertEqual(acc.records_num, 3000)
+        self.assertEqual(acc.quantile_sketch.n, 3000)
+        self.assertAlmostEqual(acc.get_numeric_desc()['mean'], series.mean())
+        self.assertAlmostEqual(acc.get_distinct_num() / 700, 1, delta=4 * hll_relative_error(14))
+
+
+if __name__ == '__main__':
+    unittest.main()
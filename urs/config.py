@@ -20,6 +20,9 @@ class DSType(Enum):
     PKL = 'pkl'
     EXCEL = 'xlsx'
     CSV = 'csv'
+    # 列式存储格式, 可以用common/convert_to_columnar.py从csv/excel转换
+    PARQUET = 'parquet'
+    FEATHER = 'feather'
 
 
 REPORT_PREFIX = 'urs报告'
@@ -32,9 +35,46 @@ DS_FOLDER = './data_sources'
 # 解析csv或者excel时备选的编码方式
 DS_ENCODINGS = ('utf-8', 'gbk')
 
+# 并行计算urs表的进程数, 1表示串行计算(并行模式需要系统支持fork)
+URS_WORKERS = 1
+
+# urs表的缓存目录, 数据集和变量相关的配置都没有变化时直接使用缓存的urs表, 为None时不使用缓存
+# 示例：PROFILE_CACHE_DIR = './profile_cache', 可以与qc/format_config.py中的PROFILE_CACHE_DIR相同
+PROFILE_CACHE_DIR = None
+
+# 缓存目录的大小上限(字节), 超过时删除最久没有使用的缓存
+PROFILE_CACHE_MAX_SIZE = 1024 ** 3
+
+# 读入数据集后是否压缩各列的类型(取值较少的字符串列转为category, 数值列无损降为更小的类型), 可以处理更大的数据集
+OPTIMIZE_DTYPES = False
+
+# 是否记录各阶段(读取、每个变量的分箱和统计、写excel等)的耗时、记录数和内存峰值, 开启后在报告旁边写入同名的.trace.json文件,
+# 并在结束时打印耗时最长的TRACE_SLOWEST_N个阶段
+TRACE_ENABLED = False
+TRACE_SLOWEST_N = 10
+
+# 生成excel的同时把所有urs表导出为一张长表(每行是一个变量的一个分箱), 与excel同名, 可选DSType.CSV或DSType.PARQUET,
+# 为None时不导出
+URS_EXPORT_TYPE = None
+
+# urs统计使用的SQLite文件, 设置后数据集分块导入到该文件中(只导入一次, 数据集或读取配置变化时重新导入)并对自变量建立索引,
+# 每个变量的urs表由一条分组查询统计, 内存占用与数据集大小无关, 适用于超过内存大小的数据集; 为None时读入内存统计
+URS_SQLITE_PATH = None
+
+# 导入SQLite时每次读取的csv记录数(其他格式的文件或分区每次读取一个)
+URS_SQLITE_CHUNK_SIZE = 500000
+
+# 增量模式下保存各分箱统计量的文件, 为None时每次统计整个数据集
+# 设置后每次运行只统计DS_FILE_PATH(新追加的分区, 如最新一个月的数据, 分区目录中则是还没有合并过的文件)并合并到该文件中,
+# 报告由合并后的统计量生成;
+# 第一次运行的数据集确定数值变量的分箱边界, 配置或自变量变化后需要删除该文件重新统计
+URS_STATE_PATH = None
+
 ###################### 通用配置（需要根据数据集以及输出的变量进行修改） ######################
 DS_FILE_NAME = './全变量(2014-2017数据集)_2018_06_11_15_20.csv'
 
+# 也可以是目录或者通配符(如path.join(DS_FOLDER, '2014-2017', '*.csv')), 此时每个文件是一个格式为DS_TYPE的分区,
+# 各分区分别统计(URS_WORKERS大于1时并行)后合并, 不会拼接成一个DataFrame
 DS_FILE_PATH = path.join(DS_FOLDER, DS_FILE_NAME)
 
 DS_TYPE = DSType.CSV
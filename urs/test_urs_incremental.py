@@ -0,0 +1,124 @@
+#
+# unittest for urs_incremental
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from config import DSType
+from test_urs_reporter import TARGET_VARS, TARGET_VARS_CALC_CONFIG, create_test_df
+from urs_incremental import URSIncrementalState, URSStateException
+from urs_reporter import ReportGenerator
+
+VAR_GROUPS = {'从车因素': ['veh_age', '车辆类别'], '保单因素': ['保单年']}
+
+
+class TestURSIncrementalState(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp_dir.name, 'state', 'urs_state.pkl')
+        self.df = create_test_df(records_num=3000)
+        # 历史数据和新追加的一个月, 新的月份中有超出历史范围的值和新的枚举值
+        self.history_df = self.df.iloc[:2000]
+        self.month_df = self.df.iloc[2000:].copy()
+        self.month_df.loc[self.month_df.index[:10], 'veh_age'] = 100.0
+        self.month_df['保单年'] = 2018
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_report_generator(self, df, file_name, var_groups=VAR_GROUPS):
+        path = os.path.join(self.tmp_dir.name, file_name)
+        df.to_pickle(path)
+        return ReportGenerator(df=df, path=path, numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                               target_vars_in_chart=['capped_lr_rel'], target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                               numeric_var_quantile=10, enum_var_max_lines=20, var_groups=var_groups,
+                               report_prefix='test', report_folder=self.tmp_dir.name)
+
+    def merge(self, report_generator):
+        state = URSIncrementalState.load_state(self.state_path, report_generator)
+        merged = state.merge_partition(report_generator, df=report_generator.df, path=report_generator.path)
+        state.save_state(self.state_path)
+        return merged, dict(state.iter_urs_dfs(report_generator))
+
+    def test_first_partition(self):
+        report_generator = self.create_report_generator(self.history_df, 'history.pkl')
+        _, urs_dfs = self.merge(report_generator)
+        for var_name in report_generator.get_var_names():
+            expected_df = report_generator.create_calculator(var_name).generate_urs_df()
+            if var_name == 'veh_age':
+                # 最外侧的两个分箱扩展到无穷
+                self.assertEqual(urs_dfs[var_name].index[0].left, -np.inf)
+                self.assertEqual(urs_dfs[var_name].index[-2].right, np.inf)
+                np.testing.assert_array_equal(urs_dfs[var_name].values, expected_df.values)
+            else:
+                pd.testing.assert_frame_equal(urs_dfs[var_name], expected_df)
+
+    def test_merge_partition(self):
+        self.merge(self.create_report_generator(self.history_df, 'history.pkl'))
+        report_generator = self.create_report_generator(self.month_df, 'month.pkl')
+        merged, urs_dfs = self.merge(report_generator)
+        self.assertTrue(merged)
+
+        # 枚举变量与整个数据集一次统计的结果一致
+        full_report_generator = self.create_report_generator(pd.concat([self.history_df, self.month_df]), 'full.pkl')
+        for var_name in ['车辆类别', '保单年']:
+            expected_df = full_report_generator.create_calculator(var_name).generate_urs_df()
+            pd.testing.assert_frame_equal(urs_dfs[var_name], expected_df)
+        # 数值变量沿用历史数据的分箱边界, 超出范围的值落入最外侧的分箱
+        self.assertEqual(urs_dfs['veh_age']['车牌号'].sum(), len(self.df))
+        self.assertEqual(len(urs_dfs['veh_age']), 11)
+
+        # 同一个分区不重复合并
+        merged, urs_dfs_again = self.merge(report_generator)
+        self.assertFalse(merged)
+        for var_name, urs_df in urs_dfs.items():
+            pd.testing.assert_frame_equal(urs_dfs_again[var_name], urs_df)
+
+    def test_config_changed(self):
+        self.merge(self.create_report_generator(self.history_df, 'history.pkl'))
+        report_generator = self.create_report_generator(self.month_df, 'month.pkl',
+                                                        var_groups={'从车因素': ['veh_age', '被保人性别']})
+        with self.assertRaises(URSStateException):
+            self.merge(report_generator)
+        report_generator.var_groups = VAR_GROUPS
+        report_generator.numeric_var_quantile = 5
+        with self.assertRaises(URSStateException):
+            self.merge(report_generator)
+
+    def test_to_excel_incremental(self):
+        self.create_report_generator(self.history_df, 'history.pkl').to_excel_incremental(self.state_path)
+        self.create_report_generator(self.month_df, 'month.pkl').to_excel_incremental(self.state_path)
+        self.assertEqual(len([file_name for file_name in os.listdir(self.tmp_dir.name)
+                              if file_name.endswith('.xlsx')]), 2)
+
+    def test_to_excel_incremental_from_partitions(self):
+        partition_dir = os.path.join(self.tmp_dir.name, 'partitions')
+        os.makedirs(partition_dir)
+        self.history_df.to_pickle(os.path.join(partition_dir, '2014-2017.pkl'))
+        kwargs = dict(path=partition_dir, numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                      target_vars_calc_config=TARGET_VARS_CALC_CONFIG, target_vars_in_chart=['capped_lr_rel'],
+                      var_groups=VAR_GROUPS, report_folder=self.tmp_dir.name, cache_dir=None)
+        ReportGenerator.create_generator_from_partitions(DSType.PKL, **kwargs).to_excel_incremental(self.state_path)
+        # 新的月份加入目录后只读取和合并新的分区
+        self.month_df.to_pickle(os.path.join(partition_dir, '2018-01.pkl'))
+        report_generator = ReportGenerator.create_generator_from_partitions(DSType.PKL, **kwargs)
+        read_paths = []
+        read_partition = report_generator.read_partition
+
+        def read_partition_and_record(data_source_type, path, *args, **kwargs):
+            read_paths.append(path)
+            return read_partition(data_source_type, path, *args, **kwargs)
+
+        report_generator.read_partition = read_partition_and_record
+        urs_dfs = []
+        report_generator.write_excel = lambda results: urs_dfs.extend(results)
+        report_generator.to_excel_incremental(self.state_path)
+        self.assertEqual(read_paths, [os.path.join(partition_dir, '2018-01.pkl')])
+        self.assertEqual(dict(urs_dfs)['保单年']['车牌号'].sum(), len(self.df))
+
+
+if __name__ == '__main__':
+    unittest.main()
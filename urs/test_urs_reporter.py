@@ -0,0 +1,309 @@
+#
+# unittest for urs_reporter
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from config import DSType, TargetVarsCalcWay
+from urs_reporter import ReportGenerator, URSDfCalculator, URSException
+# urs_reporter把项目根目录加入了sys.path
+from common.tracer import finish_tracing, start_tracing
+
+TARGET_VARS = ['车牌号', '标准保费', '已报赔款', 'cap车均赔款', 'capped_lr', 'capped_lr_rel']
+
+TARGET_VARS_CALC_CONFIG = {
+    '车牌号': {'orig_cols': '车牌号', 'calc_way': TargetVarsCalcWay.COUNT},
+    '标准保费': {'orig_cols': '标准保费', 'calc_way': TargetVarsCalcWay.SUM},
+    '已报赔款': {'orig_cols': '已报赔款', 'calc_way': TargetVarsCalcWay.SUM},
+    'cap车均赔款': {'orig_cols': '已报赔款', 'calc_way': TargetVarsCalcWay.AVERAGE},
+    'capped_lr': {'orig_cols': ('已报赔款', '标准保费'), 'calc_way': TargetVarsCalcWay.RATIO},
+    'capped_lr_rel': {'orig_cols': ('已报赔款', '标准保费'), 'calc_way': TargetVarsCalcWay.RATIO_REL}}
+
+
+def create_test_df(records_num=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    veh_age = rng.gamma(2, 3, records_num).round(3)
+    veh_age[rng.rand(records_num) < 0.05] = np.nan
+    veh_type = rng.choice(['客车', '货车', '挂车', '特种车'], records_num).astype(object)
+    veh_type[rng.rand(records_num) < 0.05] = np.nan
+    claims = rng.exponential(1000, records_num)
+    claims[rng.rand(records_num) < 0.3] = np.nan
+    return pd.DataFrame({'veh_age': veh_age,
+                         '车辆类别': veh_type,
+                         '保单年': rng.choice([2014, 2015, 2016, 2017], records_num),
+                         '车牌号': [f'浙A{i:05d}' for i in range(records_num)],
+                         '标准保费': rng.uniform(500, 5000, records_num).round(2),
+                         '已报赔款': claims})
+
+
+def legacy_urs_df(df, var_name, numeric_var_quantile, enum_var_max_lines, is_enum):
+    """逐个分箱、逐个目标变量做掩码计算的原始实现, 作为单次分组统计结果的对照"""
+
+    def calc(chosen_cond, calc_config):
+        calc_way = calc_config.get('calc_way')
+        orig_col = calc_config.get('orig_cols')
+        if calc_way in (TargetVarsCalcWay.RATIO, TargetVarsCalcWay.RATIO_REL):
+            return df[orig_col[0]][chosen_cond].sum() / df[orig_col[1]][chosen_cond].sum()
+        return df[orig_col][chosen_cond].apply(calc_way.value)
+
+    if is_enum:
+        urs_index = df[var_name].sort_values(ascending=True).unique()[:enum_var_max_lines]
+    else:
+        df = df.sort_values(var_name, ascending=True)
+        urs_index = pd.qcut(df[var_name], numeric_var_quantile, duplicates='drop').unique()
+    urs_df = pd.DataFrame(index=range(len(urs_index)), columns=TARGET_VARS, dtype=float)
+    for row_cnt, ind in enumerate(urs_index):
+        if pd.isnull(ind):
+            chosen_cond = df[var_name].isnull()
+        elif is_enum:
+            chosen_cond = df[var_name] == ind
+        else:
+            chosen_cond = (df[var_name] > ind.left) & (df[var_name] <= ind.right)
+        for target_var, calc_config in TARGET_VARS_CALC_CONFIG.items():
+            urs_df.loc[row_cnt, target_var] = calc(chosen_cond, calc_config)
+    urs_df['capped_lr_rel'] = urs_df['capped_lr_rel'] / urs_df['capped_lr_rel'].mean() - 1
+    urs_df.index = urs_index
+    if is_enum:
+        urs_df.sort_values('capped_lr_rel', ascending=True, inplace=True)
+    return urs_df
+
+
+class TestURSDfCalculator(unittest.TestCase):
+    def setUp(self):
+        self.df = create_test_df()
+
+    def create_calculator(self, var_name, enum_var_max_lines=20):
+        return URSDfCalculator(df=self.df, target_vars=TARGET_VARS, target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                               var_name=var_name, numeric_var_quantile=10, enum_var_max_lines=enum_var_max_lines,
+                               numeric_vars_as_enum=['保单年'])
+
+    def assert_urs_df_equal(self, urs_df, expected_df):
+        self.assertEqual([str(ind) for ind in urs_df.index], [str(ind) for ind in expected_df.index])
+        self.assertEqual(urs_df.columns.tolist(), expected_df.columns.tolist())
+        np.testing.assert_allclose(urs_df.values.astype(float), expected_df.values.astype(float), rtol=1e-10)
+
+    def test_generate_numeric_urs_df(self):
+        urs_df = self.create_calculator('veh_age').generate_urs_df()
+        expected_df = legacy_urs_df(self.df, 'veh_age', numeric_var_quantile=10, enum_var_max_lines=20,
+                                    is_enum=False)
+        self.assertEqual(urs_df.shape[0], 11)
+        self.assert_urs_df_equal(urs_df, expected_df)
+
+    def test_generate_enum_urs_df(self):
+        for var_name in ['车辆类别', '保单年']:
+            urs_df = self.create_calculator(var_name).generate_urs_df()
+            expected_df = legacy_urs_df(self.df, var_name, numeric_var_quantile=10, enum_var_max_lines=20,
+                                        is_enum=True)
+            self.assert_urs_df_equal(urs_df, expected_df)
+
+    def test_generate_enum_urs_df_max_lines(self):
+        urs_df = self.create_calculator('车辆类别', enum_var_max_lines=2).generate_urs_df()
+        expected_df = legacy_urs_df(self.df, '车辆类别', numeric_var_quantile=10, enum_var_max_lines=2,
+                                    is_enum=True)
+        self.assertEqual(urs_df.shape[0], 2)
+        self.assert_urs_df_equal(urs_df, expected_df)
+
+
+class TestReportGenerator(unittest.TestCase):
+    def setUp(self):
+        self.df = create_test_df()
+        self.report_generator = ReportGenerator(df=self.df, path='test.csv', numeric_vars_as_enum=['保单年'],
+                                                target_vars=TARGET_VARS, target_vars_in_chart=['capped_lr_rel'],
+                                                target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                                                numeric_var_quantile=10, enum_var_max_lines=20,
+                                                var_groups={'从车因素': ['veh_age', '车辆类别'],
+                                                            '保单因素': ['保单年', 'veh_age']},
+                                                report_prefix='test', report_folder='.')
+
+    def test_bin_variables(self):
+        var_bins = self.report_generator.bin_variables()
+        self.assertEqual(sorted(var_bins.keys()), sorted(['veh_age', '车辆类别', '保单年']))
+        self.assertEqual(var_bins['veh_age'].codes.dtype, np.int8)
+        self.assertFalse(var_bins['veh_age'].is_enum)
+        self.assertTrue(var_bins['保单年'].is_enum)
+
+        for var_name, bins in var_bins.items():
+            calculator_kwargs = dict(df=self.df, target_vars=TARGET_VARS,
+                                     target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_name=var_name,
+                                     numeric_var_quantile=10, enum_var_max_lines=20, numeric_vars_as_enum=['保单年'])
+            urs_df = URSDfCalculator(var_bins=bins, **calculator_kwargs).generate_urs_df()
+            expected_df = URSDfCalculator(**calculator_kwargs).generate_urs_df()
+            pd.testing.assert_frame_equal(urs_df, expected_df)
+
+    def test_to_excel_parallel(self):
+        urs_dfs = []
+        self.report_generator.write_excel = lambda results: urs_dfs.extend(results)
+        self.report_generator.workers = 1
+        self.report_generator.to_excel()
+        serial_urs_dfs = list(urs_dfs)
+        urs_dfs.clear()
+        self.report_generator.workers = 2
+        self.report_generator.to_excel()
+        self.assertEqual([var_name for var_name, _ in urs_dfs], ['veh_age', '车辆类别', '保单年'])
+        for (_, urs_df), (_, expected_df) in zip(urs_dfs, serial_urs_dfs):
+            pd.testing.assert_frame_equal(urs_df, expected_df)
+
+    def test_create_generator_from_ascii(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.csv')
+            self.df.assign(unused=1).to_csv(path, index=False)
+            kwargs = dict(read_func=pd.read_csv, path=path, target_vars=TARGET_VARS,
+                          target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_groups=self.report_generator.var_groups)
+            report_generator = ReportGenerator.create_generator_from_ascii(**kwargs)
+            self.assertEqual(sorted(report_generator.df.columns), sorted(self.df.columns))
+
+            kwargs['var_groups'] = {'从车因素': ['veh_age', 'not_exist']}
+            with self.assertRaises(URSException):
+                ReportGenerator.create_generator_from_ascii(**kwargs)
+
+    def test_to_excel_with_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.csv')
+            self.df.to_csv(path, index=False)
+            report_generator = ReportGenerator.create_generator_from_ascii(
+                read_func=pd.read_csv, path=path, numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_groups=self.report_generator.var_groups,
+                cache_dir=os.path.join(tmp_dir, 'cache'))
+            urs_dfs = []
+            report_generator.write_excel = lambda results: urs_dfs.extend(results)
+            report_generator.to_excel()
+            expected_urs_dfs = dict(urs_dfs)
+
+            # 缓存命中时不再分箱和计算
+            urs_dfs.clear()
+            report_generator.create_calculator = None
+            report_generator.to_excel()
+            self.assertEqual(sorted(dict(urs_dfs).keys()), sorted(expected_urs_dfs.keys()))
+            for var_name, urs_df in urs_dfs:
+                pd.testing.assert_frame_equal(urs_df, expected_urs_dfs[var_name])
+
+            # 配置变化后重新计算受影响的变量
+            del report_generator.create_calculator
+            report_generator.numeric_vars_as_enum = []
+            urs_dfs.clear()
+            report_generator.to_excel()
+            self.assertFalse(dict(urs_dfs)['保单年'].index.equals(expected_urs_dfs['保单年'].index))
+
+    def test_to_excel_from_partitions(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.csv')
+            self.df.to_csv(path, index=False)
+            partition_dir = os.path.join(tmp_dir, 'partitions')
+            os.makedirs(partition_dir)
+            for partition_idx, partition_df in enumerate(np.array_split(self.df, 3)):
+                partition_df.to_csv(os.path.join(partition_dir, f'{partition_idx}.csv'), index=False)
+            kwargs = dict(numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                          target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_groups=self.report_generator.var_groups,
+                          cache_dir=None)
+            report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_csv, path=path, **kwargs)
+            expected_urs_dfs = list(report_generator.calc_urs_dfs(report_generator.bin_variables()))
+
+            # 各分区分别统计后合并的结果与整个数据集一次统计的结果一致
+            for workers in (1, 2):
+                report_generator = ReportGenerator.create_generator_from_partitions(DSType.CSV, path=partition_dir,
+                                                                                    **kwargs)
+                report_generator.workers = workers
+                self.assertIsNone(report_generator.df)
+                self.assertEqual(report_generator.df_name, 'partitions')
+                urs_dfs = []
+                report_generator.write_excel = lambda results: urs_dfs.extend(results)
+                report_generator.to_excel()
+                self.assertEqual([var_name for var_name, _ in urs_dfs],
+                                 [var_name for var_name, _ in expected_urs_dfs])
+                for (_, urs_df), (_, expected_df) in zip(urs_dfs, expected_urs_dfs):
+                    pd.testing.assert_frame_equal(urs_df, expected_df)
+
+    def test_to_excel_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.csv')
+            self.df.to_csv(path, index=False)
+            partition_dir = os.path.join(tmp_dir, 'partitions')
+            os.makedirs(partition_dir)
+            for partition_idx, partition_df in enumerate(np.array_split(self.df, 2)):
+                partition_df.to_csv(os.path.join(partition_dir, f'{partition_idx}.csv'), index=False)
+            kwargs = dict(numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                          target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_groups=self.report_generator.var_groups,
+                          cache_dir=None)
+            report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_csv, path=path, **kwargs)
+            expected_urs_dfs = list(report_generator.calc_urs_dfs(report_generator.bin_variables()))
+
+            # 分块导入SQLite后由分组查询统计的结果与内存中统计的结果一致
+            for source_path in (path, partition_dir):
+                db_path = os.path.join(tmp_dir, 'sqlite', 'urs.db')
+                report_generator = ReportGenerator.create_generator_from_sqlite(DSType.CSV, path=source_path,
+                                                                                db_path=db_path, chunk_size=300,
+                                                                                **kwargs)
+                self.assertIsNone(report_generator.df)
+                urs_dfs = []
+                report_generator.write_excel = lambda results: urs_dfs.extend(results)
+                report_generator.to_excel()
+                self.assertEqual([var_name for var_name, _ in urs_dfs],
+                                 [var_name for var_name, _ in expected_urs_dfs])
+                for (_, urs_df), (_, expected_df) in zip(urs_dfs, expected_urs_dfs):
+                    pd.testing.assert_frame_equal(urs_df, expected_df)
+
+            # 数据集和配置都没有变化时不再导入
+            with mock.patch.object(ReportGenerator, 'read_chunks', side_effect=AssertionError):
+                report_generator = ReportGenerator.create_generator_from_sqlite(DSType.CSV, path=partition_dir,
+                                                                                db_path=db_path, **kwargs)
+            self.assertEqual(report_generator.sqlite_store.records_num, len(self.df))
+            with self.assertRaises(URSException):
+                ReportGenerator.create_generator_from_sqlite(DSType.CSV, path=path, db_path=db_path,
+                                                             **dict(kwargs, var_groups={'g': ['unknown']}))
+
+    def test_create_generator_with_optimized_dtypes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'test.csv')
+            self.df.to_csv(path, index=False)
+            kwargs = dict(read_func=pd.read_csv, path=path, numeric_vars_as_enum=['保单年'], target_vars=TARGET_VARS,
+                          target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_groups=self.report_generator.var_groups)
+            report_generator = ReportGenerator.create_generator_from_ascii(optimize=False, **kwargs)
+            optimized_report_generator = ReportGenerator.create_generator_from_ascii(optimize=True, **kwargs)
+            self.assertEqual(optimized_report_generator.df['车辆类别'].dtype, 'category')
+            self.assertEqual(optimized_report_generator.df['保单年'].dtype, np.int16)
+            # 压缩类型不改变urs表
+            expected_urs_dfs = report_generator.calc_urs_dfs(report_generator.bin_variables())
+            urs_dfs = optimized_report_generator.calc_urs_dfs(optimized_report_generator.bin_variables())
+            for (_, urs_df), (_, expected_df) in zip(urs_dfs, expected_urs_dfs):
+                pd.testing.assert_frame_equal(urs_df, expected_df)
+
+    def test_to_excel_with_tracing(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.report_generator.report_folder = tmp_dir
+            self.report_generator.cache_dir = None
+            tracer = start_tracing('urs')
+            self.report_generator.to_excel()
+            trace_path = finish_tracing(self.report_generator.get_excel_path(), 5)
+            self.assertEqual(sorted(os.listdir(tmp_dir)), sorted([os.path.basename(trace_path), os.path.basename(
+                self.report_generator.get_excel_path())]))
+        span_names = [(span.name, span.attrs.get('var')) for span in tracer.spans]
+        for var_name in ['veh_age', '车辆类别', '保单年']:
+            self.assertEqual(span_names.count(('bin', var_name)), 1)
+            self.assertEqual(span_names.count(('urs_df', var_name)), 1)
+        # veh_age出现在两个分组中, 写入两次
+        self.assertEqual(span_names.count(('write_var', 'veh_age')), 2)
+        self.assertIn(('save_excel', None), span_names)
+        self.assertIn(('wait_sheet_writer', None), span_names)
+
+    def test_write_excel(self):
+        with tempfile.TemporaryDirectory() as report_folder:
+            self.report_generator.report_folder = report_folder
+            self.report_generator.to_excel()
+            self.assertEqual(len(os.listdir(report_folder)), 1)
+
+            # 同时导出csv长表, 每个变量只导出一次
+            self.report_generator.export_type = DSType.CSV
+            self.report_generator.process_time = 'export'
+            self.report_generator.to_excel()
+            export_path = os.path.splitext(self.report_generator.get_excel_path())[0] + '.csv'
+            long_df = pd.read_csv(export_path, encoding='utf-8-sig')
+            self.assertEqual(list(dict.fromkeys(long_df['var_name'])), self.report_generator.get_var_names())
+            self.assertEqual(long_df.columns.tolist()[2:], self.report_generator.target_vars)
+
+
+if __name__ == '__main__':
+    unittest.main()
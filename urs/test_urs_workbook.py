@@ -0,0 +1,102 @@
+#
+# unittest for urs_workbook
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from config import DSType
+from urs_workbook import URSTableExporter, URSWorkbookException, URSWorkbookWriter
+
+_NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def read_sheet_cells(path, sheet_idx=1):
+    """:return: {单元格: 取值}, 同时支持共享字符串和内联字符串"""
+    with zipfile.ZipFile(path) as z:
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in z.namelist():
+            shared_strings = [si.findtext('m:t', namespaces=_NS)
+                              for si in ElementTree.fromstring(z.read('xl/sharedStrings.xml'))]
+        sheet = ElementTree.fromstring(z.read(f'xl/worksheets/sheet{sheet_idx}.xml'))
+    cells = {}
+    for c in sheet.iter('{%s}c' % _NS['m']):
+        if c.get('t') == 's':
+            cells[c.get('r')] = shared_strings[int(c.findtext('m:v', namespaces=_NS))]
+        elif c.get('t') == 'inlineStr':
+            cells[c.get('r')] = c.findtext('m:is/m:t', namespaces=_NS)
+        elif c.find('m:v', _NS) is not None:
+            cells[c.get('r')] = float(c.findtext('m:v', namespaces=_NS))
+    return cells
+
+
+class TestURSWorkbook(unittest.TestCase):
+    def setUp(self):
+        self.target_vars = ['count', 'lr']
+        index = pd.CategoricalIndex([pd.Interval(0, 1.5), pd.Interval(1.5, 3), np.nan])
+        self.numeric_urs_df = pd.DataFrame({'count': [3, 2, 1], 'lr': [0.5, np.inf, np.nan]}, index=index)
+        self.enum_urs_df = pd.DataFrame({'count': [4, 2], 'lr': [0.25, 1.0]}, index=pd.Index([2014, 2015]))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_same_cells_as_pandas(self):
+        path = os.path.join(self.tmp_dir.name, 'urs.xlsx')
+        writer = URSWorkbookWriter(path, target_vars=self.target_vars, target_vars_in_chart=['lr'])
+        writer.add_sheet('group')
+        writer.draw_var(self.numeric_urs_df.copy(), 'veh_age')
+        writer.draw_var(self.enum_urs_df.copy(), '保单年')
+        writer.close()
+
+        expected_path = os.path.join(self.tmp_dir.name, 'expected.xlsx')
+        with pd.ExcelWriter(expected_path, engine='xlsxwriter') as excel_writer:
+            for row, (var_name, urs_df) in zip([0, 17], [('veh_age', self.numeric_urs_df.copy()),
+                                                         ('保单年', self.enum_urs_df.copy())]):
+                urs_df.index.name = var_name
+                urs_df.to_excel(excel_writer, sheet_name='group', startrow=row, startcol=0)
+
+        cells = read_sheet_cells(path)
+        self.assertEqual(cells, read_sheet_cells(expected_path))
+        self.assertEqual((cells['A19'], cells['A2'], cells['C3']), (2014, '(0.0, 1.5]', 'inf'))
+        self.assertNotIn('C4', cells)
+        with zipfile.ZipFile(path) as z:
+            charts = sorted(name for name in z.namelist() if re.match(r'xl/charts/chart\d+\.xml', name))
+            self.assertEqual(len(charts), 2)
+            self.assertIn(b'group!$C$19:$C$21', z.read(charts[1]))
+
+    def test_invalid_chart_vars(self):
+        with self.assertRaises(URSWorkbookException):
+            URSWorkbookWriter(os.path.join(self.tmp_dir.name, 'urs.xlsx'), target_vars=self.target_vars,
+                              target_vars_in_chart=['not_exist'])
+
+    def test_export(self):
+        for export_type in [DSType.CSV, DSType.PARQUET]:
+            path = URSTableExporter.get_export_path(os.path.join(self.tmp_dir.name, 'urs.xlsx'), export_type)
+            exporter = URSTableExporter(path, export_type=export_type, target_vars=self.target_vars)
+            exporter.export_var(self.numeric_urs_df, 'veh_age')
+            exporter.export_var(self.enum_urs_df, '保单年')
+            # 出现在多个分组中的变量只导出一次
+            exporter.export_var(self.enum_urs_df, '保单年')
+            exporter.close()
+
+            if export_type == DSType.CSV:
+                long_df = pd.read_csv(path, encoding='utf-8-sig', dtype={'bin': str})
+            else:
+                long_df = pd.read_parquet(path)
+            self.assertEqual(long_df.columns.tolist(), ['var_name', 'bin', 'count', 'lr'])
+            self.assertEqual(long_df['var_name'].tolist(), ['veh_age'] * 3 + ['保单年'] * 2)
+            self.assertEqual(long_df['bin'].fillna('').tolist(), ['(0.0, 1.5]', '(1.5, 3.0]', '', '2014', '2015'])
+            np.testing.assert_array_equal(long_df['lr'], [0.5, np.inf, np.nan, 0.25, 1.0])
+
+        with self.assertRaises(URSWorkbookException):
+            URSTableExporter(path, export_type=DSType.EXCEL, target_vars=self.target_vars)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.quantiles import cal_weighted_quantiles
+from config import TargetVarsCalcWay
+
+
+def get_calc_cols(target_vars_calc_config):
+    """
+    根据目标变量的计算方式, 找出需要计数和需要求和的原始列
+
+    :return: (count_cols, sum_cols) 两个列表, 保持配置中的先后顺序
+    """
+    count_cols = []
+    sum_cols = []
+    for calc_config in target_vars_calc_config.values():
+        calc_way = calc_config.get('calc_way')
+        orig_cols = calc_config.get('orig_cols')
+        if calc_way in (TargetVarsCalcWay.RATIO, TargetVarsCalcWay.RATIO_REL):
+            needed = [(orig_cols[0], sum_cols), (orig_cols[1], sum_cols)]
+        elif calc_way == TargetVarsCalcWay.COUNT:
+            needed = [(orig_cols, count_cols)]
+        elif calc_way == TargetVarsCalcWay.SUM:
+            needed = [(orig_cols, sum_cols)]
+        else:
+            # 均值 = 求和 / 非空计数
+            needed = [(orig_cols, sum_cols), (orig_cols, count_cols)]
+        for col, cols in needed:
+            if col not in cols:
+                cols.append(col)
+    return count_cols, sum_cols
+
+
+def _compact_int_dtype(max_value):
+    """能容纳-1到max_value的最小整数类型"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class VarBins:
+    """
+    自变量的分箱结果: 分箱标签以及每一行所在分箱的编号
+
+    编号取值为0..len(labels)-1, 空值为len(labels), -1表示不属于任何分箱;
+    同一份报告中每个自变量只分箱一次, 所有sheet共用
+    """
+
+    def __init__(self, var_name, labels, codes, is_enum):
+        self.var_name = var_name
+        # 分箱标签(不含空值), 数值变量为区间, 枚举变量为升序排列的取值
+        self.labels = labels
+        # 每一行所在分箱的编号
+        self.codes = codes
+        self.is_enum = is_enum
+
+    @classmethod
+    def create_numeric_bins(cls, series, numeric_var_quantile):
+        labels = pd.qcut(series, numeric_var_quantile, duplicates='drop').cat.categories
+        return cls.create_numeric_bins_with_labels(series, labels)
+
+    @classmethod
+    def create_numeric_labels(cls, value_counts, numeric_var_quantile):
+        """
+        由各取值的记录数计算与pd.qcut相同的分箱区间, 分区数据集不需要拼接所有分区的原始数据
+
+        :param value_counts:  非空取值的记录数, 以取值为索引的Series
+        :return:  IntervalIndex
+        """
+        value_counts = value_counts.sort_index()
+        edges = cal_weighted_quantiles(value_counts.index.values.astype(np.float64), value_counts.values,
+                                       np.linspace(0, 1, numeric_var_quantile + 1))
+        # 与pd.qcut相同的方式去掉重复的边界并生成区间标签
+        return pd.cut(pd.Series([], dtype=np.float64), np.unique(edges), include_lowest=True,
+                      duplicates='drop').cat.categories
+
+    @classmethod
+    def create_numeric_bins_with_labels(cls, series, labels):
+        """按照给定的分箱区间分箱, 区间的两端可以是无穷, 不在任何区间中的值编号为-1"""
+        # 分箱边界使用区间标签上的值, 保证每个分箱包含的记录与其标签一致
+        edges = np.append(labels.left.values[:1], labels.right.values)
+        values = series.values
+        codes = (np.searchsorted(edges, values, side='left') - 1).astype(_compact_int_dtype(len(labels)))
+        codes[~((values > edges[0]) & (values <= edges[-1]))] = -1
+        codes[pd.isnull(values)] = len(labels)
+        return cls(var_name=series.name, labels=labels, codes=codes, is_enum=False)
+
+    @classmethod
+    def create_enum_bins_from_stats(cls, var_name, stats):
+        """由已经factorize过的列(common.column_stats.ColumnStats)分箱, 与create_enum_bins的结果相同"""
+        codes, labels = stats.sorted_factorize()
+        codes = codes.astype(_compact_int_dtype(len(labels)))
+        codes[codes == -1] = len(labels)
+        return cls(var_name=var_name, labels=labels, codes=codes, is_enum=True)
+
+    @classmethod
+    def create_enum_bins(cls, series):
+        codes, labels = pd.factorize(series, sort=True)
+        if isinstance(labels, pd.Categorical):
+            # category列按类别的顺序编号, 重新按取值升序编号, 与object列的结果一致
+            labels = pd.Index(np.asarray(labels))
+            order = labels.argsort()
+            ranks = np.empty(len(order) + 1, dtype=np.intp)
+            ranks[order] = np.arange(len(order))
+            ranks[-1] = -1
+            codes, labels = ranks[codes], labels[order]
+        codes = codes.astype(_compact_int_dtype(len(labels)))
+        codes[codes == -1] = len(labels)
+        return cls(var_name=series.name, labels=labels, codes=codes, is_enum=True)
+
+    def to_open_ended(self):
+        """
+        把数值变量第一个分箱的左端和最后一个分箱的右端扩展到无穷, 之后追加的数据超出原有范围时也能落入分箱
+
+        :return:  只有分箱标签的VarBins, codes为None
+        """
+        if self.is_enum:
+            return VarBins(var_name=self.var_name, labels=self.labels, codes=None, is_enum=True)
+        left = self.labels.left.values.astype(np.float64)
+        right = self.labels.right.values.astype(np.float64)
+        left[0], right[-1] = -np.inf, np.inf
+        labels = pd.IntervalIndex.from_arrays(left, right, closed=self.labels.closed)
+        return VarBins(var_name=self.var_name, labels=labels, codes=None, is_enum=False)
+
+    def create_urs_index(self, positions):
+        """根据需要展示的分箱下标生成urs表的索引, 空值分箱显示为NaN"""
+        index_values = [self.labels[pos] if pos != len(self.labels) else np.nan for pos in positions]
+        if self.is_enum:
+            return pd.Index(index_values, name=self.var_name)
+        return pd.CategoricalIndex(index_values, categories=self.labels, name=self.var_name)
+
+
+class URSAggregates:
+    """
+    每个分箱上原始列的行数、非空计数与求和
+
+    所有目标变量(COUNT/SUM/AVERAGE/RATIO/RATIO_REL)都可以由这几项推导出来, 且它们可以直接相加合并,
+    因此每个自变量只需要对数据做一次分组统计
+    """
+
+    def __init__(self, labels, rows, counts, sums):
+        # 分箱标签(不含空值), 数组的最后一行对应空值分箱
+        self.labels = labels
+        # 每个分箱的记录数, 长度为len(labels) + 1
+        self.rows = rows
+        # 每个分箱上原始列的非空计数, {orig_col: array}
+        self.counts = counts
+        # 每个分箱上原始列的求和(忽略空值), {orig_col: array}
+        self.sums = sums
+
+    @property
+    def null_pos(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_codes(cls, df, codes, labels, count_cols, sum_cols):
+        """
+        按分箱编号一次性统计所有需要的原始列
+
+        :param codes:  每一行所在的分箱编号, 取值为0..len(labels)-1, 空值分箱为len(labels), -1表示不参与统计
+        :param labels:  分箱标签
+        """
+        n_bins = len(labels) + 1
+        chosen = codes >= 0
+        chosen_codes = codes[chosen]
+        rows = np.bincount(chosen_codes, minlength=n_bins)
+        counts = {}
+        sums = {}
+        for col in set(count_cols) | set(sum_cols):
+            values = df[col].values[chosen]
+            notnull = ~pd.isnull(values)
+            notnull_codes = chosen_codes[notnull]
+            if col in count_cols:
+                counts[col] = np.bincount(notnull_codes, minlength=n_bins)
+            if col in sum_cols:
+                sums[col] = np.bincount(notnull_codes, weights=values[notnull].astype(np.float64), minlength=n_bins)
+        return cls(labels=labels, rows=rows, counts=counts, sums=sums)
+
+    def merge(self, other):
+        """
+        合并另一部分数据在同一个自变量上的统计结果, 分箱按标签对齐, 枚举变量新出现的取值会加入到分箱中
+
+        :return:  合并后的URSAggregates
+        """
+        if self.labels.equals(other.labels):
+            labels = self.labels
+        else:
+            labels = self.labels.union(other.labels)
+
+        def align(aggregates, values):
+            aligned = np.zeros(len(labels) + 1, dtype=values.dtype)
+            aligned[labels.get_indexer(aggregates.labels)] = values[:-1]
+            aligned[-1] = values[-1]
+            return aligned
+
+        def add(left, right):
+            return align(self, left) + align(other, right)
+
+        return URSAggregates(labels=labels, rows=add(self.rows, other.rows),
+                             counts={col: add(self.counts[col], other.counts[col]) for col in self.counts},
+                             sums={col: add(self.sums[col], other.sums[col]) for col in self.sums})
+
+    def to_urs_df(self, positions, index, target_vars, target_vars_calc_config):
+        """
+        由统计结果推导出urs表
+
+        :param positions:  需要展示的分箱在数组中的下标(按展示顺序)
+        :param index:  urs表的索引
+        """
+        urs_cols = {}
+        vars_rel_ratio = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for target_var, calc_config in target_vars_calc_config.items():
+                calc_way = calc_config.get('calc_way')
+                orig_cols = calc_config.get('orig_cols')
+                if calc_way in (TargetVarsCalcWay.RATIO, TargetVarsCalcWay.RATIO_REL):
+                    values = self.sums[orig_cols[0]][positions] / self.sums[orig_cols[1]][positions]
+                    if calc_way == TargetVarsCalcWay.RATIO_REL:
+                        vars_rel_ratio.append(target_var)
+                elif calc_way == TargetVarsCalcWay.COUNT:
+                    values = self.counts[orig_cols][positions]
+                elif calc_way == TargetVarsCalcWay.SUM:
+                    values = self.sums[orig_cols][positions]
+                else:
+                    values = self.sums[orig_cols][positions] / self.counts[orig_cols][positions]
+                urs_cols[target_var] = values
+        urs_df = pd.DataFrame(urs_cols, index=index, columns=target_vars)
+        # rel变量需要重新计算一次相对值
+        for var_rel in vars_rel_ratio:
+            urs_df[var_rel] = urs_df[var_rel] / urs_df[var_rel].mean() - 1
+        return urs_df
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profile_cache import fingerprint_file
+from urs_aggregator import URSAggregates, VarBins, get_calc_cols
+
+# 状态文件的格式版本, 保存的结构变化时加1
+URS_STATE_VERSION = 1
+
+
+class URSStateException(Exception):
+    pass
+
+
+class URSIncrementalState:
+    """
+    增量模式下保存的统计状态: 每个自变量的分箱、各分箱可以直接相加合并的统计量以及已经合并过的分区
+
+    第一个分区(一般是全量的历史数据)确定数值变量的分箱边界, 最外侧的两个分箱扩展到无穷, 之后追加的分区沿用这些边界;
+    枚举变量新出现的取值加入到分箱中. 每次只统计新的分区并合并, relative ratio在生成urs表时由合并后的统计量重新计算
+    """
+
+    def __init__(self, config, var_bins, aggregates, partitions):
+        # 影响统计量的配置, 与之不一致时不能继续合并
+        self.config = config
+        # 每个自变量的分箱(只有标签), {var_name: VarBins}
+        self.var_bins = var_bins
+        # 每个自变量合并后的统计量, {var_name: URSAggregates}
+        self.aggregates = aggregates
+        # 已经合并过的分区, {partition_key: 分区文件的指纹}
+        self.partitions = partitions
+
+    @classmethod
+    def get_config(cls, report_generator):
+        count_cols, sum_cols = get_calc_cols(report_generator.target_vars_calc_config)
+        return {'count_cols': sorted(count_cols), 'sum_cols': sorted(sum_cols),
+                'numeric_var_quantile': report_generator.numeric_var_quantile}
+
+    @classmethod
+    def load_state(cls, path, report_generator):
+        """
+        读取状态文件, 文件不存在时返回空的状态
+
+        :param report_generator:  当前的ReportGenerator, 其配置需要与状态一致
+        """
+        config = cls.get_config(report_generator)
+        if not os.path.exists(path):
+            return cls(config=config, var_bins={}, aggregates={}, partitions={})
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved.get('version') != URS_STATE_VERSION:
+            raise URSStateException(f'Unsupported state version {saved.get("version")} of {path}, '
+                                    f'expected {URS_STATE_VERSION}')
+        state = cls(config=saved['config'], var_bins=saved['var_bins'], aggregates=saved['aggregates'],
+                    partitions=saved['partitions'])
+        if state.config != config:
+            raise URSStateException(f'config of {path} is {state.config}, but current config is {config}, '
+                                    f'delete the state file to aggregate all partitions again')
+        return state
+
+    def save_state(self, path):
+        """写入临时文件后再重命名, 中断时不会破坏之前的状态"""
+        state_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(state_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'version': URS_STATE_VERSION, 'config': self.config, 'var_bins': self.var_bins,
+                             'aggregates': self.aggregates, 'partitions': self.partitions}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def make_partition_key(cls, fingerprint):
+        """只由文件内容决定, 分区文件改名或者移动后也不会被重复合并"""
+        return hashlib.sha1(f'{fingerprint["size"]}:{fingerprint["sample_sha1"]}'.encode('utf-8')).hexdigest()
+
+    def is_merged(self, path):
+        return self.make_partition_key(fingerprint_file(path)) in self.partitions
+
+    def merge_partition(self, report_generator, df, path):
+        """
+        统计一个新的分区并合并到状态中
+
+        :param report_generator:  提供自变量和目标变量的配置
+        :param df:  分区的数据
+        :param path:  分区文件的路径
+        :return:  分区已经合并过时不做任何修改, 返回False
+        """
+        fingerprint = fingerprint_file(path)
+        partition_key = self.make_partition_key(fingerprint)
+        if partition_key in self.partitions:
+            return False
+        var_names = report_generator.get_var_names()
+        new_var_names = [var_name for var_name in var_names if var_name not in self.var_bins]
+        if self.partitions and new_var_names:
+            raise URSStateException(f'{new_var_names} are not aggregated in the merged partitions, '
+                                    f'delete the state file to aggregate all partitions again')
+        var_bins = {}
+        aggregates = {}
+        for var_name in var_names:
+            if var_name in new_var_names:
+                bins = report_generator.create_calculator(var_name, df=df).create_var_bins().to_open_ended()
+            else:
+                bins = self.var_bins[var_name]
+            if bins.is_enum:
+                partition_bins = VarBins.create_enum_bins(df[var_name])
+            else:
+                partition_bins = VarBins.create_numeric_bins_with_labels(df[var_name], bins.labels)
+            partition_aggregates = URSAggregates.from_codes(df=df, codes=partition_bins.codes,
+                                                            labels=partition_bins.labels,
+                                                            count_cols=self.config['count_cols'],
+                                                            sum_cols=self.config['sum_cols'])
+            if var_name in self.aggregates:
+                partition_aggregates = self.aggregates[var_name].merge(partition_aggregates)
+            aggregates[var_name] = partition_aggregates
+            var_bins[var_name] = VarBins(var_name=var_name, labels=partition_aggregates.labels, codes=None,
+                                         is_enum=bins.is_enum)
+        # 所有变量都统计完成后再更新状态
+        self.var_bins.update(var_bins)
+        self.aggregates.update(aggregates)
+        self.partitions[partition_key] = fingerprint
+        return True
+
+    def iter_urs_dfs(self, report_generator):
+        """
+        由合并后的统计量生成urs表
+
+        :return:  按变量首次出现的顺序产出(var_name, urs_df)的迭代器
+        """
+        for var_name in report_generator.get_var_names():
+            calculator = report_generator.create_calculator(var_name, self.var_bins[var_name])
+            yield var_name, calculator.generate_urs_df(aggregates=self.aggregates[var_name])
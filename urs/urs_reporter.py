@@ -1,22 +1,46 @@
+import itertools
+import logging
+import multiprocessing
 import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 import numpy as np
 import pandas as pd
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.column_stats import peek_column_stats
+from common.data_loader import (DataLoaderException, check_columns, detect_encoding, get_dataset_name,
+                                is_partitioned, list_partitions, read_ascii, read_columnar)
+from common.dtype_optimizer import optimize_dtypes
+from common.profile_cache import ProfileCache, fingerprint_dataset
+from common.tracer import finish_tracing, start_tracing, trace_record, trace_span
 from config import (DS_FILE_PATH, NUMERIC_VARS_AS_ENUM, TARGET_VARS, TARGET_VARS_CALC_CONFIG,
                     VARS_GROUPS,
                     SKIP_ROWS, USE_COLS, NUMERIC_VAR_QUANTILE, ENUM_VAR_MAX_LINES, REPORT_PREFIX,
                     REPORT_FOLDER, DS_ENCODINGS, TARGET_VARS_IN_CHART, DSType, TargetVarsCalcWay, DS_TYPE,
-                    ENUM_VARS_ASCENDING_STANDARD)
+                    ENUM_VARS_ASCENDING_STANDARD, URS_WORKERS, PROFILE_CACHE_DIR, PROFILE_CACHE_MAX_SIZE,
+                    URS_STATE_PATH, OPTIMIZE_DTYPES, TRACE_ENABLED, TRACE_SLOWEST_N, URS_EXPORT_TYPE,
+                    URS_SQLITE_PATH, URS_SQLITE_CHUNK_SIZE)
+from urs_aggregator import URSAggregates, VarBins, get_calc_cols
+from urs_incremental import URSIncrementalState
+from urs_sqlite import URSSqliteException, URSSqliteStore
+from urs_workbook import URSTableExporter, URSWorkbookWriter
 
 
 class ReportGenerator:
     def __init__(self, df, path, numeric_vars_as_enum, target_vars, target_vars_in_chart, target_vars_calc_config,
                  numeric_var_quantile,
-                 enum_var_max_lines, var_groups, report_prefix, report_folder):
+                 enum_var_max_lines, var_groups, report_prefix, report_folder, workers=URS_WORKERS, cache_dir=None,
+                 load_config=None, partitions=None, data_source_type=None, export_type=URS_EXPORT_TYPE,
+                 sqlite_store=None):
         self.df = df
-        self.df_name = os.path.split(path)[-1].split('.')[0]
+        self.path = path
+        self.df_name = get_dataset_name(path)
         self.numeric_vars_as_enum = numeric_vars_as_enum
         self.target_vars = target_vars
         self.target_vars_calc_config = target_vars_calc_config
@@ -26,6 +50,20 @@ class ReportGenerator:
         self.var_groups = var_groups
         self.report_prefix = report_prefix
         self.report_folder = report_folder
+        # 并行计算urs表的进程数, 小于等于1时串行计算
+        self.workers = workers
+        # urs表的缓存目录, 为None时不使用缓存
+        self.cache_dir = cache_dir
+        # 读取数据集的参数(跳过的行、读取的列等), 作为缓存键的一部分
+        self.load_config = load_config or {}
+        # 分区数据集的文件列表, 此时df为None, 各分区分别统计后合并
+        self.partitions = partitions
+        # 分区文件的格式
+        self.data_source_type = data_source_type
+        # 同时把urs表导出为csv/parquet长表(DSType.CSV or DSType.PARQUET), 为None时只生成excel
+        self.export_type = export_type
+        # 导入到SQLite中的数据集(URSSqliteStore), 此时df为None, 每个变量由一条分组查询统计
+        self.sqlite_store = sqlite_store
         self.process_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     @classmethod
@@ -34,14 +72,49 @@ class ReportGenerator:
                                      target_vars_in_chart=TARGET_VARS_IN_CHART,
                                      numeric_var_quantile=NUMERIC_VAR_QUANTILE, enum_var_max_lines=ENUM_VAR_MAX_LINES,
                                      var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
-                                     report_folder=REPORT_FOLDER
-                                     ):
-        df = pd.read_pickle(path=path)
+                                     report_folder=REPORT_FOLDER, cache_dir=PROFILE_CACHE_DIR,
+                                     optimize=OPTIMIZE_DTYPES):
+        with trace_span('load', path=path) as span:
+            df = pd.read_pickle(path)
+            span.set(rows=len(df), cols=df.shape[1])
+        required_cols = cls.get_required_cols(var_groups=var_groups, target_vars_calc_config=target_vars_calc_config)
+        try:
+            check_columns(df.columns, required_cols, path)
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        # 只保留报告需要的列, 释放其余列占用的内存
+        df = df[required_cols]
+        if optimize:
+            cls._optimize_dtypes(df)
         return cls(df=df, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
                    target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
                    numeric_var_quantile=numeric_var_quantile,
                    enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
-                   report_prefix=report_prefix, report_folder=report_folder)
+                   report_prefix=report_prefix, report_folder=report_folder, cache_dir=cache_dir)
+
+    @classmethod
+    def create_generator_from_df(cls, df, path=DS_FILE_PATH, numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM,
+                                 target_vars=TARGET_VARS, target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                                 target_vars_in_chart=TARGET_VARS_IN_CHART,
+                                 numeric_var_quantile=NUMERIC_VAR_QUANTILE, enum_var_max_lines=ENUM_VAR_MAX_LINES,
+                                 var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
+                                 report_folder=REPORT_FOLDER, cache_dir=PROFILE_CACHE_DIR, load_config=None):
+        """
+        使用已经读入的数据集(如同时生成qc报告时, 见pipeline/run_reports.py), 不复制其中报告需要的列
+
+        :param load_config:  读取数据集的参数, 作为缓存键的一部分
+        """
+        required_cols = cls.get_required_cols(var_groups=var_groups, target_vars_calc_config=target_vars_calc_config)
+        try:
+            check_columns(df.columns, required_cols, path)
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        return cls(df=df, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
+                   target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
+                   numeric_var_quantile=numeric_var_quantile,
+                   enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
+                   report_prefix=report_prefix, report_folder=report_folder, cache_dir=cache_dir,
+                   load_config=load_config)
 
     @classmethod
     def create_generator_from_ascii(cls, read_func, path=DS_FILE_PATH, numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM,
@@ -50,118 +123,529 @@ class ReportGenerator:
                                     numeric_var_quantile=NUMERIC_VAR_QUANTILE, enum_var_max_lines=ENUM_VAR_MAX_LINES,
                                     var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
                                     report_folder=REPORT_FOLDER, skip_rows=SKIP_ROWS, use_cols=USE_COLS,
-                                    encodings=DS_ENCODINGS):
-        df = None
-        for encoding in encodings:
-            try:
-                df = read_func(path, skiprows=skip_rows, usecols=use_cols, encoding=encoding)
-            except Exception as e:
-                print(e)
-                continue
-            else:
-                break
-        if df is None:
-            raise URSException('Coding type not included in DATA_SOURCE_ENCODINGS!')
+                                    encodings=DS_ENCODINGS, cache_dir=PROFILE_CACHE_DIR, optimize=OPTIMIZE_DTYPES):
+        required_cols = cls.get_required_cols(var_groups=var_groups, target_vars_calc_config=target_vars_calc_config)
+        try:
+            with trace_span('load', path=path) as span:
+                df = read_ascii(read_func, path, encodings, required_cols=required_cols, skiprows=skip_rows,
+                                usecols=use_cols)
+                span.set(rows=len(df), cols=df.shape[1])
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        if optimize:
+            cls._optimize_dtypes(df)
 
         return cls(df=df, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
                    target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
                    numeric_var_quantile=numeric_var_quantile,
                    enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
-                   report_prefix=report_prefix, report_folder=report_folder)
+                   report_prefix=report_prefix, report_folder=report_folder,
+                   cache_dir=cache_dir, load_config={'skip_rows': skip_rows, 'use_cols': use_cols})
+
+    @classmethod
+    def create_generator_from_columnar(cls, fmt, path=DS_FILE_PATH, numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM,
+                                       target_vars=TARGET_VARS, target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                                       target_vars_in_chart=TARGET_VARS_IN_CHART,
+                                       numeric_var_quantile=NUMERIC_VAR_QUANTILE, enum_var_max_lines=ENUM_VAR_MAX_LINES,
+                                       var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
+                                       report_folder=REPORT_FOLDER, cache_dir=PROFILE_CACHE_DIR,
+                                       optimize=OPTIMIZE_DTYPES):
+        # parquet/feather只读取需要的列, 并使用内存映射
+        required_cols = cls.get_required_cols(var_groups=var_groups, target_vars_calc_config=target_vars_calc_config)
+        try:
+            with trace_span('load', path=path) as span:
+                df = read_columnar(path, fmt, required_cols=required_cols)
+                span.set(rows=len(df), cols=df.shape[1])
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        if optimize:
+            cls._optimize_dtypes(df)
+        return cls(df=df, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
+                   target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
+                   numeric_var_quantile=numeric_var_quantile,
+                   enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
+                   report_prefix=report_prefix, report_folder=report_folder, cache_dir=cache_dir)
+
+    @classmethod
+    def create_generator_from_partitions(cls, data_source_type, path=DS_FILE_PATH,
+                                         numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM,
+                                         target_vars=TARGET_VARS, target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                                         target_vars_in_chart=TARGET_VARS_IN_CHART,
+                                         numeric_var_quantile=NUMERIC_VAR_QUANTILE,
+                                         enum_var_max_lines=ENUM_VAR_MAX_LINES,
+                                         var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
+                                         report_folder=REPORT_FOLDER, skip_rows=SKIP_ROWS, use_cols=USE_COLS,
+                                         encodings=DS_ENCODINGS, cache_dir=PROFILE_CACHE_DIR):
+        """
+        分区数据集(目录或者通配符)只列出分区文件, 计算urs表时每个分区单独读取, 不会拼接成一个DataFrame
+
+        :param data_source_type:  每个分区文件的格式
+        """
+        try:
+            partitions = list_partitions(path)
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        return cls(df=None, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
+                   target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
+                   numeric_var_quantile=numeric_var_quantile,
+                   enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
+                   report_prefix=report_prefix, report_folder=report_folder, cache_dir=cache_dir,
+                   load_config={'skip_rows': skip_rows, 'use_cols': use_cols, 'encodings': encodings},
+                   partitions=partitions, data_source_type=data_source_type)
+
+    @classmethod
+    def create_generator_from_sqlite(cls, data_source_type, path=DS_FILE_PATH, db_path=URS_SQLITE_PATH,
+                                     numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM,
+                                     target_vars=TARGET_VARS, target_vars_calc_config=TARGET_VARS_CALC_CONFIG,
+                                     target_vars_in_chart=TARGET_VARS_IN_CHART,
+                                     numeric_var_quantile=NUMERIC_VAR_QUANTILE, enum_var_max_lines=ENUM_VAR_MAX_LINES,
+                                     var_groups=VARS_GROUPS, report_prefix=REPORT_PREFIX,
+                                     report_folder=REPORT_FOLDER, skip_rows=SKIP_ROWS, use_cols=USE_COLS,
+                                     encodings=DS_ENCODINGS, cache_dir=PROFILE_CACHE_DIR,
+                                     chunk_size=URS_SQLITE_CHUNK_SIZE):
+        """
+        把数据集(也可以是分区数据集)中报告需要的列分块导入db_path, 数据集和读取配置都没有变化时直接使用已有的文件
+
+        :param data_source_type:  数据集(或者每个分区文件)的格式
+        :param chunk_size:  每次读取的csv记录数
+        """
+        required_cols = cls.get_required_cols(var_groups=var_groups, target_vars_calc_config=target_vars_calc_config)
+        var_names = [var_name for var_name in required_cols
+                     if any(var_name in gvars for gvars in var_groups.values())]
+        load_config = {'skip_rows': skip_rows, 'use_cols': use_cols, 'encodings': encodings}
+        try:
+            partitions = list_partitions(path) if is_partitioned(path) else [path]
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        source_key = URSSqliteStore.get_source_key(fingerprint_dataset(path), data_source_type, required_cols,
+                                                   var_names, load_config)
+        with trace_span('import_sqlite', path=path) as span:
+            try:
+                sqlite_store = URSSqliteStore.create_store(
+                    db_path, source_key, var_names=var_names,
+                    chunks=lambda: (chunk for partition_path in partitions for chunk in cls.read_chunks(
+                        data_source_type, partition_path, required_cols, chunk_size, **load_config)))
+            except URSSqliteException as e:
+                raise URSException(str(e))
+            span.set(rows=sqlite_store.records_num)
+        return cls(df=None, path=path, numeric_vars_as_enum=numeric_vars_as_enum, target_vars=target_vars,
+                   target_vars_calc_config=target_vars_calc_config, target_vars_in_chart=target_vars_in_chart,
+                   numeric_var_quantile=numeric_var_quantile,
+                   enum_var_max_lines=enum_var_max_lines, var_groups=var_groups,
+                   report_prefix=report_prefix, report_folder=report_folder, cache_dir=cache_dir,
+                   load_config=load_config, data_source_type=data_source_type, sqlite_store=sqlite_store)
+
+    @classmethod
+    def read_chunks(cls, data_source_type, path, required_cols, chunk_size, skip_rows=SKIP_ROWS, use_cols=USE_COLS,
+                    encodings=DS_ENCODINGS):
+        """
+        分块读取一个文件中需要的列, csv每次读取chunk_size条记录, 其他格式整个文件作为一块
+
+        :return:  DataFrame的迭代器
+        """
+        if data_source_type != DSType.CSV:
+            yield cls.read_partition(data_source_type, path, required_cols, skip_rows=skip_rows, use_cols=use_cols,
+                                     encodings=encodings)
+            return
+        encoding = detect_encoding(path, encodings)
+        if encoding is None:
+            raise URSException(f'Coding type of {path} not included in {encodings}!')
+        header = pd.read_csv(path, nrows=0, encoding=encoding, skiprows=skip_rows, usecols=use_cols)
+        try:
+            check_columns(header.columns, required_cols, path)
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        yield from pd.read_csv(path, encoding=encoding, skiprows=skip_rows, usecols=list(required_cols),
+                               chunksize=chunk_size)
+
+    @classmethod
+    def read_partition(cls, data_source_type, path, required_cols, skip_rows=SKIP_ROWS, use_cols=USE_COLS,
+                       encodings=DS_ENCODINGS):
+        """
+        读取一个分区文件中需要的列
+
+        :return:  DataFrame
+        """
+        try:
+            if data_source_type == DSType.PKL:
+                df = pd.read_pickle(path)
+                check_columns(df.columns, required_cols, path)
+                return df[required_cols]
+            elif data_source_type == DSType.CSV:
+                return read_ascii(pd.read_csv, path, encodings, required_cols=required_cols, skiprows=skip_rows,
+                                  usecols=use_cols)
+            elif data_source_type == DSType.EXCEL:
+                return read_ascii(pd.read_excel, path, encodings, required_cols=required_cols, skiprows=skip_rows,
+                                  usecols=use_cols)
+            elif data_source_type in (DSType.PARQUET, DSType.FEATHER):
+                return read_columnar(path, data_source_type.value, required_cols=required_cols)
+        except DataLoaderException as e:
+            raise URSException(str(e))
+        raise URSException(f'{data_source_type} does not support currently!')
+
+    @classmethod
+    def _optimize_dtypes(cls, df):
+        """就地压缩各列的类型, 不改变其中的取值"""
+        with trace_span('optimize_dtypes'):
+            memory_usage = optimize_dtypes(df)
+        before = sum(before for before, _ in memory_usage.values())
+        after = sum(after for _, after in memory_usage.values())
+        print(f'memory of the data set is reduced from {before / 1024 ** 2:.1f}MB to {after / 1024 ** 2:.1f}MB')
+
+    @classmethod
+    def get_required_cols(cls, var_groups, target_vars_calc_config):
+        """
+        报告需要用到的列: VARS_GROUPS中的自变量以及目标变量计算用到的原始列
+
+        :return: 去重后的列名列表
+        """
+        count_cols, sum_cols = get_calc_cols(target_vars_calc_config)
+        required_cols = []
+        for col in [var_name for gvars in var_groups.values() for var_name in gvars] + count_cols + sum_cols:
+            if col not in required_cols:
+                required_cols.append(col)
+        return required_cols
 
     def to_excel(self):
+        var_names = self.get_var_names()
+        cache = ProfileCache(self.cache_dir, PROFILE_CACHE_MAX_SIZE) if self.cache_dir is not None else None
+        cache_keys = {}
+        cached_urs_dfs = []
+        if cache is not None:
+            # 数据集和变量相关的配置都没有变化时直接使用缓存的urs表
+            fingerprint = fingerprint_dataset(self.path)
+            with trace_span('load_urs_cache') as span:
+                for var_name in var_names:
+                    cache_keys[var_name] = cache.make_key('urs', fingerprint, self.get_var_config(var_name))
+                    urs_df = cache.get(cache_keys[var_name])
+                    if urs_df is not None:
+                        cached_urs_dfs.append((var_name, urs_df))
+                span.set(hits=len(cached_urs_dfs))
+        cached_var_names = {var_name for var_name, _ in cached_urs_dfs}
+        var_names = [var_name for var_name in var_names if var_name not in cached_var_names]
+        if self.sqlite_store is not None:
+            urs_dfs = self.calc_urs_dfs_from_sqlite(var_names)
+        elif self.partitions is not None:
+            urs_dfs = self.calc_urs_dfs_from_partitions(var_names)
+        else:
+            urs_dfs = self.calc_urs_dfs(self.bin_variables(var_names))
+        if cache is not None:
+            urs_dfs = self._put_urs_dfs_to_cache(cache, cache_keys, urs_dfs)
+        self.write_excel(itertools.chain(cached_urs_dfs, urs_dfs))
+
+    def to_excel_incremental(self, state_path):
+        """
+        增量模式: 只统计当前的数据集(新追加的分区)并合并到state_path保存的统计量中, 再由合并后的统计量生成报告
+
+        :param state_path:  保存统计状态的文件, 不存在时以当前数据集作为第一个分区
+        """
+        state = URSIncrementalState.load_state(state_path, self)
+        if self.partitions is None:
+            with trace_span('merge_partition', path=self.path, rows=len(self.df)):
+                merged = state.merge_partition(self, df=self.df, path=self.path)
+        else:
+            # 分区数据集中只有还没有合并过的分区会被读取
+            required_cols = self.get_required_cols(var_groups=self.var_groups,
+                                                   target_vars_calc_config=self.target_vars_calc_config)
+            merged = False
+            for path in self.partitions:
+                if not state.is_merged(path):
+                    with trace_span('load', path=path) as span:
+                        df = self.read_partition(self.data_source_type, path, required_cols, **self.load_config)
+                        span.set(rows=len(df), cols=df.shape[1])
+                    with trace_span('merge_partition', path=path, rows=len(df)):
+                        merged = state.merge_partition(self, df=df, path=path) or merged
+        if merged:
+            with trace_span('save_state'):
+                state.save_state(state_path)
+        else:
+            print(f'{self.path} has already been merged into {state_path}')
+        self.write_excel(state.iter_urs_dfs(self))
+
+    def calc_urs_dfs(self, var_bins):
+        """
+        计算已分箱的变量的urs表, 并行模式下在返回前提交所有任务(此时fork出全部子进程), 之后才能启动写excel的线程
+
+        :param var_bins:  {var_name: VarBins}
+        :return:  按var_bins的顺序产出(var_name, urs_df)的迭代器
+        """
+        var_names = list(var_bins.keys())
+        if self.workers > 1 and len(var_names) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # 子进程通过fork继承数据集和分箱结果, 只读共享, 不需要序列化传给每个进程
+            global _shared_report_generator, _shared_var_bins
+            _shared_report_generator, _shared_var_bins = self, var_bins
+            try:
+                executor = ProcessPoolExecutor(max_workers=min(self.workers, len(var_names)),
+                                               mp_context=multiprocessing.get_context('fork'))
+                futures = [executor.submit(_calc_urs_df_in_worker, var_name) for var_name in var_names]
+            finally:
+                _shared_report_generator, _shared_var_bins = None, None
+            return self._collect_urs_dfs(executor, var_names, futures)
+        return ((var_name, self.create_calculator(var_name, var_bins[var_name]).generate_urs_df())
+                for var_name in var_names)
+
+    def calc_urs_dfs_from_partitions(self, var_names):
+        """
+        分区数据集分两步统计, 每一步中各分区由workers个进程并行处理:
+        1. 统计每个分区中数值变量各取值的记录数, 合并后计算与整个数据集相同的分箱边界
+        2. 按照统一的分箱统计每个分区的URSAggregates, 合并后生成urs表
+
+        :return:  按var_names的顺序产出(var_name, urs_df)的迭代器
+        """
+        if not var_names:
+            return iter([])
+        var_value_counts = {}
+        for partition_value_counts in self._map_partitions(_scan_partition, var_names, self.numeric_vars_as_enum):
+            for var_name, value_counts in partition_value_counts.items():
+                if var_name in var_value_counts and (value_counts is None or var_value_counts[var_name] is None):
+                    # 任何一个分区中为枚举变量时整体作为枚举变量, 与拼接后读取时的类型一致
+                    var_value_counts[var_name] = None
+                elif var_name in var_value_counts:
+                    var_value_counts[var_name] = var_value_counts[var_name].add(value_counts, fill_value=0)
+                else:
+                    var_value_counts[var_name] = value_counts
+        var_labels = {var_name: None if value_counts is None else
+                      VarBins.create_numeric_labels(value_counts, self.numeric_var_quantile)
+                      for var_name, value_counts in var_value_counts.items()}
+        count_cols, sum_cols = get_calc_cols(self.target_vars_calc_config)
+        aggregates = {}
+        for partition_aggregates in self._map_partitions(_aggregate_partition, var_labels, count_cols, sum_cols):
+            for var_name, var_aggregates in partition_aggregates.items():
+                aggregates[var_name] = aggregates[var_name].merge(var_aggregates) if var_name in aggregates \
+                    else var_aggregates
+        return ((var_name, self.create_calculator(var_name, VarBins(
+            var_name=var_name, labels=aggregates[var_name].labels, codes=None,
+            is_enum=var_labels[var_name] is None)).generate_urs_df(aggregates=aggregates[var_name]))
+                for var_name in var_names)
+
+    def calc_urs_dfs_from_sqlite(self, var_names):
+        """
+        每个变量在SQLite中统计: 数值变量先按取值分组得到各取值的记录数并计算分箱边界,
+        再由一条分组查询统计所有目标变量需要的计数与求和, 结果与内存中统计的urs表相同
+
+        :return:  按var_names的顺序产出(var_name, urs_df)的迭代器
+        """
+        count_cols, sum_cols = get_calc_cols(self.target_vars_calc_config)
+        for var_name in var_names:
+            var_kind = self.sqlite_store.var_kinds.get(var_name)
+            if var_kind is None:
+                raise URSException(f'{var_name} does not included in {self.sqlite_store.db_path}')
+            if var_kind == 'unsupported':
+                raise URSException(f'Unsupported type of {var_name}')
+            is_enum = var_kind == 'enum' or var_name in self.numeric_vars_as_enum
+            with trace_span('sqlite_aggregate', var=var_name, rows=self.sqlite_store.records_num):
+                labels = None
+                if not is_enum:
+                    labels = VarBins.create_numeric_labels(self.sqlite_store.get_value_counts(var_name),
+                                                           self.numeric_var_quantile)
+                aggregates = self.sqlite_store.aggregate(var_name, count_cols, sum_cols, labels=labels)
+            var_bins = VarBins(var_name=var_name, labels=aggregates.labels, codes=None, is_enum=is_enum)
+            yield var_name, self.create_calculator(var_name, var_bins).generate_urs_df(aggregates=aggregates)
+
+    def _map_partitions(self, func, *args):
+        """
+        对每个分区调用func(data_source_type, path, load_config, *args), workers大于1时并行
+
+        :return:  按分区顺序产出结果的迭代器
+        """
+        tasks = [(func, self.data_source_type, path, self.load_config) + args for path in self.partitions]
+        if self.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                results = executor.map(_call_with_timing, *zip(*tasks))
+                for path, (result, seconds) in zip(self.partitions, results):
+                    trace_record(func.__name__.lstrip('_'), seconds, path=path, worker=True)
+                    yield result
+        else:
+            for path, task in zip(self.partitions, tasks):
+                with trace_span(func.__name__.lstrip('_'), path=path):
+                    result, _ = _call_with_timing(*task)
+                yield result
+
+    @classmethod
+    def _collect_urs_dfs(cls, executor, var_names, futures):
+        with executor:
+            for var_name, future in zip(var_names, futures):
+                urs_df, seconds = future.result()
+                trace_record('urs_df', seconds, var=var_name, worker=True)
+                yield var_name, urs_df
+
+    @classmethod
+    def _put_urs_dfs_to_cache(cls, cache, cache_keys, urs_dfs):
+        for var_name, urs_df in urs_dfs:
+            cache.put(cache_keys[var_name], urs_df)
+            yield var_name, urs_df
+
+    def get_var_config(self, var_name):
+        """影响变量urs表的配置, 作为缓存键的一部分"""
+        return {'var_name': var_name, 'as_enum': var_name in self.numeric_vars_as_enum,
+                'target_vars': self.target_vars, 'target_vars_calc_config': self.target_vars_calc_config,
+                'numeric_var_quantile': self.numeric_var_quantile, 'enum_var_max_lines': self.enum_var_max_lines,
+                'enum_vars_ascending_standard': ENUM_VARS_ASCENDING_STANDARD, 'load_config': self.load_config}
+
+    def write_excel(self, urs_dfs):
+        """
+        在单独的写线程中按VARS_GROUPS的顺序把urs表写入excel, 计算与写文件同时进行
+
+        :param urs_dfs:  按变量首次出现的顺序产出(var_name, urs_df)的可迭代对象
+        """
+        urs_df_queue = queue.Queue()
+        sheet_writer = URSSheetWriter(report_generator=self, urs_df_queue=urs_df_queue)
+        sheet_writer.start()
+        try:
+            for var_name, urs_df in urs_dfs:
+                urs_df_queue.put((var_name, urs_df))
+        finally:
+            urs_df_queue.put(None)
+            # 计算完成后等待写线程写完剩余的urs表
+            with trace_span('wait_sheet_writer'):
+                sheet_writer.join()
+        if sheet_writer.exception is not None:
+            raise sheet_writer.exception
+
+    def get_excel_path(self):
         excel_name = f'{self.report_prefix}_{self.df_name}_{self.process_time}.xlsx'
-        excel_file = os.path.join(self.report_folder, excel_name)
-        writer = pd.ExcelWriter(excel_file, engine='xlsxwriter')
-        for gname, gvars in self.var_groups.items():
-            group_report_generator = GroupReportGenerator(df=self.df, writer=writer, sheet_name=gname, variables=gvars,
-                                                          target_vars=self.target_vars,
-                                                          target_vars_in_chart=self.target_vars_in_chart)
-            group_report_generator.draw_sheet()
-        writer.close()
-
-
-class GroupReportGenerator:
-    def __init__(self, df, writer, sheet_name, variables, target_vars, target_vars_in_chart):
-        self.df = df
-        self.writer = writer
-        self.sheet_name = sheet_name
-        self.workbook = writer.book
-        self.worksheet = self.workbook.add_worksheet(sheet_name)
-        self.writer.sheets[sheet_name] = self.worksheet
-        # 自变量列表
-        self.variables = variables
-        # 目标变量列表
-        self.target_vars = target_vars
-        # 需要图表展示的目标变量列表
-        self.target_vars_in_chart = target_vars_in_chart
-        # 画数据表行索引所在列，随着图表的增加更新
-        self.row_ind = 0
-        # 数据表中，索引所在列
-        self.index_col_ind = 0
-        # 因为列名需要增加的行数
-        self.title_offset = 1
-        # 因为索引需要增加的列数
-        self.index_offset = 1
-        # 图表占用的格子数
-        self.chart_height = 15
-        # 表格和图之间的空列数
-        self.blank_col_between = 2
-        # 不同变量报告之间的行数
-        self.blank_row_between = 2
-
-    def draw_sheet(self):
-        for var_name in self.variables:
-            target_calculator = URSDfCalculator(df=self.df, target_vars=self.target_vars,
-                                                target_vars_calc_config=TARGET_VARS_CALC_CONFIG, var_name=var_name,
-                                                numeric_var_quantile=NUMERIC_VAR_QUANTILE,
-                                                enum_var_max_lines=ENUM_VAR_MAX_LINES,
-                                                numeric_vars_as_enum=NUMERIC_VARS_AS_ENUM)
-            urs_df = target_calculator.generate_urs_df()
-            self.draw_var_table(urs_df=urs_df, var_name=var_name, row=self.row_ind)
-            self.draw_var_chart(urs_df=urs_df, var_name=var_name, row=self.row_ind)
-            self.row_ind += self.blank_row_between + max(self.chart_height, urs_df.shape[0])
-
-    def draw_var_table(self, urs_df, var_name, row):
-        urs_df.index.name = var_name
-        urs_df.to_excel(self.writer, sheet_name=self.sheet_name, startrow=row, startcol=0)
-
-    def draw_var_chart(self, urs_df, var_name, row):
-        # 折现图画在表格右侧空一列处
-        chart = self.workbook.add_chart({'type': 'line'})
-        if not set(self.target_vars_in_chart).issubset(set(self.target_vars)):
-            raise URSException(
-                f'{set(self.target_vars_in_chart) - set(self.target_vars)} '
-                f'does not contained in TARGET_VARS')
-        # 每一个target_vars_in_chart中的变量绘制一条曲线
-        for target_var in self.target_vars_in_chart:
-            target_var_col_ind = self.target_vars.index(target_var) + self.index_offset
-            chart.add_series({
-                'categories': [self.sheet_name, row + self.title_offset, self.index_col_ind,
-                               row + self.title_offset + urs_df.shape[0],
-                               self.index_col_ind],
-                'values': [self.sheet_name, row + self.title_offset, target_var_col_ind,
-                           row + self.title_offset + urs_df.shape[0],
-                           target_var_col_ind],
-                'name': target_var
-            })
-
-        chart.set_x_axis({'name': var_name, 'position_axis': 'on_tick'})
-        chart.set_y_axis({'name': 'value', 'major_gridlines': {'visible': True}})
-
-        # Turn off chart legend. It is on by default in Excel.
-        chart.set_legend({'position': 'bottom'})
-
-        chart.set_size({'width': 960, 'height': 288})
-
-        # Insert the chart into the worksheet.
-        self.worksheet.insert_chart(row=row, col=urs_df.shape[1] + self.index_offset + self.blank_col_between,
-                                    chart=chart)
+        return os.path.join(self.report_folder, excel_name)
+
+    def create_calculator(self, var_name, var_bins=None, df=None):
+        """:param df:  计算用的数据, 为None时使用整个数据集"""
+        return URSDfCalculator(df=self.df if df is None else df, target_vars=self.target_vars,
+                               target_vars_calc_config=self.target_vars_calc_config, var_name=var_name,
+                               numeric_var_quantile=self.numeric_var_quantile,
+                               enum_var_max_lines=self.enum_var_max_lines,
+                               numeric_vars_as_enum=self.numeric_vars_as_enum, var_bins=var_bins)
+
+    def get_var_names(self):
+        """
+        :return: 所有分组中的自变量, 按首次出现的顺序去重
+        """
+        var_names = []
+        for gvars in self.var_groups.values():
+            for var_name in gvars:
+                if var_name not in var_names:
+                    var_names.append(var_name)
+        return var_names
+
+    def bin_variables(self, var_names=None):
+        """
+        对所有分组中的自变量做一次分箱, 同一个变量出现在多个分组中时也只分箱一次
+
+        :param var_names:  只对这些变量分箱, 为None时对所有分组中的自变量分箱
+        :return: {var_name: VarBins}
+        """
+        if var_names is None:
+            var_names = self.get_var_names()
+        var_bins = {}
+        for var_name in var_names:
+            with trace_span('bin', var=var_name, rows=len(self.df)) as span:
+                var_bins[var_name] = self.create_calculator(var_name).create_var_bins()
+                span.set(is_enum=var_bins[var_name].is_enum, bins=len(var_bins[var_name].labels))
+        return var_bins
+
+
+# 并行模式下由父进程在fork前设置, 子进程只读访问
+_shared_report_generator = None
+_shared_var_bins = None
+
+
+def _scan_partition(data_source_type, path, load_config, var_names, numeric_vars_as_enum):
+    """
+    :return:  {var_name: 数值变量各取值的记录数, 枚举变量为None}
+    """
+    df = ReportGenerator.read_partition(data_source_type, path, var_names, **load_config)
+    var_value_counts = {}
+    for var_name in var_names:
+        dtype = df[var_name].dtype
+        if dtype == object or isinstance(dtype, pd.CategoricalDtype) or var_name in numeric_vars_as_enum:
+            var_value_counts[var_name] = None
+        elif dtype.kind in 'iuf':
+            var_value_counts[var_name] = df[var_name].value_counts()
+        else:
+            raise URSException(f'Unsupported type of {var_name} in {path}')
+    return var_value_counts
+
+
+def _aggregate_partition(data_source_type, path, load_config, var_labels, count_cols, sum_cols):
+    """
+    :param var_labels:  {var_name: 数值变量的分箱区间, 枚举变量为None}
+    :return:  {var_name: URSAggregates}
+    """
+    required_cols = list(var_labels.keys()) + [col for col in count_cols + sum_cols if col not in var_labels]
+    df = ReportGenerator.read_partition(data_source_type, path, list(dict.fromkeys(required_cols)), **load_config)
+    aggregates = {}
+    for var_name, labels in var_labels.items():
+        if labels is None:
+            var_bins = VarBins.create_enum_bins(df[var_name])
+        else:
+            var_bins = VarBins.create_numeric_bins_with_labels(df[var_name], labels)
+        aggregates[var_name] = URSAggregates.from_codes(df=df, codes=var_bins.codes, labels=var_bins.labels,
+                                                        count_cols=count_cols, sum_cols=sum_cols)
+    return aggregates
+
+
+def _calc_urs_df_in_worker(var_name):
+    """:return:  (urs_df, 计算耗时的秒数), 子进程中的阶段不会被记录, 由父进程补充"""
+    start = time.perf_counter()
+    calculator = _shared_report_generator.create_calculator(var_name, _shared_var_bins[var_name])
+    return calculator.generate_urs_df(), time.perf_counter() - start
+
+
+def _call_with_timing(func, *args):
+    """:return:  (func(*args), 耗时的秒数)"""
+    start = time.perf_counter()
+    return func(*args), time.perf_counter() - start
+
+
+class URSSheetWriter(threading.Thread):
+    """从队列中取出计算好的urs表, 按VARS_GROUPS中的顺序写入excel"""
+
+    def __init__(self, report_generator, urs_df_queue):
+        super().__init__(name='urs-sheet-writer')
+        self.report_generator = report_generator
+        self.urs_df_queue = urs_df_queue
+        self.exception = None
+
+    def run(self):
+        try:
+            self.write_sheets()
+        except Exception as e:
+            self.exception = e
+            # 继续取空队列, 避免计算端阻塞
+            while self.urs_df_queue.get() is not None:
+                pass
+
+    def write_sheets(self):
+        report_generator = self.report_generator
+        excel_path = report_generator.get_excel_path()
+        workbook_writer = URSWorkbookWriter(path=excel_path, target_vars=report_generator.target_vars,
+                                            target_vars_in_chart=report_generator.target_vars_in_chart)
+        exporter = None
+        if report_generator.export_type is not None:
+            exporter = URSTableExporter(path=URSTableExporter.get_export_path(excel_path, report_generator.export_type),
+                                        export_type=report_generator.export_type,
+                                        target_vars=report_generator.target_vars)
+        urs_dfs = {}
+        for gname, gvars in report_generator.var_groups.items():
+            workbook_writer.add_sheet(gname)
+            for var_name in gvars:
+                while var_name not in urs_dfs:
+                    item = self.urs_df_queue.get()
+                    if item is None:
+                        # 计算端异常退出, 不生成不完整的报告
+                        return
+                    urs_dfs[item[0]] = item[1]
+                with trace_span('write_var', var=var_name, sheet=gname):
+                    workbook_writer.draw_var(urs_df=urs_dfs[var_name], var_name=var_name)
+                    if exporter is not None:
+                        exporter.export_var(urs_df=urs_dfs[var_name], var_name=var_name)
+        with trace_span('save_excel'):
+            workbook_writer.close()
+            if exporter is not None:
+                exporter.close()
 
 
 class URSDfCalculator:
     def __init__(self, df, target_vars, target_vars_calc_config, var_name, numeric_var_quantile, enum_var_max_lines,
-                 numeric_vars_as_enum):
+                 numeric_vars_as_enum, var_bins=None):
         self.df = df
         # 目标变量列表
         self.target_vars = target_vars
@@ -175,96 +659,81 @@ class URSDfCalculator:
         self.enum_var_max_lines = enum_var_max_lines
         # 数值变量强制作为枚举变量
         self.numeric_vars_as_enum = numeric_vars_as_enum
-
-    def calc_target_vars(self, chosen_cond, calc_config):
-        calc_way = calc_config.get('calc_way')
-        orig_col = calc_config.get('orig_cols')
-        if calc_way not in TargetVarsCalcWay:
-            raise URSException(f'Unsupported calc way: {calc_way}')
-        # 双目运算(赔付率， 相对赔付率）
-        if calc_way in (TargetVarsCalcWay.RATIO, TargetVarsCalcWay.RATIO_REL):
-            orig_col_left = orig_col[0]
-            self._test_col_in_df(orig_col_left)
-            orig_col_right = orig_col[1]
-            self._test_col_in_df(orig_col_right)
-            if calc_way == TargetVarsCalcWay.RATIO:
-                return self.df[orig_col_left][chosen_cond].sum() / self.df[orig_col_right][chosen_cond].sum()
-            else:
-                return self.df[orig_col_left][chosen_cond].sum() / self.df[orig_col_right][chosen_cond].sum()
-
-        # 单目运算 (count, sum, average)
-        else:
-            self._test_col_in_df(orig_col)
-            return self.df[orig_col][chosen_cond].apply(calc_way.value)
-
-    def generate_numeric_urs_df(self):
-        self.df = self.df.sort_values(self.var_name, ascending=True)
-        urs_index = pd.qcut(self.df[self.var_name], self.numeric_var_quantile, duplicates='drop').unique()
-        urs_df = pd.DataFrame(index=urs_index, columns=self.target_vars)
-        urs_df.index.name = self.var_name
-        vars_rel_ratio = set()
-        for row_cnt, ind in enumerate(urs_index):
-            # 区分NAN值
-            if type(ind) != float:
-                chosen_cond = (self.df[self.var_name] > ind.left) & (self.df[self.var_name] <= ind.right)
-            else:
-                chosen_cond = self.df[self.var_name].isnull()
-            for target_var, calc_config in self.target_vars_calc_config.items():
-                if calc_config.get('calc_way') == TargetVarsCalcWay.RATIO_REL:
-                    vars_rel_ratio.add(target_var)
-                urs_df[target_var].iloc[row_cnt] = self.calc_target_vars(chosen_cond=chosen_cond,
-                                                                         calc_config=calc_config)
-        # rel变量需要重新计算一次相对值
-        for var_rel in vars_rel_ratio:
-            var_rel_tmp = var_rel + '_tmp'
-            urs_df[var_rel_tmp] = urs_df[var_rel]
-            urs_df[var_rel] = urs_df[var_rel_tmp] / (urs_df[var_rel_tmp].mean()) - 1
-            urs_df.drop(var_rel_tmp, axis=1, inplace=True)
+        # 自变量的分箱结果, 为空时在计算时分箱
+        self.var_bins = var_bins
+
+    def generate_numeric_urs_df(self, aggregates=None):
+        if aggregates is None:
+            aggregates = self._aggregate()
+        # 只展示有记录的分箱, 空值分箱放在最后
+        positions = np.flatnonzero(aggregates.rows > 0)
+        return aggregates.to_urs_df(positions=positions, index=self.var_bins.create_urs_index(positions),
+                                    target_vars=self.target_vars,
+                                    target_vars_calc_config=self.target_vars_calc_config)
+
+    def generate_enum_urs_df(self, aggregates=None):
+        if aggregates is None:
+            aggregates = self._aggregate()
+        # 按变量值升序(空值在最后)取前enum_var_max_lines个
+        positions = np.flatnonzero(aggregates.rows > 0)[:self.enum_var_max_lines]
+        urs_df = aggregates.to_urs_df(positions=positions, index=self.var_bins.create_urs_index(positions),
+                                      target_vars=self.target_vars,
+                                      target_vars_calc_config=self.target_vars_calc_config)
+        urs_df.sort_values(ENUM_VARS_ASCENDING_STANDARD, ascending=True, inplace=True)
         return urs_df
 
-    def generate_enum_urs_df(self):
-        sorted_index = self.df[self.var_name].sort_values(ascending=True).unique()
-        if len(sorted_index) > self.enum_var_max_lines:
-            sorted_index = sorted_index[:self.enum_var_max_lines]
-        urs_df = pd.DataFrame(index=sorted_index, columns=self.target_vars)
-        urs_df.index.name = self.var_name
-        vars_rel_ratio = set()
-        for ind in sorted_index:
-            if ind is np.nan:
-                chosen_cond = self.df[self.var_name].isnull()
-            else:
-                chosen_cond = self.df[self.var_name] == ind
-            for target_var, calc_config in self.target_vars_calc_config.items():
-                if calc_config.get('calc_way') == TargetVarsCalcWay.RATIO_REL:
-                    vars_rel_ratio.add(target_var)
-                urs_df[target_var].loc[ind] = self.calc_target_vars(chosen_cond=chosen_cond, calc_config=calc_config)
-
-        # rel变量需要重新计算一次相对值
-        for var_rel in vars_rel_ratio:
-            var_rel_tmp = var_rel + '_tmp'
-            urs_df[var_rel_tmp] = urs_df[var_rel]
-            urs_df[var_rel] = urs_df[var_rel_tmp] / (urs_df[var_rel_tmp].mean()) - 1
-            urs_df.drop(var_rel_tmp, axis=1, inplace=True)
+    def _aggregate(self):
+        """对自变量的每个分箱一次性统计出所有目标变量需要的计数与求和"""
+        count_cols, sum_cols = get_calc_cols(self.target_vars_calc_config)
+        for orig_col in count_cols + sum_cols:
+            self._test_col_in_df(orig_col)
+        return URSAggregates.from_codes(df=self.df, codes=self.var_bins.codes, labels=self.var_bins.labels,
+                                        count_cols=count_cols, sum_cols=sum_cols)
 
-        urs_df.sort_values(ENUM_VARS_ASCENDING_STANDARD, ascending=True, inplace=True)
-        return urs_df
+    def create_var_bins(self):
+        if self.var_name not in self.df.columns:
+            raise URSException(f'{self.var_name} does not included in dataframe')
+        series = self.df[self.var_name]
+        # 与qc报告在同一个进程中运行时(common.column_stats), 直接使用qc统计频数时factorize的结果
+        stats = peek_column_stats(series)
+        dtype = series.dtype
+        if dtype == object or isinstance(dtype, pd.CategoricalDtype) or self.var_name in self.numeric_vars_as_enum:
+            if stats is not None:
+                return VarBins.create_enum_bins_from_stats(self.var_name, stats)
+            return VarBins.create_enum_bins(series)
+        elif dtype.kind in 'iuf':
+            if stats is not None and len(stats.uniques) > 0:
+                # 由各取值的记录数计算分位点, 不需要对整列排序
+                labels = VarBins.create_numeric_labels(stats.value_counts(), self.numeric_var_quantile)
+                return VarBins.create_numeric_bins_with_labels(series, labels)
+            return VarBins.create_numeric_bins(series, self.numeric_var_quantile)
+        else:
+            raise URSException(f'Unsupported type of {self.var_name}')
 
     def _test_col_in_df(self, var_name):
         if var_name not in self.df.columns:
-            raise URSException(f'{self.var_name} does not included in dataframe')
-
-    def generate_urs_df(self):
+            raise URSException(f'{var_name} does not included in dataframe')
+
+    def generate_urs_df(self, aggregates=None):
+        """
+        :param aggregates:  已经统计好的URSAggregates(增量模式下合并得到), 此时var_bins需要是对应的分箱;
+            为None时由数据集统计
+        """
+        for calc_config in self.target_vars_calc_config.values():
+            if not isinstance(calc_config.get('calc_way'), TargetVarsCalcWay):
+                raise URSException(f'Unsupported calc way: {calc_config.get("calc_way")}')
         if set(self.target_vars) != set(self.target_vars_calc_config.keys()):
             raise URSException(f'TARGET_VARS does not match TARGET_VARS_CALC_CONFIG,'
                                f'details: {set(self.target_vars) ^ set(self.target_vars_calc_config.keys())}')
-        if self.var_name not in self.df.columns:
-            raise URSException(f'{self.var_name} does not included in dataframe')
-        if self.df[self.var_name].dtype == object or self.var_name in self.numeric_vars_as_enum:
-            return self.generate_enum_urs_df()
-        elif self.df[self.var_name].dtype in [np.float64, np.int64]:
-            return self.generate_numeric_urs_df()
-        else:
-            raise URSException(f'Unsupported type of {self.var_name}')
+        if self.var_bins is None:
+            if aggregates is not None:
+                raise URSException(f'var_bins of {self.var_name} is required to generate urs table from aggregates')
+            self.var_bins = self.create_var_bins()
+        with trace_span('urs_df', var=self.var_name, rows=len(self.df) if aggregates is None else None):
+            if self.var_bins.is_enum:
+                return self.generate_enum_urs_df(aggregates)
+            else:
+                return self.generate_numeric_urs_df(aggregates)
 
 
 class URSException(Exception):
@@ -272,22 +741,42 @@ class URSException(Exception):
 
 
 class ReportInfo:
-    def __init__(self, data_source_type=DSType.PKL):
-        if data_source_type == DSType.PKL:
-            self.report_generator = ReportGenerator.create_generator_from_pickle()
+    def __init__(self, data_source_type=DSType.PKL, state_path=URS_STATE_PATH, path=DS_FILE_PATH,
+                 sqlite_path=URS_SQLITE_PATH):
+        # 增量模式下保存统计状态的文件, 为None时统计整个数据集
+        self.state_path = state_path
+        if sqlite_path is not None:
+            if state_path is not None:
+                raise URSException('URS_SQLITE_PATH and URS_STATE_PATH can not be set at the same time')
+            self.report_generator = ReportGenerator.create_generator_from_sqlite(data_source_type, path=path,
+                                                                                 db_path=sqlite_path)
+        elif is_partitioned(path):
+            self.report_generator = ReportGenerator.create_generator_from_partitions(data_source_type, path=path)
+        elif data_source_type == DSType.PKL:
+            self.report_generator = ReportGenerator.create_generator_from_pickle(path=path)
         elif data_source_type == DSType.CSV:
-            self.report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_csv)
+            self.report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_csv, path=path)
         elif data_source_type == DSType.EXCEL:
-            self.report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_excel)
+            self.report_generator = ReportGenerator.create_generator_from_ascii(read_func=pd.read_excel, path=path)
+        elif data_source_type in (DSType.PARQUET, DSType.FEATHER):
+            self.report_generator = ReportGenerator.create_generator_from_columnar(fmt=data_source_type.value,
+                                                                                   path=path)
         else:
             raise URSException(f'{data_source_type} does not support currently!')
 
     def to_excel(self):
-        self.report_generator.to_excel()
+        if self.state_path is None:
+            self.report_generator.to_excel()
+        else:
+            self.report_generator.to_excel_incremental(self.state_path)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     print('start to generate urs report')
+    if TRACE_ENABLED:
+        start_tracing('urs')
     report_info = ReportInfo(data_source_type=DS_TYPE)
     report_info.to_excel()
+    finish_tracing(report_info.report_generator.get_excel_path(), TRACE_SLOWEST_N)
     print('finished generating urs report')
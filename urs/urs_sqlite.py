@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from urs_aggregator import URSAggregates
+
+# 导入格式的版本, 表结构或者导入方式变化时加1
+URS_SQLITE_VERSION = 1
+
+# 数据集导入的表
+DATA_TABLE = 'urs_data'
+
+# 保存导入时的数据集指纹、配置以及各自变量类型的表
+META_TABLE = 'urs_meta'
+
+
+class URSSqliteException(Exception):
+    pass
+
+
+def quote_identifier(name):
+    """列名作为SQL中的标识符, 列名中可以有中文、空格和引号"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def get_var_kind(dtype):
+    """
+    :return:  与内存中统计时相同的规则判断的自变量类型: enum、numeric或者unsupported,
+            NUMERIC_VARS_AS_ENUM在统计时处理
+    """
+    if dtype == object or isinstance(dtype, pd.CategoricalDtype):
+        return 'enum'
+    if dtype.kind in 'iuf':
+        return 'numeric'
+    return 'unsupported'
+
+
+def _merge_var_kind(kind, other):
+    """任何一块中为枚举变量时整体作为枚举变量, 与拼接后读取时的类型一致(见urs_reporter._scan_partition)"""
+    for merged_kind in ('unsupported', 'enum'):
+        if merged_kind in (kind, other):
+            return merged_kind
+    return 'numeric'
+
+
+class URSSqliteStore:
+    """
+    导入到本地SQLite文件中的数据集, 自变量上建有索引
+
+    数据集只导入一次(分块读取, 内存占用只与块大小有关), 数据集和导入配置都没有变化时直接使用已有的文件;
+    每个变量的所有目标变量由一条分组查询统计出各分箱的记录数、原始列的非空计数与求和(URSAggregates),
+    数值变量的分箱边界由另一条按取值分组的查询(使用索引)得到的各取值记录数计算, 与pd.qcut的结果相同
+    """
+
+    def __init__(self, db_path, var_kinds, records_num):
+        self.db_path = db_path
+        # 导入时各自变量的类型, {var_name: enum/numeric/unsupported}
+        self.var_kinds = var_kinds
+        self.records_num = records_num
+
+    @classmethod
+    def get_source_key(cls, fingerprint, data_source_type, required_cols, var_names, load_config):
+        """:return:  导入的数据集以及影响导入结果的配置, 与已有文件中的不一致时重新导入"""
+        return json.dumps({'version': URS_SQLITE_VERSION, 'fingerprint': fingerprint,
+                           'data_source_type': data_source_type.value, 'required_cols': list(required_cols),
+                           'var_names': list(var_names), 'load_config': load_config},
+                          ensure_ascii=False, sort_keys=True, default=str)
+
+    @classmethod
+    def load_store(cls, db_path, source_key):
+        """:return:  db_path中与source_key一致的导入结果, 文件不存在或者不一致时为None"""
+        if not os.path.exists(db_path):
+            return None
+        with closing(sqlite3.connect(db_path)) as conn:
+            try:
+                meta = dict(conn.execute(f'SELECT key, value FROM {META_TABLE}').fetchall())
+            except sqlite3.DatabaseError:
+                return None
+        if meta.get('source_key') != source_key:
+            return None
+        return cls(db_path=db_path, var_kinds=json.loads(meta['var_kinds']), records_num=int(meta['records_num']))
+
+    @classmethod
+    def create_store(cls, db_path, source_key, chunks, var_names):
+        """
+        把数据集逐块导入db_path并对var_names建立索引, 已有一致的导入结果时不再读取数据集
+
+        :param chunks:  返回DataFrame迭代器的函数, 只在需要导入时调用
+        :return:  URSSqliteStore
+        """
+        store = cls.load_store(db_path, source_key)
+        if store is not None:
+            print(f'{db_path} is up to date, the data set is not imported again')
+            return store
+        # 导入到临时文件, 完成后再替换, 中断时不会留下不完整的文件
+        tmp_path = db_path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        var_kinds = {}
+        records_num = 0
+        try:
+            with closing(sqlite3.connect(tmp_path)) as conn:
+                # 临时文件导入失败时直接删除, 不需要日志
+                conn.execute('PRAGMA journal_mode = OFF')
+                conn.execute('PRAGMA synchronous = OFF')
+                for chunk in chunks():
+                    if records_num == 0:
+                        # 不声明列的类型, 保留每个值在DataFrame中的类型(整数、浮点数或者字符串)
+                        conn.execute(f'CREATE TABLE {DATA_TABLE} '
+                                     f'({", ".join(quote_identifier(col) for col in chunk.columns)})')
+                    chunk.to_sql(DATA_TABLE, conn, if_exists='append', index=False)
+                    for var_name in var_names:
+                        kind = get_var_kind(chunk[var_name].dtype)
+                        var_kinds[var_name] = _merge_var_kind(var_kinds.get(var_name, kind), kind)
+                    records_num += len(chunk)
+                    print(f'{records_num} records are imported into {db_path}')
+                if records_num == 0:
+                    raise URSSqliteException(f'No records to import into {db_path}')
+                for var_pos, var_name in enumerate(var_names):
+                    conn.execute(f'CREATE INDEX idx_var_{var_pos} ON {DATA_TABLE} ({quote_identifier(var_name)})')
+                conn.execute(f'CREATE TABLE {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)')
+                conn.executemany(f'INSERT INTO {META_TABLE} VALUES (?, ?)',
+                                 [('source_key', source_key), ('var_kinds', json.dumps(var_kinds, ensure_ascii=False)),
+                                  ('records_num', str(records_num))])
+                conn.commit()
+            os.replace(tmp_path, db_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return cls(db_path=db_path, var_kinds=var_kinds, records_num=records_num)
+
+    def _query(self, sql, params=()):
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def get_value_counts(self, var_name):
+        """:return:  数值变量非空取值的记录数, 以取值为索引的Series, 只扫描自变量的索引"""
+        var = quote_identifier(var_name)
+        rows = self._query(f'SELECT {var}, COUNT(*) FROM {DATA_TABLE} WHERE {var} IS NOT NULL GROUP BY {var}')
+        return pd.Series([count for _, count in rows], index=[value for value, _ in rows], dtype=np.int64)
+
+    def aggregate(self, var_name, count_cols, sum_cols, labels=None):
+        """
+        一条分组查询统计所有目标变量需要的计数与求和
+
+        :param labels:  数值变量的分箱区间(IntervalIndex), 各行在查询中按区间的边界映射到分箱的编号;
+                为None时作为枚举变量, 按取值分组, 分箱为升序排列的取值
+        :return:  URSAggregates
+        """
+        var = quote_identifier(var_name)
+        # TOTAL与np.bincount相同, 没有非空值时为0.0
+        aggregate_exprs = ['COUNT(*)'] + [f'COUNT({quote_identifier(col)})' for col in count_cols] + \
+                          [f'TOTAL({quote_identifier(col)})' for col in sum_cols]
+        if labels is None:
+            rows = self._query(f'SELECT {var}, {", ".join(aggregate_exprs)} FROM {DATA_TABLE} GROUP BY {var}')
+            labels = pd.Index([row[0] for row in rows if row[0] is not None]).sort_values()
+            positions = [len(labels) if row[0] is None else labels.get_loc(row[0]) for row in rows]
+        else:
+            # 与VarBins.create_numeric_bins_with_labels相同: 编号i为区间(edges[i], edges[i + 1]], 不在任何区间中为-1
+            edges = np.append(labels.left.values[:1], labels.right.values).astype(np.float64).tolist()
+            bin_expr = f'CASE WHEN {var} IS NULL THEN {len(labels)} WHEN {var} <= ? THEN -1 ' + \
+                       ' '.join(f'WHEN {var} <= ? THEN {pos}' for pos in range(len(labels))) + ' ELSE -1 END'
+            rows = self._query(f'SELECT {bin_expr} AS bin, {", ".join(aggregate_exprs)} FROM {DATA_TABLE} '
+                               f'GROUP BY bin', edges)
+            positions = [row[0] for row in rows]
+        n_bins = len(labels) + 1
+        bin_rows = np.zeros(n_bins, dtype=np.int64)
+        counts = {col: np.zeros(n_bins, dtype=np.int64) for col in count_cols}
+        sums = {col: np.zeros(n_bins, dtype=np.float64) for col in sum_cols}
+        for pos, row in zip(positions, rows):
+            if pos < 0:
+                continue
+            bin_rows[pos] = row[1]
+            for col_pos, col in enumerate(count_cols):
+                counts[col][pos] = row[2 + col_pos]
+            for col_pos, col in enumerate(sum_cols):
+                sums[col][pos] = row[2 + len(count_cols) + col_pos]
+        return URSAggregates(labels=labels, rows=bin_rows, counts=counts, sums=sums)
@@ -0,0 +1,170 @@
+import math
+import numbers
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.data_loader import write_columnar
+from config import DSType
+
+
+class URSWorkbookException(Exception):
+    pass
+
+
+class URSWorkbookWriter:
+    """
+    urs报告的excel写入器, 每个分组一个sheet, 每个变量一张urs表, 折线图画在表格右侧
+
+    使用xlsxwriter的constant_memory模式, 每写完一行就刷到临时文件中, 内存占用与变量个数无关;
+    该模式下同一个sheet中只能按行号递增的顺序写入, 所以表格和图表按行依次排布, 不回头修改已经写过的行
+    """
+
+    def __init__(self, path, target_vars, target_vars_in_chart, constant_memory=True):
+        if not set(target_vars_in_chart).issubset(set(target_vars)):
+            raise URSWorkbookException(f'{set(target_vars_in_chart) - set(target_vars)} '
+                                       f'does not contained in TARGET_VARS')
+        self.path = path
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': constant_memory})
+        # 目标变量列表
+        self.target_vars = target_vars
+        # 需要图表展示的目标变量列表
+        self.target_vars_in_chart = target_vars_in_chart
+        # 列名和索引的格式(与pandas.to_excel相同: 加粗、细边框、居中), 所有表格共用一个格式
+        self.header_format = self.workbook.add_format({'bold': True, 'border': 1, 'align': 'center',
+                                                       'valign': 'top'})
+        self.worksheet = None
+        self.sheet_name = None
+        # 画数据表行索引所在列，随着图表的增加更新
+        self.row_ind = 0
+        # 数据表中，索引所在列
+        self.index_col_ind = 0
+        # 因为列名需要增加的行数
+        self.title_offset = 1
+        # 因为索引需要增加的列数
+        self.index_offset = 1
+        # 图表占用的格子数
+        self.chart_height = 15
+        # 表格和图之间的空列数
+        self.blank_col_between = 2
+        # 不同变量报告之间的行数
+        self.blank_row_between = 2
+
+    def add_sheet(self, sheet_name):
+        """之后的urs表写入新的sheet, 之前的sheet不能再写入"""
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        self.sheet_name = sheet_name
+        self.row_ind = 0
+
+    def draw_var(self, urs_df, var_name):
+        self.draw_var_table(urs_df=urs_df, var_name=var_name, row=self.row_ind)
+        self.draw_var_chart(urs_df=urs_df, var_name=var_name, row=self.row_ind)
+        self.row_ind += self.blank_row_between + max(self.chart_height, urs_df.shape[0])
+
+    def draw_var_table(self, urs_df, var_name, row):
+        """按行写入urs表: 第一行是自变量名和目标变量名, 之后每行是一个分箱"""
+        worksheet = self.worksheet
+        header_format = self.header_format
+        worksheet.write_string(row, self.index_col_ind, var_name, header_format)
+        for col_ind, col_name in enumerate(urs_df.columns, start=self.index_offset):
+            worksheet.write_string(row, col_ind, str(col_name), header_format)
+
+        values = urs_df.to_numpy(dtype=float)
+        finite = np.isfinite(values)
+        for row_offset, (label, row_values, row_finite) in enumerate(zip(urs_df.index, values.tolist(),
+                                                                         finite.tolist()),
+                                                                     start=row + self.title_offset):
+            self._write_index_cell(row_offset, label)
+            for col_ind, (value, is_finite) in enumerate(zip(row_values, row_finite), start=self.index_offset):
+                if is_finite:
+                    worksheet.write_number(row_offset, col_ind, value)
+                elif not math.isnan(value):
+                    # 与pandas.to_excel相同, 无穷写为字符串, 缺失值留空
+                    worksheet.write_string(row_offset, col_ind, 'inf' if value > 0 else '-inf')
+
+    def _write_index_cell(self, row, label):
+        if isinstance(label, numbers.Number) and not isinstance(label, bool):
+            if math.isfinite(label):
+                self.worksheet.write_number(row, self.index_col_ind, label, self.header_format)
+                return
+            if not math.isnan(label):
+                self.worksheet.write_string(row, self.index_col_ind, str(label), self.header_format)
+                return
+        elif not pd.isnull(label):
+            self.worksheet.write_string(row, self.index_col_ind, str(label), self.header_format)
+            return
+        self.worksheet.write_blank(row, self.index_col_ind, None, self.header_format)
+
+    def draw_var_chart(self, urs_df, var_name, row):
+        # 折现图画在表格右侧空一列处
+        chart = self.workbook.add_chart({'type': 'line'})
+        # 每一个target_vars_in_chart中的变量绘制一条曲线
+        for target_var in self.target_vars_in_chart:
+            target_var_col_ind = self.target_vars.index(target_var) + self.index_offset
+            chart.add_series({
+                'categories': [self.sheet_name, row + self.title_offset, self.index_col_ind,
+                               row + self.title_offset + urs_df.shape[0],
+                               self.index_col_ind],
+                'values': [self.sheet_name, row + self.title_offset, target_var_col_ind,
+                           row + self.title_offset + urs_df.shape[0],
+                           target_var_col_ind],
+                'name': target_var
+            })
+
+        chart.set_x_axis({'name': var_name, 'position_axis': 'on_tick'})
+        chart.set_y_axis({'name': 'value', 'major_gridlines': {'visible': True}})
+
+        # Turn off chart legend. It is on by default in Excel.
+        chart.set_legend({'position': 'bottom'})
+
+        chart.set_size({'width': 960, 'height': 288})
+
+        # 图表不占用单元格, 锚定在表格的第一行, 不影响按行写入的顺序
+        self.worksheet.insert_chart(row=row, col=urs_df.shape[1] + self.index_offset + self.blank_col_between,
+                                    chart=chart)
+
+    def close(self):
+        self.workbook.close()
+
+
+class URSTableExporter:
+    """
+    把urs表导出为一张csv/parquet长表, 每行是一个变量的一个分箱, 列为var_name, bin以及各目标变量,
+    便于其他程序读取; 同一个变量出现在多个分组中时只导出一次
+    """
+
+    def __init__(self, path, export_type, target_vars):
+        """:param export_type:  DSType.CSV or DSType.PARQUET"""
+        if export_type not in (DSType.CSV, DSType.PARQUET):
+            raise URSWorkbookException(f'Unsupported export type: {export_type}')
+        self.path = path
+        self.export_type = export_type
+        self.columns = ['var_name', 'bin'] + list(target_vars)
+        self.exported_vars = set()
+        # urs表的行数只与变量和分箱的个数有关, 全部导出的urs表在关闭时一次写入, 计算端异常退出时不会留下不完整的文件
+        self.long_dfs = []
+
+    @classmethod
+    def get_export_path(cls, excel_path, export_type):
+        return os.path.splitext(excel_path)[0] + '.' + export_type.value
+
+    def export_var(self, urs_df, var_name):
+        if var_name in self.exported_vars:
+            return
+        self.exported_vars.add(var_name)
+        long_df = urs_df.reset_index(drop=True)
+        long_df.insert(0, 'bin', [None if pd.isnull(label) else str(label) for label in urs_df.index])
+        long_df.insert(0, 'var_name', var_name)
+        long_df.columns = self.columns
+        self.long_dfs.append(long_df)
+
+    def close(self):
+        long_df = pd.concat(self.long_dfs, ignore_index=True) if self.long_dfs else pd.DataFrame(columns=self.columns)
+        if self.export_type == DSType.CSV:
+            long_df.to_csv(self.path, index=False, encoding='utf-8-sig')
+        else:
+            write_columnar(long_df, self.path, 'parquet')